@@ -15,26 +15,34 @@ from kipp.libs.aio import (
     coroutine,
     run_on_executor,
 )
-from kipp.utils import ThreadPoolExecutor, get_logger
+from kipp.utils import ElasticThreadPoolExecutor, get_logger
 
 _F = TypeVar("_F", bound=Callable[..., Any])
 
 
 class LazyThreadPoolExecutor:
-    """Defers creation of the underlying ``ThreadPoolExecutor`` until first use.
+    """Defers creation of the underlying executor until first use.
 
     This avoids spawning threads at import time, which matters when the aio
     module is imported but never actually used (e.g. during test collection or
     CLI help output).  Once any attribute other than the ones defined on this
     class is accessed, the real executor is instantiated transparently.
+
+    The executor is an ``ElasticThreadPoolExecutor`` with ``n_workers`` as its
+    maximum: threads are added while blocking calls queue up and exit after
+    ``keep_alive`` idle seconds.  Batch work can be kept from starving
+    interactive calls with ``submit_to`` and a low-weight queue.
     """
 
-    def __init__(self, n_workers: int) -> None:
+    def __init__(self, n_workers: int, keep_alive: float = 60.0) -> None:
         self._n_workers: int = n_workers
-        self.threadpoolexecutor: ThreadPoolExecutor | None = None
+        self._keep_alive: float = keep_alive
+        self.threadpoolexecutor: ElasticThreadPoolExecutor | None = None
 
     def init(self) -> None:
-        self.threadpoolexecutor = ThreadPoolExecutor(self._n_workers)
+        self.threadpoolexecutor = ElasticThreadPoolExecutor(
+            self._n_workers, keep_alive=self._keep_alive, thread_name_prefix="kipp-aio"
+        )
 
     def __getattr__(self, name: str) -> Any:
         if not self.threadpoolexecutor:
@@ -43,16 +51,11 @@ class LazyThreadPoolExecutor:
         return getattr(self.threadpoolexecutor, name)
 
     def set_n_workers(self, n_workers: int) -> None:
-        """Must be called before the executor is first used; changing the pool
-        size after threads have been spawned is not safe, so we raise instead.
-        """
+        """Change the maximum pool size, also while the pool is running."""
         get_logger().info("set internal thread pool to %s", n_workers)
-        if self.threadpoolexecutor:
-            raise KippAIOException(
-                "you should not call ``set_n_workers`` when ThreadPoolExecutor is already running"
-            )
-
         self._n_workers = n_workers
+        if self.threadpoolexecutor:
+            self.threadpoolexecutor.resize(max_workers=n_workers)
 
 
 # Module-level singleton; shared by all coroutines that run on the executor.
@@ -60,7 +63,9 @@ thread_executor: LazyThreadPoolExecutor = LazyThreadPoolExecutor(10)
 
 
 def set_aio_n_workers(n_workers: int = 10) -> None:
-    """Change the default number of workers in ``aio`` module.
+    """Change the maximum number of workers in ``aio`` module.
+
+    Takes effect immediately, even after the pool has started.
 
     Args:
         n_workers: Number of threads in the pool. Must be a positive integer.
@@ -3,13 +3,17 @@
 
 from __future__ import annotations, unicode_literals
 
+import asyncio
 import functools
 import os
 import signal
 import sys
-from collections import namedtuple
-from typing import Any, Callable, TypeVar
+import threading
+from concurrent.futures import Executor
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterable, TypeVar
 
+# ``retry`` sleeps through the time module; tests patch it from here
 import time as _time_module
 
 try:
@@ -20,53 +24,44 @@ except ImportError:
 import xxhash
 
 from kipp.utils import get_logger
+from kipp.utils.metrics import (
+    Histogram,
+    TimingInfo,
+    TimingRegistry,
+    get_timing_registry,
+    instrument,
+)
+
+from .cache import (
+    BoundedCache,
+    CacheBackend,
+    CacheInfo,
+    CacheItem,
+    CacheStats,
+    SingleFlight,
+    TTLCache,
+    args_key,
+    get_refresh_executor,
+    hashed_args_key,
+    typed_args_key,
+)
+from .breaker import CircuitBreaker
+from .exceptions import CircuitOpenError
+from .retries import RetryBudget, RetryState, retry
+from .timeouts import (
+    Deadline,
+    TimeoutError,
+    async_timeout,
+    check_timeout,
+    current_deadline,
+    get_timer,
+    process_timeout,
+    thread_timeout,
+)
 
 F = TypeVar("F", bound=Callable[..., Any])
 
 
-def retry(
-    ExceptionToCheck: type[Exception] | tuple[type[Exception], ...],
-    tries: int = 3,
-    delay: int | float = 1,
-    backoff: int | float = 1,
-) -> Callable[[F], F]:
-    """Retry calling the decorated function using an exponential backoff.
-
-    The last attempt (when tries is exhausted) is made without a try/except,
-    so the exception propagates to the caller on final failure.
-
-    http://www.saltycrane.com/blog/2009/11/trying-out-retry-decorator-python/
-    original from: http://wiki.python.org/moin/PythonDecoratorLibrary#Retry
-
-    Args:
-        ExceptionToCheck: Exception class or tuple of exception classes that
-            trigger a retry. All other exceptions propagate immediately.
-        tries: Total number of attempts (not retries), so tries=3 means
-            up to 2 retries after the initial call.
-        delay: Initial delay between retries in seconds.
-        backoff: Multiplier applied to delay after each retry,
-            e.g. backoff=2 doubles the wait each time.
-    """
-
-    def deco_retry(f: F) -> F:
-        @functools.wraps(f)
-        def _wrapper(*args: Any, **kwargs: Any) -> Any:
-            mtries, mdelay = tries, delay
-            while mtries > 1:
-                try:
-                    return f(*args, **kwargs)
-                except ExceptionToCheck:
-                    _time_module.sleep(mdelay)
-                    mtries -= 1
-                    mdelay *= backoff
-
-            return f(*args, **kwargs)
-
-        return _wrapper  # type: ignore[return-value]
-
-    return deco_retry
-
-
 def single_instance(
     pidfilename: str, logger: Any = None
 ) -> Callable[[F], F]:
@@ -131,13 +126,26 @@ def single_instance(
     return deco_single_instance
 
 
-def timer(fn: F) -> F:
+def timer(
+    fn: F | None = None,
+    *,
+    histogram: bool = False,
+    sample_rate: float = 1.0,
+    log_stats_sec: int | float = 0,
+) -> Any:
     """Log wall-clock execution time of the decorated function.
 
     Timing is always logged (even if the function raises), because the
     log call is in the ``finally`` block. On exception the traceback is
     also logged before re-raising.
 
+    For hot functions pass ``histogram=True``: each call is then recorded
+    into a per-function histogram of the shared
+    :class:`~kipp.utils.metrics.TimingRegistry` instead of being logged,
+    and the wrapper exposes ``timing_info()`` with p50/p95/p99, call and
+    error counts. Only a ``sample_rate`` fraction of calls is timed, and a
+    summary is logged every ``log_stats_sec`` seconds when set.
+
     Examples::
 
         from kipp.decorator import timer
@@ -146,7 +154,22 @@ def timer(fn: F) -> F:
         def demo():
             time.sleep(10)
 
+        @timer(histogram=True, sample_rate=0.1, log_stats_sec=60)
+        def hot():
+            ...
+
     """
+    if fn is None:
+        return functools.partial(
+            timer,
+            histogram=histogram,
+            sample_rate=sample_rate,
+            log_stats_sec=log_stats_sec,
+        )
+
+    if histogram:
+        return instrument(fn, sample_rate=sample_rate, log_stats_sec=log_stats_sec)
+
     @functools.wraps(fn)
     def wrapper(*args: Any, **kw: Any) -> Any:
         try:
@@ -167,60 +190,160 @@ def timer(fn: F) -> F:
 debug_wrapper = timer  # compatable
 
 
-def memo(fn: F) -> F:
-    """Unbounded memoization cache keyed on positional arguments.
+def _maybe_dump_stats(wrapper: Any, stats: CacheStats, interval: float) -> None:
+    if interval and stats.due(time(), interval):
+        get_logger().info(
+            "cache stats for %s: %s", wrapper.__qualname__, wrapper.cache_info()
+        )
+
+
+def memo(
+    fn: F | None = None,
+    *,
+    single_flight: bool = False,
+    log_stats_sec: float = 0,
+    max_size: int | None = None,
+    max_bytes: int | None = None,
+    policy: str = "lru",
+    weak: bool = False,
+) -> Any:
+    """Memoization cache keyed on positional and keyword arguments.
+
+    Keys are built by :func:`args_key`, so keyword order does not matter and
+    unhashable arguments are accepted. Without any bound the cache lives for
+    the lifetime of the process and is never evicted -- suitable only for
+    functions with a small, bounded set of possible inputs. Long-running
+    workers should set ``max_size`` and/or ``max_bytes``, which switch the
+    storage to a :class:`BoundedCache`.
+
+    The wrapper exposes ``cache_info()``, ``cache_clear()`` and
+    ``invalidate(*args, **kw)``.
+
+    Args:
+        single_flight: when True, concurrent first calls with the same
+            arguments wait for one computation instead of each running
+            the function.
+        log_stats_sec: when set, log ``cache_info()`` through the kipp
+            logger at most once per this many seconds, from inside calls.
+        max_size: maximum number of cached results.
+        max_bytes: maximum estimated size of the cached keys and results,
+            measured shallowly with ``sys.getsizeof``.
+        policy: ``"lru"`` or ``"lfu"``, which entry a bounded cache evicts.
+        weak: hold results through weak references where the result type
+            allows it, so the cache does not keep them alive by itself.
+
+    Examples::
+
+        @memo
+        def fib(n):
+            ...
+
+        @memo(single_flight=True)
+        def load_config(name):
+            ...
+
+        @memo(max_size=10000, policy="lfu")
+        def parse_ua(ua, strict=False):
+            ...
 
-    Only positional args are used as cache keys, so the decorated function
-    must not rely on keyword arguments for varying behavior. The cache lives
-    for the lifetime of the process and is never evicted -- suitable only
-    for functions with a small, bounded set of possible inputs.
     """
-    cache: dict[tuple[Any, ...], Any] = {}
-    miss = object()
 
-    @functools.wraps(fn)
-    def wrapper(*args: Any) -> Any:
-        result = cache.get(args, miss)
-        if result is miss:
-            result = fn(*args)
-            cache[args] = result
-        return result
+    def decorator(fn: F) -> F:
+        miss = object()
+        flight = SingleFlight() if single_flight else None
+        stats = CacheStats()
+        cache: Any
+        if max_size is None and max_bytes is None and not weak:
+            cache = {}
+            store = cache.__setitem__
+            delete = lambda hkey: cache.pop(hkey, miss) is not miss  # noqa: E731
+        else:
+            cache = BoundedCache(
+                max_size=max_size, max_bytes=max_bytes, policy=policy, weak=weak
+            )
+            store, delete = cache.set, cache.delete
+
+        def load(hkey: Hashable, args: tuple[Any, ...], kw: dict[str, Any]) -> Any:
+            result = cache.get(hkey, miss)
+            if result is miss:
+                start_at = time()
+                result = fn(*args, **kw)
+                stats.record_compute(time() - start_at)
+                store(hkey, result)
+            return result
 
-    return wrapper  # type: ignore[return-value]
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kw: Any) -> Any:
+            hkey = args_key(*args, **kw)
+            result = cache.get(hkey, miss)
+            if result is miss:
+                stats.misses += 1
+                if flight is None:
+                    result = load(hkey, args, kw)
+                else:
+                    result = flight.do(hkey, load, hkey, args, kw)
+            else:
+                stats.hits += 1
 
+            _maybe_dump_stats(wrapper, stats, log_stats_sec)
+            return result
 
-class TimeoutError(Exception):
-    """Raised when a function decorated with ``timeout`` exceeds its time limit."""
+        def cache_clear() -> None:
+            cache.clear()
+            stats.clear()
+
+        wrapper.cache_info = lambda: stats.info(  # type: ignore[attr-defined]
+            cache, max_size
+        )
+        wrapper.cache_clear = cache_clear  # type: ignore[attr-defined]
+        wrapper.invalidate = (  # type: ignore[attr-defined]
+            lambda *args, **kw: delete(args_key(*args, **kw))
+        )
+        return wrapper  # type: ignore[return-value]
 
-    def __init__(self, value: str = "Timed Out") -> None:
-        self.value = value
+    if fn is not None:
+        return decorator(fn)
 
-    def __str__(self) -> str:
-        return repr(self.value)
+    return decorator
 
 
-def timeout(seconds_before_timeout: int) -> Callable[[F], F]:
+def timeout(
+    seconds_before_timeout: int, thread_fallback: bool = False
+) -> Callable[[F], F]:
     """Abort a function if it runs longer than the given number of seconds.
 
     Uses POSIX SIGALRM, so this only works on Unix-like systems and only
-    in the main thread (signals can only be set in the main thread).
+    in the main thread (signals can only be set in the main thread); other
+    threads get a ValueError.  With ``thread_fallback=True`` calls from
+    other threads run under a cooperative :func:`thread_timeout` instead,
+    which only stops the function where it calls :func:`check_timeout`.
+    ``0`` sets no alarm.
 
     Args:
         seconds_before_timeout: Wall-clock seconds before raising TimeoutError.
+        thread_fallback: Use a cooperative deadline outside the main thread.
     """
 
     def decorate(f: F) -> F:
         def handler(signum: int, frame: Any) -> None:
             raise TimeoutError()
 
+        threaded = f
+        if thread_fallback and seconds_before_timeout > 0:
+            threaded = thread_timeout(seconds_before_timeout)(f)
+
         def new_f(*args: Any, **kwargs: Any) -> Any:
+            in_main = threading.current_thread() is threading.main_thread()
+            if thread_fallback and not in_main:
+                return threaded(*args, **kwargs)
+
             old = signal.signal(signal.SIGALRM, handler)
             signal.alarm(seconds_before_timeout)
             try:
                 result = f(*args, **kwargs)
             finally:
+                signal.alarm(0)
                 signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
             return result
 
         new_f.__name__ = f.__name__
@@ -233,27 +356,85 @@ def calculate_args_hash(*args: Any, **kw: Any) -> str:
     """Produce a short deterministic hash of arbitrary positional/keyword args.
 
     Uses xxHash (xxh32) for speed over cryptographic strength -- this is
-    only intended for cache-key derivation, not security.
+    only intended for cache-key derivation, not security. Kept for backward
+    compatibility; ``timeout_cache`` now uses :func:`typed_args_key`, and
+    :func:`hashed_args_key` gives 64/128-bit digests that do not depend on
+    ``repr``.
     """
     return xxhash.xxh32(str(args) + str(kw)).hexdigest()
 
 
-CacheItem = namedtuple("CacheItem", ["data", "timeout_at"])
+def _now() -> float:
+    # look ``time`` up on every call so that patching ``kipp.decorator.time``
+    # also drives the cache engines
+    return time()
 
 
 def timeout_cache(
-    expires_sec: int | float = 30, max_size: int = 128
+    expires_sec: int | float = 30,
+    max_size: int = 128,
+    single_flight: bool = False,
+    stale_sec: int | float = 0,
+    refresh_ahead: float = 0,
+    executor: Executor | None = None,
+    key: Callable[..., Hashable] | None = None,
+    backend: CacheBackend | None = None,
+    log_stats_sec: float = 0,
 ) -> Callable[[F], F]:
     """Decorator that caches return values with a time-based expiration.
 
-    Each unique combination of arguments (hashed via xxHash) gets its own
-    cache slot. When the cache exceeds ``max_size``, an eviction pass runs
-    before inserting the new entry.
+    Each unique combination of arguments gets its own cache slot. By default
+    the arguments themselves form the key (see :func:`typed_args_key`), so
+    there is no stringification and no hash collision, and ``f(1)``,
+    ``f(True)`` and ``f(1.0)`` stay separate entries as they were with the
+    old string keys; pass ``key`` to use a different key function. Every
+    decorated function owns a separate :class:`TTLCache`, so ``max_size`` is
+    a hard per-function cap: expired entries are reclaimed first, then the
+    least recently used ones. The cache is safe to share between threads.
+
+    Pass a shared ``backend`` from :mod:`kipp.decorator.backends` to compute
+    each value once per host or per cluster instead of once per process.
+    Keys are then prefixed with the function's module and qualified name,
+    and derived with ``hashed_args_key(128, typed=True)`` unless ``key`` is
+    given.
+    ``wrapper.starmap(args_list)`` looks up a batch of calls with a single
+    ``get_many`` and stores the misses with a single ``set_many`` (one
+    ``MGET`` and one pipeline on Redis).
+
+    The wrapper also exposes ``cache_info()`` (a :class:`CacheInfo` with
+    hits, misses, evictions, expirations, size, a shallow bytes estimate and
+    the estimated time saved), ``cache_clear()`` and ``invalidate(*args,
+    **kw)``, which drops the entry those arguments map to.
+
+    With ``stale_sec`` or ``refresh_ahead`` set, callers never wait on a
+    key that is already cached: once the entry is stale (or about to be) the
+    cached value is returned immediately and a single background refresh
+    is submitted to ``executor``. A failed refresh is logged and the stale
+    value keeps being served until ``stale_sec`` runs out.
 
     Args:
         expires_sec: Number of seconds before a cached value is considered
             stale and recomputed on next call.
-        max_size: Maximum number of entries before triggering eviction.
+        max_size: Maximum number of entries kept for each decorated function.
+        single_flight: When True, concurrent callers that miss on the same
+            key wait for one in-flight computation instead of all calling
+            the function, which avoids thundering herds on slow lookups.
+        stale_sec: Seconds after expiry during which the stale value is
+            still served while it is refreshed in the background.
+        refresh_ahead: Fraction of ``expires_sec`` before expiry at which a
+            hit triggers a background refresh, e.g. 0.2 refreshes keys hit
+            during the last 20% of their lifetime. Only keys that are
+            actually read get refreshed, so cold keys simply expire.
+        executor: Pool that runs background refreshes, defaults to a shared
+            ``kipp.utils.ThreadPoolExecutor``.
+        key: Function that maps the call arguments to a hashable cache key,
+            e.g. :func:`args_key`, ``hashed_args_key(64)`` or
+            ``lambda user, **_: user.id``. Defaults to :func:`typed_args_key`.
+        backend: Shared :class:`CacheBackend` that replaces the per-function
+            ``TTLCache``; ``max_size`` does not apply to it, and it cannot
+            be combined with ``stale_sec`` or ``refresh_ahead``.
+        log_stats_sec: When set, log ``cache_info()`` through the kipp logger
+            at most once per this many seconds, from inside calls.
 
     Examples::
 
@@ -268,29 +449,252 @@ def timeout_cache(
         time.sleep(1)
         r == demo()
 
+        @timeout_cache(expires_sec=60, stale_sec=30, refresh_ahead=0.1)
+        def load_rates():
+            return fetch_rates()
+
     """
     assert expires_sec > 0, "expires_sec should greater than 0, but got {}".format(
         expires_sec
     )
     assert max_size > 0, "max_size should greater than 0, but got {}".format(max_size)
-    state: dict[str, CacheItem] = {}
+    assert stale_sec >= 0, "stale_sec should not be negative, but got {}".format(
+        stale_sec
+    )
+    assert 0 <= refresh_ahead < 1, "refresh_ahead should in [0, 1), but got {}".format(
+        refresh_ahead
+    )
+    miss = object()
+    # entries carry their own freshness deadline when they may outlive it
+    revalidate = stale_sec > 0 or refresh_ahead > 0
+    refresh_window = refresh_ahead * expires_sec
+    ttl = expires_sec + stale_sec
+    # freshness deadlines use this process's monotonic clock
+    assert backend is None or not revalidate, (
+        "stale_sec and refresh_ahead are not supported with a shared backend"
+    )
 
     def decorator(f: F) -> F:
+        cache: CacheBackend
+        if backend is None:
+            cache = TTLCache(max_size=max_size, ttl=ttl, clock=_now)
+            make_key = key or typed_args_key
+        else:
+            cache = backend
+            prefix = "{}.{}:".format(f.__module__, f.__qualname__)
+            inner_key = key or hashed_args_key(128, typed=True)
+
+            def make_key(*args: Any, **kw: Any) -> str:
+                return prefix + str(inner_key(*args, **kw))
+
+        flight = SingleFlight() if single_flight else None
+        refreshing: set[Hashable] = set()
+        refresh_lock = Lock()
+        stats = CacheStats()
+
+        def compute(args: tuple[Any, ...], kw: dict[str, Any]) -> Any:
+            start_at = time()
+            data = f(*args, **kw)
+            stats.record_compute(time() - start_at)
+            if revalidate:
+                return CacheItem(data=data, timeout_at=time() + expires_sec)
+            return data
+
+        def load(hkey: Hashable, args: tuple[Any, ...], kw: dict[str, Any]) -> Any:
+            # re-check: another caller may have filled the slot meanwhile
+            result = cache.get(hkey, miss)
+            if result is miss:
+                result = compute(args, kw)
+                cache.set(hkey, result, ttl)
+            return result
+
+        def refresh(hkey: Hashable, args: tuple[Any, ...], kw: dict[str, Any]) -> None:
+            try:
+                cache.set(hkey, compute(args, kw), ttl)
+            except Exception:
+                get_logger().exception("refresh cache for %s", f.__name__)
+            finally:
+                with refresh_lock:
+                    refreshing.discard(hkey)
+
+        def schedule_refresh(
+            hkey: Hashable, item: CacheItem, args: tuple[Any, ...], kw: dict[str, Any]
+        ) -> None:
+            if item.timeout_at - time() >= refresh_window:
+                return
+
+            with refresh_lock:
+                if hkey in refreshing:
+                    return
+                refreshing.add(hkey)
+
+            try:
+                (executor or get_refresh_executor()).submit(refresh, hkey, args, kw)
+            except RuntimeError:
+                # executor has been shut down, the next miss will recompute
+                with refresh_lock:
+                    refreshing.discard(hkey)
+
         @functools.wraps(f)
         def wrapper(*args: Any, **kw: Any) -> Any:
-            hkey = calculate_args_hash(*args, **kw)
-            if hkey not in state or state[hkey].timeout_at < time():
-                if len(state) > max_size:
-                    for k in list(state.keys()):
-                        if state[k].timeout_at < time():
-                            del state[k]
-
-                state[hkey] = CacheItem(
-                    timeout_at=time() + expires_sec, data=f(*args, **kw)
-                )
+            hkey = make_key(*args, **kw)
+            result = cache.get(hkey, miss)
+            if result is miss:
+                stats.misses += 1
+                if flight is None:
+                    result = compute(args, kw)
+                    cache.set(hkey, result, ttl)
+                else:
+                    result = flight.do(hkey, load, hkey, args, kw)
+            else:
+                stats.hits += 1
+                if revalidate:
+                    schedule_refresh(hkey, result, args, kw)
+
+            _maybe_dump_stats(wrapper, stats, log_stats_sec)
+            return result.data if revalidate else result
+
+        def starmap(args_list: Iterable[tuple[Any, ...]]) -> list[Any]:
+            """Call the function for each argument tuple with one batched lookup."""
+            args_list = list(args_list)
+            hkeys = [make_key(*args) for args in args_list]
+            found = cache.get_many(list(dict.fromkeys(hkeys)))
+            computed: dict[Hashable, Any] = {}
+            results = []
+            for hkey, args in zip(hkeys, args_list):
+                result = found.get(hkey, miss)
+                if result is miss:
+                    stats.misses += 1
+                    result = found[hkey] = computed[hkey] = compute(args, {})
+                else:
+                    stats.hits += 1
+                results.append(result.data if revalidate else result)
+
+            if computed:
+                cache.set_many(computed, ttl)
+            return results
+
+        def cache_clear() -> None:
+            """Reset the counters and drop the entries of the local cache.
+
+            A shared backend holds other functions' entries too, so it is
+            left alone; use ``invalidate`` or the backend's ``clear``.
+            """
+            if backend is None:
+                cache.clear()
+            stats.clear()
+
+        wrapper.starmap = starmap  # type: ignore[attr-defined]
+        wrapper.cache_info = lambda: stats.info(  # type: ignore[attr-defined]
+            cache, max_size if backend is None else None
+        )
+        wrapper.cache_clear = cache_clear  # type: ignore[attr-defined]
+        wrapper.invalidate = (  # type: ignore[attr-defined]
+            lambda *args, **kw: cache.delete(make_key(*args, **kw))
+        )
+        return wrapper  # type: ignore[return-value]
 
-            return state[hkey].data
+    return decorator
 
-        return wrapper  # type: ignore[return-value]
+
+def _async_cached(
+    f: Callable[..., Any],
+    lookup: Callable[[Hashable, Any], Any],
+    store: Callable[[Hashable, Any], None],
+    make_key: Callable[..., Hashable],
+) -> Callable[..., Any]:
+    """Wrap a coroutine-returning function so its awaited result is cached.
+
+    ``f`` may be an ``async def`` function, a ``kipp.aio.coroutine2`` function
+    or anything else that returns an awaitable.  Concurrent callers on the
+    same event loop share one in-flight task, which is shielded so that one
+    cancelled awaiter does not cancel it for the others.  Only successful
+    results reach ``store``.
+    """
+    miss = object()
+    inflight: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+
+    def done(
+        ikey: tuple[asyncio.AbstractEventLoop, Hashable], fut: asyncio.Future
+    ) -> None:
+        inflight.pop(ikey, None)
+        # also marks the exception as retrieved when nobody awaits it anymore
+        if not fut.cancelled() and fut.exception() is None:
+            store(ikey[1], fut.result())
+
+    @functools.wraps(f)
+    async def wrapper(*args: Any, **kw: Any) -> Any:
+        hkey = make_key(*args, **kw)
+        result = lookup(hkey, miss)
+        if result is not miss:
+            return result
+
+        ikey = (asyncio.get_running_loop(), hkey)
+        fut = inflight.get(ikey)
+        if fut is None:
+            fut = asyncio.ensure_future(f(*args, **kw))
+            inflight[ikey] = fut
+            fut.add_done_callback(functools.partial(done, ikey))
+
+        return await asyncio.shield(fut)
+
+    return wrapper
+
+
+def async_timeout_cache(
+    expires_sec: int | float = 30,
+    max_size: int = 128,
+    key: Callable[..., Hashable] | None = None,
+) -> Callable[[F], F]:
+    """Like :func:`timeout_cache`, for ``async def`` and ``coroutine2`` functions.
+
+    Caches the awaited result rather than the coroutine or Future, lets
+    concurrent awaiters of a missing key share one in-flight call, and
+    never caches a call that raised or was cancelled.  The decorated
+    function becomes a native coroutine function, which Tornado coroutines
+    can ``yield`` as well.
+
+    Args:
+        expires_sec: Number of seconds before a cached result expires.
+        max_size: Maximum number of entries kept for each decorated function.
+        key: Function that maps the call arguments to a hashable cache key,
+            defaults to :func:`args_key`.
+
+    Examples::
+
+        @async_timeout_cache(expires_sec=60)
+        async def get_user(uid):
+            return await fetch_user(uid)
+
+        @async_timeout_cache(expires_sec=60)
+        @coroutine2
+        def get_order(oid):
+            r = yield fetch_order(oid)
+            return_in_coroutine(r)
+
+    """
+    assert expires_sec > 0, "expires_sec should greater than 0, but got {}".format(
+        expires_sec
+    )
+    assert max_size > 0, "max_size should greater than 0, but got {}".format(max_size)
+
+    def decorator(f: F) -> F:
+        cache = TTLCache(max_size=max_size, ttl=expires_sec, clock=_now)
+        return _async_cached(  # type: ignore[return-value]
+            f, cache.get, cache.set, key or args_key
+        )
 
     return decorator
+
+
+def async_memo(fn: F) -> F:
+    """Unbounded memoization for ``async def`` and ``coroutine2`` functions.
+
+    Caches awaited results keyed on positional and keyword arguments, shares
+    one in-flight call between concurrent awaiters and drops failures, so a
+    transient error is retried on the next call.
+    """
+    cache: dict[Hashable, Any] = {}
+    return _async_cached(  # type: ignore[return-value]
+        fn, cache.get, cache.__setitem__, args_key
+    )
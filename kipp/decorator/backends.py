@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+---------------------
+Shared Cache Backends
+---------------------
+
+Backends that let ``timeout_cache`` share values between processes.
+
+Usage
+::
+
+    from kipp.decorator import timeout_cache
+    from kipp.decorator.backends import MmapCacheBackend, RedisCacheBackend
+    from kipp.redis.utils import RedisUtils
+
+    # one copy per host
+    host_cache = MmapCacheBackend("/dev/shm/myapp.cache", n_slots=8192)
+
+    @timeout_cache(expires_sec=60, backend=host_cache)
+    def load_rates():
+        ...
+
+    # one copy per cluster
+    cluster_cache = RedisCacheBackend(RedisUtils(redis.Redis()), serializer="msgpack")
+
+    @timeout_cache(expires_sec=60, backend=cluster_cache)
+    def load_user(uid):
+        ...
+
+Values are serialized with pickle by default, so only share a backend
+between processes that trust each other.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import pickle
+import struct
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial
+from threading import Lock
+from typing import Any
+
+import redis
+import xxhash
+
+from kipp.redis.utils import SCAN_COUNT, RedisUtils
+
+from .cache import CacheBackend
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is Unix-only; MmapCacheBackend refuses to start without it
+    fcntl = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # type: ignore[assignment]
+
+MMAP_FILE_MAGIC = b"KIPPSHM\x00"
+MMAP_FILE_VERSION = 1
+# magic, version, n_slots, slot_size; padded to _MMAP_HEADER_SIZE
+_MMAP_HEADER = struct.Struct("<8sIII")
+_MMAP_HEADER_SIZE = 64
+# key hash, expire_at (wall clock), key length, value length
+_SLOT_HEADER = struct.Struct("<QdII")
+
+_DELETE_BATCH = 500
+
+
+def _get_serializer(
+    serializer: str,
+) -> tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    assert serializer in (
+        "pickle",
+        "msgpack",
+    ), "serializer should be pickle or msgpack, but got {}".format(serializer)
+    if serializer == "pickle":
+        return partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads
+
+    assert msgpack is not None, "msgpack is not installed"
+    return partial(msgpack.packb, use_bin_type=True), partial(
+        msgpack.unpackb, raw=False
+    )
+
+
+class MmapCacheBackend(CacheBackend):
+    """Cache shared by every process on a host through a memory-mapped file.
+
+    The file holds a fixed table of ``n_slots`` slots of ``slot_size`` bytes.
+    A key is stored in the slot picked by its xxh64 hash, together with the
+    full key so that hash collisions are detected, and a newer key simply
+    replaces whatever shared its slot.  Values whose serialized form does not
+    fit in a slot are not shared.  Put the file on a tmpfs such as
+    ``/dev/shm`` to keep it in memory.
+
+    Each slot is guarded by a POSIX byte-range lock (``fcntl.lockf``) across
+    processes, plus a lock between threads of the same process.  Expiry uses
+    the wall clock, since it is compared across processes.
+
+    Args:
+        path: file backing the table, created if it does not exist
+        n_slots: number of slots in the table
+        slot_size: bytes per slot, including the key and a 24-byte header
+        serializer: ``"pickle"`` or ``"msgpack"``
+    """
+
+    def __init__(
+        self,
+        path: str,
+        n_slots: int = 4096,
+        slot_size: int = 4096,
+        serializer: str = "pickle",
+    ) -> None:
+        assert fcntl is not None, "MmapCacheBackend requires fcntl (Unix only)"
+        assert n_slots > 0, "n_slots should greater than 0, but got {}".format(n_slots)
+        assert (
+            slot_size > _SLOT_HEADER.size
+        ), "slot_size should greater than {}, but got {}".format(
+            _SLOT_HEADER.size, slot_size
+        )
+        self.path = path
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self._dumps, self._loads = _get_serializer(serializer)
+        self._lock = Lock()
+
+        size = _MMAP_HEADER_SIZE + n_slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _MMAP_HEADER_SIZE, 0)
+            try:
+                self._init_file(size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _MMAP_HEADER_SIZE, 0)
+            self._mmap = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _init_file(self, size: int) -> None:
+        file_size = os.fstat(self._fd).st_size
+        if file_size == 0:
+            os.ftruncate(self._fd, size)
+            header = _MMAP_HEADER.pack(
+                MMAP_FILE_MAGIC, MMAP_FILE_VERSION, self.n_slots, self.slot_size
+            )
+            os.pwrite(self._fd, header, 0)
+            return
+
+        magic, version, n_slots, slot_size = _MMAP_HEADER.unpack(
+            os.pread(self._fd, _MMAP_HEADER.size, 0)
+        )
+        if magic != MMAP_FILE_MAGIC or version != MMAP_FILE_VERSION:
+            raise ValueError("{} is not a kipp cache file".format(self.path))
+        if (n_slots, slot_size) != (self.n_slots, self.slot_size) or file_size != size:
+            raise ValueError(
+                "{} was created with n_slots={}, slot_size={}".format(
+                    self.path, n_slots, slot_size
+                )
+            )
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _slot(self, key: str) -> tuple[bytes, int, int]:
+        kb = key.encode("utf-8")
+        khash = xxhash.xxh64_intdigest(kb)
+        return kb, khash, _MMAP_HEADER_SIZE + (khash % self.n_slots) * self.slot_size
+
+    @contextmanager
+    def _locked(self, offset: int, length: int, exclusive: bool) -> Iterator[None]:
+        with self._lock:
+            fcntl.lockf(
+                self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, length, offset
+            )
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def _match(self, offset: int, kb: bytes, khash: int) -> tuple[int, int] | None:
+        """Return (key length, value length) when the slot holds this key."""
+        slot_hash, expire_at, klen, vlen = _SLOT_HEADER.unpack_from(self._mmap, offset)
+        if klen == 0 or slot_hash != khash or expire_at < time.time():
+            return None
+
+        start = offset + _SLOT_HEADER.size
+        if self._mmap[start : start + klen] != kb:
+            return None
+        return klen, vlen
+
+    def __len__(self) -> int:
+        now = time.time()
+        n = 0
+        with self._locked(_MMAP_HEADER_SIZE, self.n_slots * self.slot_size, False):
+            for i in range(self.n_slots):
+                offset = _MMAP_HEADER_SIZE + i * self.slot_size
+                _, expire_at, klen, _ = _SLOT_HEADER.unpack_from(self._mmap, offset)
+                n += klen != 0 and expire_at >= now
+
+        return n
+
+    def get(self, key: str, default: Any = None) -> Any:
+        kb, khash, offset = self._slot(key)
+        with self._locked(offset, self.slot_size, False):
+            lens = self._match(offset, kb, khash)
+            if lens is None:
+                return default
+
+            start = offset + _SLOT_HEADER.size + lens[0]
+            data = self._mmap[start : start + lens[1]]
+
+        return self._loads(data)
+
+    def set(self, key: str, value: Any, ttl: int | float | None = None) -> None:
+        kb, khash, offset = self._slot(key)
+        data = self._dumps(value)
+        if _SLOT_HEADER.size + len(kb) + len(data) > self.slot_size:
+            return
+
+        expire_at = float("inf") if ttl is None else time.time() + ttl
+        start = offset + _SLOT_HEADER.size
+        with self._locked(offset, self.slot_size, True):
+            self._mmap[start : start + len(kb)] = kb
+            self._mmap[start + len(kb) : start + len(kb) + len(data)] = data
+            _SLOT_HEADER.pack_into(
+                self._mmap, offset, khash, expire_at, len(kb), len(data)
+            )
+
+    def delete(self, key: str) -> bool:
+        kb, khash, offset = self._slot(key)
+        with self._locked(offset, self.slot_size, True):
+            if self._match(offset, kb, khash) is None:
+                return False
+            _SLOT_HEADER.pack_into(self._mmap, offset, 0, 0, 0, 0)
+            return True
+
+    def clear(self) -> None:
+        with self._locked(_MMAP_HEADER_SIZE, self.n_slots * self.slot_size, True):
+            for i in range(self.n_slots):
+                offset = _MMAP_HEADER_SIZE + i * self.slot_size
+                _SLOT_HEADER.pack_into(self._mmap, offset, 0, 0, 0, 0)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache shared by every process that talks to one Redis.
+
+    Values are serialized and stored under ``prefix + key`` with a
+    millisecond TTL.  ``get_many`` and ``set_many`` batch their keys into a
+    single ``MGET`` or pipeline round trip.  Redis errors, and values that
+    fail to deserialize, are logged through the ``RedisUtils`` logger and
+    treated as misses, so an unavailable Redis degrades to recomputing
+    instead of failing the call.
+
+    Args:
+        redis_utils: ``RedisUtils`` wrapping the client to use
+        prefix: namespace prepended to every key
+        serializer: ``"pickle"`` or ``"msgpack"``
+    """
+
+    def __init__(
+        self,
+        redis_utils: RedisUtils,
+        prefix: str = "kipp:cache:",
+        serializer: str = "pickle",
+    ) -> None:
+        self.utils = redis_utils
+        self.prefix = prefix
+        self._dumps, self._loads = _get_serializer(serializer)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            data = self.utils.client.get(self.prefix + key)
+        except redis.RedisError as err:
+            self.utils.logger.error(
+                "Error in cache get", extra={"key": key, "error": err}
+            )
+            return default
+
+        return default if data is None else self._load(key, data, default)
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        if not keys:
+            return {}
+
+        try:
+            values = self.utils.client.mget([self.prefix + k for k in keys])
+        except redis.RedisError as err:
+            self.utils.logger.error(
+                "Error in cache get_many", extra={"n_keys": len(keys), "error": err}
+            )
+            return {}
+
+        miss = object()
+        items = (
+            (k, self._load(k, v, miss)) for k, v in zip(keys, values) if v is not None
+        )
+        return {k: v for k, v in items if v is not miss}
+
+    def _load(self, key: str, data: bytes, default: Any) -> Any:
+        # a corrupt value, or one written with another serializer, is a miss
+        try:
+            return self._loads(data)
+        except Exception as err:
+            self.utils.logger.error(
+                "Error in cache loads", extra={"key": key, "error": err}
+            )
+            return default
+
+    def set(self, key: str, value: Any, ttl: int | float | None = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: dict[str, Any], ttl: int | float | None = None) -> None:
+        """Store all items with one pipelined round trip."""
+        px = None if ttl is None else max(1, int(ttl * 1000))
+        try:
+            with self.utils.client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self.prefix + key, self._dumps(value), px=px)
+                pipe.execute()
+        except redis.RedisError as err:
+            self.utils.logger.error(
+                "Error in cache set", extra={"n_keys": len(items), "error": err}
+            )
+
+    def delete(self, key: str) -> bool:
+        try:
+            return bool(self.utils.client.delete(self.prefix + key))
+        except redis.RedisError as err:
+            self.utils.logger.error(
+                "Error in cache delete", extra={"key": key, "error": err}
+            )
+            return False
+
+    def clear(self) -> None:
+        """Delete every key under ``prefix``, scanning instead of ``KEYS``."""
+        assert self.prefix, "do not clear all keys"
+        client = self.utils.client
+        batch: list[bytes | str] = []
+        try:
+            for key in client.scan_iter(match=self.prefix + "*", count=SCAN_COUNT):
+                batch.append(key)
+                if len(batch) >= _DELETE_BATCH:
+                    client.delete(*batch)
+                    batch = []
+
+            if batch:
+                client.delete(*batch)
+        except redis.RedisError as err:
+            self.utils.logger.error(
+                "Error in cache clear", extra={"prefix": self.prefix, "error": err}
+            )
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+---------------
+Circuit Breaker
+---------------
+
+Stop calling a downstream that keeps failing, and let it recover.
+
+Usage
+::
+
+    from kipp.decorator import CircuitBreaker, RetryBudget, retry
+
+    s3_breaker = CircuitBreaker("s3", failure_threshold=0.5, recovery_sec=10)
+    s3_budget = RetryBudget(rate=5, burst=20)
+
+    @retry(IOError, tries=3, delay=0.2, breaker=s3_breaker, budget=s3_budget)
+    def request_s3_image(url):
+        ...
+
+    # or on its own
+    @s3_breaker
+    def head_object(key):
+        ...
+
+While the circuit is open every call fails in microseconds with
+:class:`~kipp.decorator.exceptions.CircuitOpenError` instead of waiting on
+the downstream.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+from collections.abc import Callable
+from threading import Lock
+from time import monotonic
+from typing import Any, TypeVar
+
+from kipp.utils import get_logger
+
+from .exceptions import CircuitOpenError
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker over a sliding failure window.
+
+    Outcomes are counted in ``n_buckets`` time buckets spanning ``window_sec``,
+    so the failure rate only reflects recent calls and recording costs O(1).
+    Once at least ``min_calls`` calls in the window failed at a rate of
+    ``failure_threshold`` or more the circuit opens and calls are rejected.
+    After ``recovery_sec`` it turns half-open and lets up to
+    ``half_open_max_calls`` probe calls through: a successful probe closes
+    the circuit, a failed one opens it again.
+
+    Only exceptions matching ``exceptions`` count as failures; anything else
+    propagates without affecting the circuit.  One instance can be shared
+    by any number of threads and functions that call the same downstream.
+
+    Args:
+        name: label used in errors and logs
+        failure_threshold: failure rate in (0, 1] that opens the circuit
+        window_sec: length of the sliding window in seconds
+        min_calls: calls needed in the window before the rate is trusted
+        recovery_sec: seconds the circuit stays open before probing
+        half_open_max_calls: concurrent probe calls while half-open
+        exceptions: exception types that count as failures
+        n_buckets: resolution of the sliding window
+        on_state_change: called as ``(breaker, old_state, new_state)`` while
+            the breaker's lock is held, so it must not call back into it
+        clock: monotonic time source in seconds
+    """
+
+    def __init__(
+        self,
+        name: str = "default",
+        failure_threshold: float = 0.5,
+        window_sec: int | float = 30,
+        min_calls: int = 20,
+        recovery_sec: int | float = 30,
+        half_open_max_calls: int = 1,
+        exceptions: type[BaseException] | tuple[type[BaseException], ...] = Exception,
+        n_buckets: int = 10,
+        on_state_change: Callable[[CircuitBreaker, str, str], Any] | None = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        assert 0 < failure_threshold <= 1, (
+            "failure_threshold should in (0, 1], but got {}".format(failure_threshold)
+        )
+        assert window_sec > 0, "window_sec should greater than 0, but got {}".format(
+            window_sec
+        )
+        assert min_calls >= 1, "min_calls should not less than 1, but got {}".format(
+            min_calls
+        )
+        assert half_open_max_calls >= 1, (
+            "half_open_max_calls should not less than 1, but got {}".format(
+                half_open_max_calls
+            )
+        )
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.recovery_sec = recovery_sec
+        self.half_open_max_calls = half_open_max_calls
+        self.exceptions = exceptions
+        self.on_state_change = on_state_change
+        self._clock = clock
+        self._lock = Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._n_buckets = n_buckets
+        self._bucket_sec = window_sec / n_buckets
+        # per bucket: [epoch, successes, failures]
+        self._buckets = [[-1, 0, 0] for _ in range(n_buckets)]
+
+    def __repr__(self) -> str:
+        return "<CircuitBreaker {} {}>".format(self.name, self.state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            return self._state
+
+    def counts(self) -> tuple[int, int]:
+        """Return (successes, failures) within the window."""
+        with self._lock:
+            return self._counts(self._clock())
+
+    def failure_rate(self) -> float:
+        successes, failures = self.counts()
+        total = successes + failures
+        return failures / total if total else 0.0
+
+    def reset(self) -> None:
+        """Close the circuit and forget the window."""
+        with self._lock:
+            self._transition(CLOSED)
+            self._reset_window()
+
+    def acquire(self) -> None:
+        """Ask permission for one call, raising CircuitOpenError if refused.
+
+        Every successful ``acquire`` must be followed by exactly one of
+        :meth:`record_success`, :meth:`record_failure` or :meth:`release`.
+        """
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            if self._state == CLOSED:
+                return
+
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+
+            retry_after = max(0.0, self._opened_at + self.recovery_sec - now)
+
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+                self._reset_window()
+                return
+            self._bucket(self._clock())[1] += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self._clock()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+
+            self._bucket(now)[2] += 1
+            if self._state == CLOSED:
+                successes, failures = self._counts(now)
+                total = successes + failures
+                if (
+                    total >= self.min_calls
+                    and failures >= total * self.failure_threshold
+                ):
+                    self._open(now)
+
+    def release(self) -> None:
+        """Give back a permission without recording an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kw: Any) -> Any:
+        """Call fn through the breaker."""
+        self.acquire()
+        try:
+            result = fn(*args, **kw)
+        except self.exceptions:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+
+        self.record_success()
+        return result
+
+    async def call_async(self, fn: Callable[..., Any], *args: Any, **kw: Any) -> Any:
+        """Await fn through the breaker."""
+        self.acquire()
+        try:
+            result = await fn(*args, **kw)
+        except self.exceptions:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+
+        self.record_success()
+        return result
+
+    def __call__(self, fn: F) -> F:
+        """Use the breaker as a decorator, for plain and ``async def`` functions."""
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kw: Any) -> Any:
+                return await self.call_async(fn, *args, **kw)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kw: Any) -> Any:
+            return self.call(fn, *args, **kw)
+
+        return wrapper  # type: ignore[return-value]
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.recovery_sec:
+            self._transition(HALF_OPEN)
+            self._probes = 0
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        old, self._state = self._state, state
+        if old == state:
+            return
+
+        get_logger().info("circuit %s: %s -> %s", self.name, old, state)
+        if self.on_state_change is not None:
+            self.on_state_change(self, old, state)
+
+    def _reset_window(self) -> None:
+        for bucket in self._buckets:
+            bucket[:] = [-1, 0, 0]
+
+    def _bucket(self, now: float) -> list[int]:
+        epoch = int(now // self._bucket_sec)
+        bucket = self._buckets[epoch % self._n_buckets]
+        if bucket[0] != epoch:
+            bucket[:] = [epoch, 0, 0]
+        return bucket
+
+    def _counts(self, now: float) -> tuple[int, int]:
+        oldest = int(now // self._bucket_sec) - self._n_buckets
+        successes = failures = 0
+        for epoch, ok, failed in self._buckets:
+            if epoch > oldest:
+                successes += ok
+                failures += failed
+        return successes, failures
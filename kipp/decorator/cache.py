@@ -0,0 +1,652 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+------------
+Cache Engine
+------------
+
+Storage used by the caching decorators in ``kipp.decorator``.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import pickle
+import sys
+import weakref
+from collections import OrderedDict, namedtuple
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+import xxhash
+
+from kipp.utils import ThreadPoolExecutor
+
+CacheItem = namedtuple("CacheItem", ["data", "timeout_at"])
+CacheInfo = namedtuple(
+    "CacheInfo",
+    [
+        "hits",
+        "misses",
+        "evictions",
+        "expirations",
+        "size",
+        "max_size",
+        "nbytes",
+        "time_saved",
+    ],
+)
+
+_MISSING = object()
+
+_refresh_executor: ThreadPoolExecutor | None = None
+_refresh_executor_lock = Lock()
+
+
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """Return the shared pool that runs background cache refreshes."""
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _refresh_executor_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="kipp-cache-refresh"
+                )
+
+    return _refresh_executor
+
+
+class _Marker:
+    """Tags frozen containers so that ``[1]`` and ``(1,)`` give distinct keys."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return "<{}>".format(self.name)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (_Marker, (self.name,))
+
+
+_EMPTY_KEY = _Marker("empty")
+_KWD_MARK = _Marker("kwd")
+_LIST_MARK = _Marker("list")
+_DICT_MARK = _Marker("dict")
+_SET_MARK = _Marker("set")
+_REPR_MARK = _Marker("repr")
+_FAST_TYPES = frozenset((int, str))
+
+
+class _HashedKey(list):
+    """Key that computes its hash once, like ``functools._HashedSeq``."""
+
+    __slots__ = ("hashvalue",)
+
+    def __init__(self, items: tuple[Any, ...]) -> None:
+        self[:] = items
+        self.hashvalue = hash(items)
+
+    def __hash__(self) -> int:  # type: ignore[override]
+        return self.hashvalue
+
+
+def _freeze(obj: Any) -> Any:
+    """Recursively turn lists, dicts and sets into tagged tuples."""
+    if isinstance(obj, _HashedKey):
+        return tuple(_freeze(v) for v in obj)
+    if isinstance(obj, (list, tuple)):
+        frozen = tuple(_freeze(v) for v in obj)
+        return frozen if isinstance(obj, tuple) else (_LIST_MARK,) + frozen
+    if isinstance(obj, dict):
+        items = [(_freeze(k), _freeze(v)) for k, v in obj.items()]
+        return (_DICT_MARK,) + tuple(_sorted(items))
+    if isinstance(obj, (set, frozenset)):
+        return (_SET_MARK,) + tuple(_sorted([_freeze(v) for v in obj]))
+    return obj
+
+
+def _sorted(items: list[Any]) -> list[Any]:
+    # give equal containers one order; fall back to repr for mixed types
+    try:
+        return sorted(items)
+    except TypeError:
+        return sorted(items, key=repr)
+
+
+def _dumps(frozen: Any) -> bytes:
+    try:
+        return pickle.dumps(frozen, protocol=4)
+    except Exception:
+        return repr(frozen).encode("utf-8")
+
+
+def _make_key(args: tuple[Any, ...], kw: dict[str, Any], typed: bool) -> Hashable:
+    if not kw:
+        if not args:
+            return _EMPTY_KEY
+        # a bare int or str can never equal a _HashedKey, and with typed
+        # keys nothing else can equal it either; untyped keys skip this so
+        # that f(1), f(True) and f(1.0) consistently share one entry
+        if typed and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+            return args[0]
+
+    key = args
+    if kw:
+        key += (_KWD_MARK,) + tuple(itertools.chain.from_iterable(sorted(kw.items())))
+    if typed:
+        key += tuple(type(v) for v in args)
+        if kw:
+            key += tuple(type(kw[k]) for k in sorted(kw))
+
+    try:
+        return _HashedKey(key)
+    except TypeError:
+        pass
+
+    # unhashable arguments such as lists of ids or dicts of filters
+    frozen = _freeze(key)
+    try:
+        return _HashedKey(frozen)
+    except TypeError:
+        # objects without a hash, e.g. plain dataclasses, are keyed on
+        # their pickle, or their repr as the old ``str(args)`` keys were
+        return _HashedKey((_REPR_MARK, _xxh128_hexdigest(_dumps(frozen))))
+
+
+def args_key(*args: Any, **kw: Any) -> Hashable:
+    """Build a cache key from the call arguments without stringifying them.
+
+    Hashable arguments are used as they are, so the key costs a tuple and
+    one hash, and distinct arguments can never collide.  Lists, dicts and
+    sets are frozen into tagged tuples first, and any other unhashable
+    argument is keyed on a digest of its pickle or ``repr``.  Keyword order
+    is ignored.  Like ``functools.lru_cache``, equal arguments of different
+    types such as ``f(1)``, ``f(True)`` and ``f(1.0)`` share a key; use
+    :func:`typed_args_key` to tell them apart.
+    """
+    return _make_key(args, kw, False)
+
+
+def typed_args_key(*args: Any, **kw: Any) -> Hashable:
+    """Like :func:`args_key`, but arguments of different types never share a key."""
+    return _make_key(args, kw, True)
+
+
+def _xxh128_hexdigest(data: bytes) -> str:
+    xxh3_128 = getattr(xxhash, "xxh3_128", None)
+    if xxh3_128 is not None:
+        return xxh3_128(data).hexdigest()
+
+    # xxhash<2 has no 128-bit variant, so join two independently seeded xxh64
+    return (
+        xxhash.xxh64(data, seed=0).hexdigest()
+        + xxhash.xxh64(data, seed=1).hexdigest()
+    )
+
+
+def hashed_args_key(bits: int = 128, typed: bool = False) -> Callable[..., str]:
+    """Return a key function that digests the arguments into a hex string.
+
+    Use this when keys have to be short strings, e.g. for a shared backend,
+    or when the arguments are too large to keep in memory as the key.  The
+    arguments are frozen as in :func:`args_key` and pickled, so the digest
+    does not depend on ``repr``.
+
+    Args:
+        bits: 64 for xxh64, 128 for xxh3_128 (two seeded xxh64 on xxhash<2)
+        typed: digest :func:`typed_args_key` instead of :func:`args_key`
+    """
+    assert bits in (64, 128), "bits should be 64 or 128, but got {}".format(bits)
+    digest = _xxh128_hexdigest if bits == 128 else xxhash.xxh64_hexdigest
+
+    def key(*args: Any, **kw: Any) -> str:
+        return digest(_dumps(_freeze(_make_key(args, kw, typed))))
+
+    return key
+
+
+class CacheBackend:
+    """Storage interface used by ``timeout_cache``.
+
+    :class:`TTLCache` is the default, process-local implementation; the
+    shared ones live in :mod:`kipp.decorator.backends`.  Keys handed to
+    shared backends are always strings.
+    """
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the live value for key, or default."""
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, ttl: int | float | None = None) -> None:
+        """Store value under key for ttl seconds."""
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove key, returning whether it was present."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def get_many(self, keys: list[Hashable]) -> dict[Hashable, Any]:
+        """Return the live values of keys in one round trip where supported."""
+        miss = _MISSING
+        items = ((k, self.get(k, miss)) for k in keys)
+        return {k: v for k, v in items if v is not miss}
+
+    def set_many(
+        self, items: dict[Hashable, Any], ttl: int | float | None = None
+    ) -> None:
+        """Store all items in one round trip where supported."""
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+
+class TTLCache(CacheBackend):
+    """Bounded LRU cache whose entries expire after a time-to-live.
+
+    Entries live in an ``OrderedDict`` kept in recency order, so a hit is a
+    ``move_to_end`` and evicting the least recently used entry is a
+    ``popitem``, both O(1).  Expiry times are pushed onto a min-heap, and
+    every insert pops the entries that are due, so expired entries are
+    reclaimed in O(log n) each instead of by sweeping the whole cache.
+    ``max_size`` is a hard cap: once it is exceeded the least recently used
+    entries are evicted even if they are still fresh.
+
+    Heap records are not removed when an entry is overwritten or evicted;
+    they are skipped when popped, and the heap is rebuilt whenever stale
+    records outnumber live entries.
+
+    Args:
+        max_size: maximum number of entries
+        ttl: default seconds before an entry expires, None to never expire
+        clock: monotonic time source in seconds
+
+    Examples:
+    ::
+        cache = TTLCache(max_size=1024, ttl=30)
+        cache.set("key", "value")
+        cache.get("key")  # "value"
+    """
+
+    def __init__(
+        self,
+        max_size: int = 128,
+        ttl: int | float | None = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        assert max_size > 0, "max_size should greater than 0, but got {}".format(
+            max_size
+        )
+        self.max_size: int = max_size
+        self.ttl: int | float | None = ttl
+        self._clock: Callable[[], float] = clock
+        self._data: OrderedDict[Hashable, CacheItem] = OrderedDict()
+        self._heap: list[tuple[float, int, Hashable]] = []
+        # tie-breaker so that heap records never compare keys
+        self._seq = itertools.count()
+        self._lock: Lock = Lock()
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the live value for key and mark it most recently used."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            if item.timeout_at < self._clock():
+                del self._data[key]
+                self.expirations += 1
+                return default
+
+            self._data.move_to_end(key)
+            return item.data
+
+    def set(self, key: Hashable, value: Any, ttl: int | float | None = None) -> None:
+        """Insert or replace key, evicting expired and then LRU entries.
+
+        Args:
+            key: cache key
+            value: value to store
+            ttl: seconds before expiry, defaults to the cache's ``ttl``
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            now = self._clock()
+            timeout_at = float("inf") if ttl is None else now + ttl
+            self._data[key] = CacheItem(data=value, timeout_at=timeout_at)
+            self._data.move_to_end(key)
+            if ttl is not None:
+                heapq.heappush(self._heap, (timeout_at, next(self._seq), key))
+
+            self._purge_expired(now)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove key, returning whether it was present."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._heap.clear()
+
+    def nbytes(self) -> int:
+        """Estimate the memory held by keys and values, shallowly."""
+        with self._lock:
+            items = list(self._data.items())
+        return sum(sys.getsizeof(k) + sys.getsizeof(item.data) for k, item in items)
+
+    def _purge_expired(self, now: float) -> None:
+        heap, data = self._heap, self._data
+        while heap and heap[0][0] < now:
+            timeout_at, _, key = heapq.heappop(heap)
+            item = data.get(key)
+            # skip records of entries that were overwritten since
+            if item is not None and item.timeout_at == timeout_at:
+                del data[key]
+                self.expirations += 1
+
+        if len(heap) > 2 * len(data) + 64:
+            self._heap = [
+                (item.timeout_at, next(self._seq), key)
+                for key, item in data.items()
+                if item.timeout_at != float("inf")
+            ]
+            heapq.heapify(self._heap)
+
+
+class _BoundedEntry:
+    __slots__ = ("value", "nbytes", "freq", "weak")
+
+    def __init__(self, value: Any, nbytes: int, weak: bool) -> None:
+        self.value = value
+        self.nbytes = nbytes
+        self.freq = 1
+        self.weak = weak
+
+
+class BoundedCache(CacheBackend):
+    """Cache bounded by entry count and/or approximate memory, without expiry.
+
+    ``policy="lru"`` evicts the least recently used entry; ``policy="lfu"``
+    evicts the least frequently used one, oldest first among equals, using
+    frequency buckets so that both lookups and evictions stay O(1).  Sizes
+    come from ``sizeof`` (``sys.getsizeof`` of key and value by default),
+    which is shallow: pass a deeper estimator for nested results.
+
+    With ``weak=True`` values that support weak references are held through
+    one, so the cache never keeps a result alive on its own; dead entries
+    are dropped when next looked up or evicted.  Values such as ints,
+    strings or tuples cannot be weakly referenced and are held normally.
+
+    Args:
+        max_size: maximum number of entries, None for no count limit
+        max_bytes: maximum estimated bytes, None for no memory limit
+        policy: ``"lru"`` or ``"lfu"``
+        weak: hold values through weak references where possible
+        sizeof: estimates the bytes used by a ``(key, value)`` pair
+    """
+
+    def __init__(
+        self,
+        max_size: int | None = None,
+        max_bytes: int | None = None,
+        policy: str = "lru",
+        weak: bool = False,
+        sizeof: Callable[[Hashable, Any], int] | None = None,
+    ) -> None:
+        assert max_size is None or max_size > 0, (
+            "max_size should greater than 0, but got {}".format(max_size)
+        )
+        assert max_bytes is None or max_bytes > 0, (
+            "max_bytes should greater than 0, but got {}".format(max_bytes)
+        )
+        assert policy in ("lru", "lfu"), (
+            "policy should be lru or lfu, but got {}".format(policy)
+        )
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.weak = weak
+        self._sizeof = sizeof or (lambda k, v: sys.getsizeof(k) + sys.getsizeof(v))
+        self._data: dict[Hashable, _BoundedEntry] = {}
+        # lru: recency order; lfu: one insertion-ordered bucket per frequency
+        self._lru: OrderedDict[Hashable, None] = OrderedDict()
+        self._freqs: dict[int, OrderedDict[Hashable, None]] = {}
+        self._min_freq = 1
+        self._nbytes = 0
+        self._lock: Lock = Lock()
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            value = entry.value() if entry.weak else entry.value
+            if value is None and entry.weak:
+                self._remove(key)
+                return default
+
+            self._touch(key, entry)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: int | float | None = None) -> None:
+        """Store value; ``ttl`` is accepted for interface parity and ignored."""
+        nbytes = self._sizeof(key, value)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        weak = False
+        if self.weak:
+            try:
+                value = weakref.ref(value)
+                weak = True
+            except TypeError:
+                pass
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            while self._data and (
+                (self.max_size is not None and len(self._data) >= self.max_size)
+                or (
+                    self.max_bytes is not None
+                    and self._nbytes + nbytes > self.max_bytes
+                )
+            ):
+                self._remove(self._victim())
+                self.evictions += 1
+
+            self._data[key] = _BoundedEntry(value, nbytes, weak)
+            self._nbytes += nbytes
+            if self.policy == "lru":
+                self._lru[key] = None
+            else:
+                self._freqs.setdefault(1, OrderedDict())[key] = None
+                self._min_freq = 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._lru.clear()
+            self._freqs.clear()
+            self._min_freq = 1
+            self._nbytes = 0
+
+    def _touch(self, key: Hashable, entry: _BoundedEntry) -> None:
+        if self.policy == "lru":
+            self._lru.move_to_end(key)
+            return
+
+        freq = entry.freq
+        bucket = self._freqs[freq]
+        del bucket[key]
+        if not bucket:
+            del self._freqs[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        entry.freq = freq + 1
+        self._freqs.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def _victim(self) -> Hashable:
+        if self.policy == "lru":
+            return next(iter(self._lru))
+
+        if self._min_freq not in self._freqs:
+            self._min_freq = min(self._freqs)
+        return next(iter(self._freqs[self._min_freq]))
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key)
+        self._nbytes -= entry.nbytes
+        if self.policy == "lru":
+            del self._lru[key]
+            return
+
+        bucket = self._freqs[entry.freq]
+        del bucket[key]
+        if not bucket:
+            del self._freqs[entry.freq]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block on the same ``Future`` and receive its result, or its
+    exception.  Nothing is remembered once the call finishes, so this is
+    meant to sit in front of a cache, not to replace it.
+
+    Examples:
+    ::
+        flight = SingleFlight()
+        flight.do("user:42", load_user, 42)
+    """
+
+    def __init__(self) -> None:
+        self._lock: Lock = Lock()
+        self._calls: dict[Hashable, Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kw: Any) -> Any:
+        """Run ``fn(*args, **kw)`` unless a call for key is already running."""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn(*args, **kw)
+        except BaseException as err:
+            fut.set_exception(err)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class CacheStats:
+    """Counters kept by the caching decorators for ``cache_info()``.
+
+    Updates are not locked, so under heavy contention the counts are
+    approximate; they are meant for sizing ``max_size`` and ``expires_sec``,
+    not for accounting.  ``time_saved`` assumes every hit would have cost the
+    average duration of the calls that were actually computed.
+    """
+
+    __slots__ = ("hits", "misses", "n_computed", "compute_time", "_next_dump_at")
+
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        self.n_computed: int = 0
+        self.compute_time: float = 0.0
+        self._next_dump_at: float = 0.0
+
+    def record_compute(self, cost: float) -> None:
+        self.n_computed += 1
+        self.compute_time += cost
+
+    @property
+    def time_saved(self) -> float:
+        if not self.n_computed:
+            return 0.0
+        return self.hits * self.compute_time / self.n_computed
+
+    def clear(self) -> None:
+        self.hits = self.misses = self.n_computed = 0
+        self.compute_time = 0.0
+
+    def due(self, now: float, interval: float) -> bool:
+        """Return True at most once per interval, for periodic dumps."""
+        if now < self._next_dump_at:
+            return False
+        first = not self._next_dump_at
+        self._next_dump_at = now + interval
+        return not first
+
+    def info(self, cache: Any, max_size: int | None = None) -> CacheInfo:
+        """Combine these counters with what the cache backend can report."""
+        try:
+            size = len(cache)
+        except TypeError:
+            size = None
+        nbytes = getattr(cache, "nbytes", None)
+        if isinstance(cache, dict):
+            nbytes = lambda: sum(  # noqa: E731
+                sys.getsizeof(k) + sys.getsizeof(v) for k, v in list(cache.items())
+            )
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=getattr(cache, "evictions", None),
+            expirations=getattr(cache, "expirations", None),
+            size=size,
+            max_size=max_size,
+            nbytes=nbytes() if callable(nbytes) else None,
+            time_saved=self.time_saved,
+        )
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Exceptions raised by the resilience decorators.
+
+Hierarchy: KippException -> CircuitOpenError.
+"""
+
+from __future__ import annotations
+
+from kipp.libs import KippException
+
+
+class CircuitOpenError(KippException):
+    """Raised instead of calling a downstream whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float = 0.0) -> None:
+        super().__init__(
+            "circuit {} is open, retry after {:.2f}s".format(name, retry_after)
+        )
+        self.name = name
+        self.retry_after = retry_after
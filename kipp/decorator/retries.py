@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+------------
+Retry Engine
+------------
+
+Backoff policies behind ``kipp.decorator.retry``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import random
+import time as _time_module
+from collections import namedtuple
+from collections.abc import Callable
+from threading import Lock
+from time import monotonic
+from typing import Any, TypeVar
+
+from .breaker import CircuitBreaker
+from .exceptions import CircuitOpenError
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+JITTERS = (None, "full", "decorrelated")
+
+RetryState = namedtuple(
+    "RetryState", ["func", "attempt", "elapsed", "delay", "exception", "result"]
+)
+RetryState.__doc__ = """Passed to ``on_retry`` before each sleep and to ``on_giveup``.
+
+Fields:
+    func: the decorated function
+    attempt: number of the attempt that just failed, starting at 1
+    elapsed: seconds since the first attempt started
+    delay: seconds about to be slept, None when giving up
+    exception: exception raised by the attempt, or None
+    result: result rejected by ``retry_on_result``, or None
+"""
+
+
+class RetryBudget:
+    """Token bucket that caps how many retries a group of callers may make.
+
+    Every retry takes one token.  Tokens refill at ``rate`` per second up to
+    ``burst``, and each call's first attempt may add ``ratio`` tokens, so the
+    retry volume follows the traffic (``ratio=0.1`` allows about one retry
+    per ten calls).  When the bucket is empty, failing calls give up at once
+    instead of sleeping, which keeps an outage from multiplying the load on
+    the downstream and from tying up worker threads.  Share one instance
+    between every caller of a downstream; it is thread-safe.
+
+    Args:
+        rate: tokens added per second
+        burst: maximum tokens held, also the initial amount
+        ratio: tokens added by each new call
+        clock: monotonic time source in seconds
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 10.0,
+        ratio: float = 0.0,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        assert rate >= 0, "rate should not be negative, but got {}".format(rate)
+        assert burst >= 1, "burst should not less than 1, but got {}".format(burst)
+        self.rate = rate
+        self.burst = burst
+        self.ratio = ratio
+        self._clock = clock
+        self._lock = Lock()
+        self._tokens = float(burst)
+        self._updated_at = clock()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        """Credit ``ratio`` tokens for a new call."""
+        if self.ratio:
+            with self._lock:
+                self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """Take a token for one retry, returning False if none is left."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _RetryLoop:
+    """Decides, after each failed attempt, whether and how long to wait."""
+
+    __slots__ = (
+        "func",
+        "tries",
+        "delay",
+        "backoff",
+        "max_delay",
+        "jitter",
+        "deadline",
+        "on_retry",
+        "on_giveup",
+        "budget",
+        "start_at",
+        "attempt",
+        "_next_delay",
+    )
+
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        tries: int,
+        delay: int | float,
+        backoff: int | float,
+        max_delay: int | float | None,
+        jitter: str | None,
+        deadline: int | float | None,
+        on_retry: Callable[[RetryState], Any] | None,
+        on_giveup: Callable[[RetryState], Any] | None,
+        budget: RetryBudget | None,
+    ) -> None:
+        self.func = func
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.on_retry = on_retry
+        self.on_giveup = on_giveup
+        self.budget = budget
+        if budget is not None:
+            budget.deposit()
+        self.start_at = monotonic()
+        self.attempt = 0
+        self._next_delay = delay
+
+    @property
+    def is_last(self) -> bool:
+        return self.attempt >= self.tries
+
+    def _sleep_for(self) -> float:
+        if self.jitter == "decorrelated":
+            # "decorrelated jitter": sleep = rand(base, 3 * previous sleep)
+            sleep = random.uniform(self.delay, self._next_delay * 3)
+            if self.max_delay is not None:
+                sleep = min(sleep, self.max_delay)
+            self._next_delay = sleep
+            return sleep
+
+        sleep = self._next_delay
+        if self.max_delay is not None:
+            sleep = min(sleep, self.max_delay)
+        self._next_delay *= self.backoff
+        if self.jitter == "full":
+            sleep = random.uniform(0, sleep)
+        return sleep
+
+    def failed(self, exception: BaseException | None, result: Any) -> float | None:
+        """Return the seconds to wait before retrying, or None to give up."""
+        elapsed = monotonic() - self.start_at
+        sleep: float | None = None
+        if not self.is_last:
+            sleep = self._sleep_for()
+            if self.deadline is not None and elapsed + sleep > self.deadline:
+                sleep = None
+            elif self.budget is not None and not self.budget.try_acquire():
+                sleep = None
+
+        state = RetryState(self.func, self.attempt, elapsed, sleep, exception, result)
+        if sleep is None:
+            if self.on_giveup is not None:
+                self.on_giveup(state)
+        elif self.on_retry is not None:
+            self.on_retry(state)
+        return sleep
+
+
+def retry(
+    ExceptionToCheck: type[Exception] | tuple[type[Exception], ...],
+    tries: int = 3,
+    delay: int | float = 1,
+    backoff: int | float = 1,
+    max_delay: int | float | None = None,
+    jitter: str | None = None,
+    deadline: int | float | None = None,
+    retry_on_result: Callable[[Any], bool] | None = None,
+    on_retry: Callable[[RetryState], Any] | None = None,
+    on_giveup: Callable[[RetryState], Any] | None = None,
+    breaker: CircuitBreaker | None = None,
+    budget: RetryBudget | None = None,
+) -> Callable[[F], F]:
+    """Retry calling the decorated function using an exponential backoff.
+
+    The last attempt (when tries is exhausted) is made without a try/except,
+    so the exception propagates to the caller on final failure.
+
+    Without jitter every caller sleeps exactly ``delay * backoff ** n``, so
+    workers hit by the same outage retry in lockstep. ``jitter="full"``
+    sleeps a random time between 0 and that value; ``jitter="decorrelated"``
+    sleeps a random time between ``delay`` and three times the previous
+    sleep, ignoring ``backoff``. Both are capped by ``max_delay``.
+
+    ``async def`` functions are retried with ``asyncio.sleep``, so waiting
+    yields to the event loop instead of blocking it.
+
+    With a ``breaker`` every attempt goes through the
+    :class:`~kipp.decorator.breaker.CircuitBreaker`, and an open circuit
+    raises :class:`~kipp.decorator.exceptions.CircuitOpenError` right away,
+    without further attempts. With a ``budget`` each retry takes a token
+    from the :class:`RetryBudget`, and the call gives up once it is empty.
+
+    http://www.saltycrane.com/blog/2009/11/trying-out-retry-decorator-python/
+    original from: http://wiki.python.org/moin/PythonDecoratorLibrary#Retry
+
+    Args:
+        ExceptionToCheck: Exception class or tuple of exception classes that
+            trigger a retry. All other exceptions propagate immediately.
+        tries: Total number of attempts (not retries), so tries=3 means
+            up to 2 retries after the initial call.
+        delay: Initial delay between retries in seconds.
+        backoff: Multiplier applied to delay after each retry,
+            e.g. backoff=2 doubles the wait each time.
+        max_delay: Upper bound of a single wait in seconds.
+        jitter: None, ``"full"`` or ``"decorrelated"``.
+        deadline: Overall budget in seconds, counted from the first attempt.
+            A retry whose wait would end past it is not made; the last
+            exception is raised (or the last result returned) instead.
+        retry_on_result: Predicate on the return value; a truthy answer
+            retries the call like an exception would. When attempts run out
+            the last result is returned.
+        on_retry: Called with a :class:`RetryState` before each wait, e.g.
+            to log or count attempts.
+        on_giveup: Called with a :class:`RetryState` when no retry will be
+            made after a failed attempt.
+        breaker: Circuit breaker shared by the callers of a downstream.
+        budget: Token bucket limiting the retries of a group of callers.
+
+    Examples::
+
+        @retry(IOError, tries=5, delay=0.1, backoff=2, max_delay=2,
+               jitter="full", deadline=5, on_retry=log_attempt)
+        def fetch():
+            ...
+
+        @retry(IOError, tries=3, retry_on_result=lambda r: r is None)
+        async def poll():
+            ...
+
+    """
+    assert tries >= 1, "tries should not less than 1, but got {}".format(tries)
+    assert delay >= 0, "delay should not be negative, but got {}".format(delay)
+    assert jitter in JITTERS, "jitter should be one of {}, but got {}".format(
+        JITTERS, jitter
+    )
+    assert deadline is None or deadline > 0, (
+        "deadline should greater than 0, but got {}".format(deadline)
+    )
+
+    def deco_retry(f: F) -> F:
+        new_loop = functools.partial(
+            _RetryLoop,
+            f,
+            tries,
+            delay,
+            backoff,
+            max_delay,
+            jitter,
+            deadline,
+            on_retry,
+            on_giveup,
+            budget,
+        )
+        call = f if breaker is None else functools.partial(breaker.call, f)
+        call_async = f if breaker is None else functools.partial(breaker.call_async, f)
+
+        if inspect.iscoroutinefunction(f):
+
+            @functools.wraps(f)
+            async def _async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                loop = new_loop()
+                while True:
+                    loop.attempt += 1
+                    try:
+                        result = await call_async(*args, **kwargs)
+                    except CircuitOpenError:
+                        raise
+                    except ExceptionToCheck as err:
+                        sleep = loop.failed(err, None)
+                        if sleep is None:
+                            raise
+                    else:
+                        if retry_on_result is None or not retry_on_result(result):
+                            return result
+                        sleep = loop.failed(None, result)
+                        if sleep is None:
+                            return result
+
+                    await asyncio.sleep(sleep)
+
+            return _async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(f)
+        def _wrapper(*args: Any, **kwargs: Any) -> Any:
+            loop = new_loop()
+            while True:
+                loop.attempt += 1
+                try:
+                    result = call(*args, **kwargs)
+                except CircuitOpenError:
+                    raise
+                except ExceptionToCheck as err:
+                    sleep = loop.failed(err, None)
+                    if sleep is None:
+                        raise
+                else:
+                    if retry_on_result is None or not retry_on_result(result):
+                        return result
+                    sleep = loop.failed(None, result)
+                    if sleep is None:
+                        return result
+
+                _time_module.sleep(sleep)
+
+        return _wrapper  # type: ignore[return-value]
+
+    return deco_retry
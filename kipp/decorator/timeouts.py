@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+---------------
+Timeout Engines
+---------------
+
+Timeouts that work outside the main thread, unlike the SIGALRM based
+``kipp.decorator.timeout``.
+
+All thread deadlines share one daemon timer thread that keeps them in a heap,
+so thousands of concurrent deadlines cost one thread and O(log n) per
+deadline.
+
+Usage
+::
+
+    from kipp.decorator import (
+        async_timeout, check_timeout, process_timeout, thread_timeout,
+    )
+
+    # any thread; the function decides where it may be stopped
+    @thread_timeout(2)
+    def crunch(rows):
+        for row in rows:
+            check_timeout()
+            ...
+
+    # run in a fresh child process that is killed at the deadline
+    @process_timeout(10)
+    def render(page):
+        ...
+
+    @async_timeout(0.2)
+    async def fetch():
+        ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import functools
+import heapq
+import importlib
+import itertools
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from time import monotonic
+from typing import Any, TypeVar
+
+from kipp.utils import get_logger
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class TimeoutError(Exception):
+    """Raised when a function decorated with ``timeout`` exceeds its time limit."""
+
+    def __init__(self, value: str = "Timed Out") -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        return repr(self.value)
+
+
+class TimerHandle:
+    """A scheduled callback; ``cancel()`` it once it is no longer needed."""
+
+    __slots__ = ("deadline", "callback", "args", "cancelled", "_timer")
+
+    def __init__(
+        self,
+        timer: TimerThread,
+        deadline: float,
+        callback: Callable[..., Any],
+        args: tuple[Any, ...],
+    ) -> None:
+        self._timer = timer
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        if not self.cancelled:
+            self._timer._cancel(self)
+
+
+class TimerThread:
+    """One daemon thread that runs callbacks at their deadlines.
+
+    Deadlines sit in a min-heap ordered by monotonic time, and the thread
+    sleeps on a condition until the earliest one is due, so precision is
+    sub-millisecond and idle deadlines cost nothing.  Cancelled handles stay
+    in the heap until they surface or until they outnumber live ones, when
+    the heap is compacted.  Callbacks run on the timer thread and must be
+    quick; exceptions they raise are logged.
+
+    The thread starts lazily and is restarted in forked children.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._heap: list[tuple[float, int, TimerHandle]] = []
+        self._seq = itertools.count()
+        self._n_cancelled = 0
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._n_cancelled
+
+    def schedule(
+        self, delay: int | float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        """Run ``callback(*args)`` on the timer thread after delay seconds."""
+        handle = TimerHandle(self, monotonic() + delay, callback, args)
+        with self._cond:
+            self._ensure_started()
+            heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+            if self._heap[0][2] is handle:
+                self._cond.notify()
+
+        return handle
+
+    def _cancel(self, handle: TimerHandle) -> None:
+        with self._cond:
+            # also set by the timer thread when the handle fires
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            self._n_cancelled += 1
+            if self._n_cancelled > 1024 and self._n_cancelled * 2 > len(self._heap):
+                self._heap = [r for r in self._heap if not r[2].cancelled]
+                heapq.heapify(self._heap)
+                self._n_cancelled = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        if self._pid is not None and self._pid != os.getpid():
+            # the heap was inherited through fork, its callbacks belong to
+            # the parent
+            self._heap.clear()
+            self._n_cancelled = 0
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run, name="kipp-timer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    deadline, _, handle = self._heap[0]
+                    delay = deadline - monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+
+                    heapq.heappop(self._heap)
+                    if handle.cancelled:
+                        self._n_cancelled -= 1
+                        continue
+                    handle.cancelled = True
+                    break
+
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                get_logger().exception("kipp timer callback %r", handle.callback)
+
+
+_timer: TimerThread = TimerThread()
+
+
+def get_timer() -> TimerThread:
+    """Return the timer thread shared by every thread deadline."""
+    return _timer
+
+
+class Deadline:
+    """Cooperative cancellation token for one timed call.
+
+    The timer thread marks it expired; the running function may poll
+    :meth:`check` (or :func:`check_timeout`) at safe points.  Deadlines nest:
+    an inner deadline is also expired once any enclosing one is.
+    """
+
+    __slots__ = ("at", "parent", "_expired")
+
+    def __init__(self, seconds: int | float, parent: Deadline | None = None) -> None:
+        self.at = monotonic() + seconds
+        self.parent = parent
+        self._expired = False
+
+    @property
+    def expired(self) -> bool:
+        d: Deadline | None = self
+        while d is not None:
+            if d._expired or d.at <= monotonic():
+                return True
+            d = d.parent
+        return False
+
+    def remaining(self) -> float:
+        """Seconds left before this or any enclosing deadline, at least 0."""
+        at = self.at
+        d = self.parent
+        while d is not None:
+            at = min(at, d.at)
+            d = d.parent
+        return max(0.0, at - monotonic())
+
+    def expire(self) -> None:
+        self._expired = True
+
+    def check(self) -> None:
+        """Raise :class:`TimeoutError` if the deadline has passed."""
+        if self.expired:
+            raise TimeoutError()
+
+
+_local = threading.local()
+
+
+def current_deadline() -> Deadline | None:
+    """Return the innermost deadline of the calling thread, if any."""
+    return getattr(_local, "deadline", None)
+
+
+def check_timeout() -> None:
+    """Raise :class:`TimeoutError` if the calling thread's deadline passed.
+
+    A no-op outside ``thread_timeout``, so library code can call it freely.
+    """
+    deadline = getattr(_local, "deadline", None)
+    if deadline is not None:
+        deadline.check()
+
+
+_set_async_exc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+_set_async_exc.argtypes = (ctypes.c_ulong, ctypes.py_object)
+_set_async_exc.restype = ctypes.c_int
+
+
+class _TimedCall:
+    __slots__ = ("thread_id", "lock", "done", "fired", "deadline", "interrupt")
+
+    def __init__(self, deadline: Deadline, interrupt: bool) -> None:
+        self.thread_id = threading.get_ident()
+        self.lock = threading.Lock()
+        self.done = False
+        self.fired = False
+        self.deadline = deadline
+        self.interrupt = interrupt
+
+
+def _expire_call(call: _TimedCall) -> None:
+    call.deadline.expire()
+    if not call.interrupt:
+        return
+
+    with call.lock:
+        if not call.done:
+            call.fired = True
+            _set_async_exc(call.thread_id, TimeoutError)
+
+
+def thread_timeout(seconds: int | float, interrupt: bool = False) -> Callable[[F], F]:
+    """Give a call a deadline that works from any thread.
+
+    The function runs in the calling thread under a :class:`Deadline` that
+    the shared :class:`TimerThread` expires.  Cancellation is cooperative:
+    the function polls :func:`check_timeout` or :func:`current_deadline` at
+    points where stopping is safe, and :class:`TimeoutError` is raised
+    there.  A function that never polls runs to completion.
+
+    ``interrupt=True`` additionally raises :class:`TimeoutError`
+    asynchronously inside the calling thread at the deadline.  This is
+    unsafe: like ``KeyboardInterrupt`` it can land at any bytecode, including
+    in the middle of library code that updates a connection pool or other
+    lock-guarded state, and it still cannot stop a blocking C call such as
+    ``time.sleep``.  Only opt in for code you control end to end.
+
+    Deadlines nest, and the timer is cancelled in ``finally``, so nothing
+    leaks when the function raises.
+
+    Args:
+        seconds: deadline in seconds, may be fractional
+        interrupt: also inject TimeoutError into the thread at the deadline
+    """
+    assert seconds > 0, "seconds should greater than 0, but got {}".format(seconds)
+
+    def decorate(f: F) -> F:
+        @functools.wraps(f)
+        def wrapper(*args: Any, **kw: Any) -> Any:
+            parent = getattr(_local, "deadline", None)
+            deadline = Deadline(seconds, parent)
+            call = _TimedCall(deadline, interrupt)
+            handle = _timer.schedule(seconds, _expire_call, call)
+            _local.deadline = deadline
+            try:
+                return f(*args, **kw)
+            finally:
+                try:
+                    with call.lock:
+                        call.done = True
+                        if call.fired:
+                            # drop the exception if it has not been raised yet
+                            _set_async_exc(call.thread_id, ctypes.py_object())
+                finally:
+                    _local.deadline = parent
+                    handle.cancel()
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def _resolve(target: Callable[..., Any] | tuple[str, str]) -> Callable[..., Any]:
+    """Look up a function sent by module and qualified name in the child.
+
+    The name refers to the function as decorated, so follow ``__wrapped__``
+    down to the function that ``process_timeout`` wrapped.
+    """
+    if callable(target):
+        return target
+
+    module, qualname = target
+    obj: Any = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    while not hasattr(obj, "__process_timeout_target__"):
+        if not hasattr(obj, "__wrapped__"):
+            # not decorated in place, e.g. ``process_timeout(5)(fn)``
+            return obj
+        obj = obj.__wrapped__
+    return obj.__process_timeout_target__
+
+
+def _run_in_child(
+    conn: Any, target: Callable[..., Any] | tuple[str, str], args: Any, kw: Any
+) -> None:
+    try:
+        result = ("ok", _resolve(target)(*args, **kw))
+    except BaseException as err:
+        result = ("err", err)
+
+    try:
+        conn.send(result)
+    except Exception as err:
+        conn.send(("err", err))
+    finally:
+        conn.close()
+
+
+def _default_context() -> Any:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def process_timeout(
+    seconds: int | float, kill_grace: float = 1.0, mp_context: Any = None
+) -> Callable[[F], F]:
+    """Run each call in a child process that is killed at the deadline.
+
+    This is the hard-kill option: unlike threads, a process stuck in C code
+    or in a blocking syscall really stops.  The child is sent SIGTERM at the
+    deadline and SIGKILL ``kill_grace`` seconds later.  The arguments, the
+    result and any exception are pickled between the processes, so they
+    must be picklable.
+
+    Every call starts its own child, which costs milliseconds, so this fits
+    coarse jobs rather than pool tasks.  Children come from ``forkserver``
+    (``spawn`` where it is missing) by default: forking this process directly
+    would copy locks held by its other threads, such as the shared timer or
+    executor workers, and the child could deadlock on them.  The decorated
+    function is then looked up by module and name in the child, so it must
+    be defined at module level.  Pass ``multiprocessing.get_context("fork")``
+    to run closures, only from processes that have not started threads.
+
+    Args:
+        seconds: deadline in seconds, may be fractional
+        kill_grace: seconds between SIGTERM and SIGKILL
+        mp_context: multiprocessing context that starts the children
+    """
+    assert seconds > 0, "seconds should greater than 0, but got {}".format(seconds)
+    ctx = mp_context or _default_context()
+    by_name = ctx.get_start_method() != "fork"
+
+    def decorate(f: F) -> F:
+        target: Callable[..., Any] | tuple[str, str] = f
+        if by_name and "<" not in f.__qualname__:
+            # a function decorated in place is not the object its name refers
+            # to any more, so pickle can not send it by reference
+            target = (f.__module__, f.__qualname__)
+
+        @functools.wraps(f)
+        def wrapper(*args: Any, **kw: Any) -> Any:
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_run_in_child, args=(send_conn, target, args, kw), daemon=True
+            )
+            proc.start()
+            send_conn.close()
+            try:
+                if not recv_conn.poll(seconds):
+                    raise TimeoutError()
+                status, value = recv_conn.recv()
+            except EOFError:
+                raise TimeoutError("child process exited without a result")
+            finally:
+                recv_conn.close()
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join(kill_grace)
+                    if proc.is_alive():
+                        proc.kill()
+                proc.join()
+
+            if status == "err":
+                raise value
+            return value
+
+        wrapper.__process_timeout_target__ = f  # type: ignore[attr-defined]
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def async_timeout(seconds: int | float) -> Callable[[F], F]:
+    """Cancel an ``async def`` call that runs longer than seconds.
+
+    Uses the event loop's own timer through ``asyncio.wait_for``, so it costs
+    no thread, and raises :class:`TimeoutError` after cancelling the call.
+    """
+    assert seconds > 0, "seconds should greater than 0, but got {}".format(seconds)
+
+    def decorate(f: F) -> F:
+        @functools.wraps(f)
+        async def wrapper(*args: Any, **kw: Any) -> Any:
+            try:
+                return await asyncio.wait_for(f(*args, **kw), seconds)
+            except asyncio.TimeoutError:
+                raise TimeoutError()
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
@@ -15,12 +15,15 @@ KippException
   │    └─ RecordNotFound
   ├─ KippRunnerException
   │    └─ KippRunnerTimeoutException
+  ├─ CircuitOpenError
+  ├─ ExecutorFullError
 
 """
 
 
 from __future__ import unicode_literals
 
+from kipp.decorator.exceptions import CircuitOpenError
 from kipp.libs.exceptions import KippAIOException, KippAIOTimeoutError, KippException
 from kipp.models.exceptions import (
     DBError,
@@ -29,3 +32,4 @@ from kipp.models.exceptions import (
     RecordNotFound,
 )
 from kipp.options import KippOptionsException, OptionKeyTypeConflictError
+from kipp.utils.exceptions import ExecutorFullError
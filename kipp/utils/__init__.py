@@ -24,9 +24,16 @@ except ImportError:
 
 from .logger import setup_logger, get_logger
 from .date import UTC, CST, parse_dtstr, utcnow, cstnow
-from .concurrents import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from .concurrents import (
+    ElasticThreadPoolExecutor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from .exceptions import ExecutorFullError
 from .mailsender import EmailSender
 from .dfa_filters import DFAFilter
+from .metrics import instrument
 
 
 logger = get_logger()
@@ -64,8 +71,38 @@ def run_command(command: str, timeout: int) -> str:
     return outs
 
 
-def timer(func: Callable[..., Any]) -> Callable[..., Any]:
-    """Decorator that logs the start and end of a function call."""
+def timer(
+    func: Callable[..., Any] | None = None,
+    *,
+    histogram: bool = False,
+    sample_rate: float = 1.0,
+    log_stats_sec: int | float = 0,
+) -> Any:
+    """Decorator that logs the start and end of a function call.
+
+    With ``histogram=True`` nothing is logged per call; durations go to a
+    histogram instead, see :func:`kipp.utils.metrics.instrument`.
+
+    Examples::
+
+        @timer
+        def job():
+            ...
+
+        @timer(histogram=True, sample_rate=0.01)
+        def hot_path():
+            ...
+    """
+    if func is None:
+        return lambda f: timer(
+            f,
+            histogram=histogram,
+            sample_rate=sample_rate,
+            log_stats_sec=log_stats_sec,
+        )
+
+    if histogram:
+        return instrument(func, sample_rate=sample_rate, log_stats_sec=log_stats_sec)
 
     @wraps(func)
     def wrapper(*args: Any, **kw: Any) -> Any:
@@ -68,6 +68,31 @@ Wrap normal functions to coroutine
     run_until_complete(future)
 
 
+Bound the work queue so a fast producer cannot queue tasks without limit
+::
+
+    # at most 1000 tasks wait; further submits block until one starts
+    executor = ThreadPoolExecutor(10, max_queue_size=1000)
+
+    # or raise ExecutorFullError / run the task in the submitting thread
+    executor = ThreadPoolExecutor(10, max_queue_size=1000, full_policy="reject")
+    executor = ThreadPoolExecutor(10, max_queue_size=1000, full_policy="caller_runs")
+
+    executor.stats()  # ExecutorStats(queue_size=..., wait=TimingInfo(...), ...)
+
+Let the pool size follow the load
+::
+
+    # 2 threads when idle, up to 50 when tasks start queueing
+    executor = ElasticThreadPoolExecutor(50, min_workers=2, keep_alive=30)
+    executor.resize(max_workers=20)
+
+    # share the workers 4:1 between two queues, lower priority values first
+    executor.set_queue_weight("interactive", 4)
+    executor.submit_to("interactive", 0, func, *args)
+    executor.submit_to("backfill", 10, func, *args)
+    executor.queue_stats()  # {"interactive": QueueStats(wait=TimingInfo(...)), ...}
+
 Mixing executor task and coroutine
 ::
     from kipp.aio import coroutine2, run_until_complete
@@ -86,24 +111,176 @@ Mixing executor task and coroutine
 """
 from __future__ import annotations
 
+import heapq
+import os
+import sys
+import threading
+import weakref
+from collections import deque, namedtuple
+from itertools import count, islice
 from typing import Any
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator
 from functools import wraps
+from time import monotonic, perf_counter_ns, sleep
 
 from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
     Future,
+    wait,
     ThreadPoolExecutor as OriginThreadPoolExecutor,
     ProcessPoolExecutor as OriginProcessPoolExecutor,
 )
 
+from .exceptions import ExecutorFullError
+from .metrics import Histogram, TimingInfo
+
+FULL_POLICIES = ("block", "reject", "caller_runs")
+
+ExecutorStats = namedtuple(
+    "ExecutorStats",
+    [
+        "queue_size",
+        "max_queue_size",
+        "peak_queue_size",
+        "rejected",
+        "caller_runs",
+        "wait",
+    ],
+)
+ExecutorStats.__doc__ = """Snapshot of a :class:`ThreadPoolExecutor`'s work queue.
+
+Fields:
+    queue_size: tasks submitted but not started yet
+    max_queue_size: configured bound, 0 when unbounded
+    peak_queue_size: highest queue_size seen
+    rejected: submits refused by the ``reject`` policy or a block timeout
+    caller_runs: tasks run in the submitting thread by ``caller_runs``
+    wait: :class:`~kipp.utils.metrics.TimingInfo` of the time tasks queued
+"""
+
+ElasticStats = namedtuple(
+    "ElasticStats",
+    ["n_workers", "n_idle", "min_workers", "max_workers", "queue_size", "wait"],
+)
+ElasticStats.__doc__ = """Snapshot of an :class:`ElasticThreadPoolExecutor`.
+
+Fields:
+    n_workers: live worker threads
+    n_idle: workers waiting for a task
+    min_workers, max_workers: current bounds of the pool
+    queue_size: tasks submitted but not started yet
+    wait: :class:`~kipp.utils.metrics.TimingInfo` of the time tasks queued
+"""
+
+QueueStats = namedtuple("QueueStats", ["weight", "queue_size", "wait"])
+QueueStats.__doc__ = """Snapshot of one queue of an :class:`ElasticThreadPoolExecutor`.
+
+Fields:
+    weight: share of the workers the queue gets while others are busy too
+    queue_size: tasks waiting in the queue
+    wait: :class:`~kipp.utils.metrics.TimingInfo` of the time its tasks queued
+"""
+
+DEFAULT_QUEUE = "default"
+
+
+def _apply_chunk(fn: Callable[..., Any], chunk: list[Any]) -> list[Any]:
+    return [fn(item) for item in chunk]
+
 
 class KippPoolMixin:
-    """Mixin that adds a ``coroutine`` decorator to pool executors.
+    """Mixin that adds ``coroutine`` and a streaming ``imap`` to pool executors.
 
-    This lets callers turn any blocking function into an async-compatible
-    call that returns a Future, bridging sync code into the executor model.
+    ``coroutine`` lets callers turn any blocking function into an
+    async-compatible call that returns a Future, bridging sync code into the
+    executor model.
     """
 
+    def imap(
+        self,
+        fn: Callable[[Any], Any],
+        iterable: Iterable[Any],
+        *,
+        chunksize: int = 1,
+        max_in_flight: int | None = None,
+        ordered: bool = True,
+    ) -> Iterator[Any]:
+        """Lazily map fn over iterable, keeping a bounded number of items in flight.
+
+        Unlike ``map``, which submits every item before returning, items are
+        read from ``iterable`` only as earlier ones finish, so it may be an
+        endless generator.  Items are sent in lists of ``chunksize``, one
+        task per chunk, which amortizes pickling and IPC on process pools;
+        fn must then be picklable.  Results come back in input order, or in
+        completion order with ``ordered=False``.  An exception raised by fn
+        is re-raised when its result is reached, and closing the generator
+        cancels the chunks not started yet.
+
+        Args:
+            fn: function called with each item
+            iterable: items to map, consumed lazily
+            chunksize: items per task
+            max_in_flight: items submitted but not yielded yet, defaults to
+                two chunks per worker
+            ordered: yield in input order instead of completion order
+
+        Examples::
+
+            with ThreadPoolExecutor(8) as executor:
+                for page in executor.imap(fetch, iter_urls(), ordered=False):
+                    ...
+        """
+        assert chunksize > 0, "chunksize should greater than 0, but got {}".format(
+            chunksize
+        )
+        if max_in_flight is None:
+            max_chunks = 2 * getattr(self, "_max_workers", 1)
+        else:
+            assert (
+                max_in_flight > 0
+            ), "max_in_flight should greater than 0, but got {}".format(max_in_flight)
+            max_chunks = max(1, max_in_flight // chunksize)
+
+        submit = self.submit  # type: ignore[attr-defined]
+        it = iter(iterable)
+
+        def next_chunk() -> Future[list[Any]] | None:
+            chunk = list(islice(it, chunksize))
+            return submit(_apply_chunk, fn, chunk) if chunk else None
+
+        pending: deque[Future[list[Any]]] = deque()
+        running: set[Future[list[Any]]] = set()
+        try:
+            while len(pending) < max_chunks:
+                future = next_chunk()
+                if future is None:
+                    break
+                pending.append(future)
+
+            if ordered:
+                while pending:
+                    results = pending.popleft().result()
+                    future = next_chunk()
+                    if future is not None:
+                        pending.append(future)
+                    yield from results
+
+                return
+
+            running.update(pending)
+            pending.clear()
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for finished in done:
+                    future = next_chunk()
+                    if future is not None:
+                        running.add(future)
+                    yield from finished.result()
+        finally:
+            for future in (*pending, *running):
+                future.cancel()
+
     def coroutine(self, func: Callable[..., Any]) -> Callable[..., Future[Any]]:
         """Wrap a blocking function so each call submits it to the pool.
 
@@ -117,9 +294,638 @@ class KippPoolMixin:
         return wrapper
 
 
+class _QueuedTask:
+    """Work item wrapper that tracks when its task leaves the queue."""
+
+    __slots__ = ("executor", "fn", "args", "kw", "queued_at", "started")
+
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+        kw: dict[str, Any],
+    ) -> None:
+        self.executor = executor
+        self.fn = fn
+        self.args = args
+        self.kw = kw
+        self.queued_at = perf_counter_ns()
+        self.started = False
+
+    def __call__(self) -> Any:
+        self.started = True
+        self.executor._dequeued(self)
+        return self.fn(*self.args, **self.kw)
+
+    def on_done(self, future: Future[Any]) -> None:
+        # cancelled before a worker picked it up
+        if not self.started:
+            self.executor._dequeued(self)
+
+
 class ThreadPoolExecutor(KippPoolMixin, OriginThreadPoolExecutor):
-    pass
+    """Thread pool that can bound its work queue.
+
+    The stdlib pool queues every submitted task, so a producer faster than
+    the workers grows memory without limit.  With ``max_queue_size`` at most
+    that many tasks wait for a worker, and ``full_policy`` decides what a
+    submit does when the queue is full:
+
+    * ``"block"``: wait until a task starts, up to ``block_timeout`` seconds,
+      then raise :class:`~kipp.utils.exceptions.ExecutorFullError`
+    * ``"reject"``: raise ``ExecutorFullError`` at once
+    * ``"caller_runs"``: run the task in the submitting thread and return a
+      finished future, which slows the producer down to the pool's pace
+
+    Do not submit with ``"block"`` from the pool's own workers, they may end
+    up waiting on themselves.
+
+    Queue depth and the time tasks wait before starting are reported by
+    :meth:`stats` in either mode.
+
+    Args:
+        max_workers: number of worker threads
+        thread_name_prefix: prefix of the worker thread names
+        initializer: called in each worker thread when it starts
+        initargs: arguments of initializer
+        max_queue_size: tasks allowed to wait, 0 for unbounded
+        full_policy: ``"block"``, ``"reject"`` or ``"caller_runs"``
+        block_timeout: seconds a blocked submit waits, None for no limit
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        thread_name_prefix: str = "",
+        initializer: Callable[..., Any] | None = None,
+        initargs: tuple[Any, ...] = (),
+        *,
+        max_queue_size: int = 0,
+        full_policy: str = "block",
+        block_timeout: float | None = None,
+    ) -> None:
+        assert (
+            max_queue_size >= 0
+        ), "max_queue_size should not be negative, but got {}".format(max_queue_size)
+        assert (
+            full_policy in FULL_POLICIES
+        ), "full_policy should be one of {}, but got {}".format(
+            FULL_POLICIES, full_policy
+        )
+        super().__init__(max_workers, thread_name_prefix, initializer, initargs)
+        self.max_queue_size = max_queue_size
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self._slots = threading.Semaphore(max_queue_size) if max_queue_size else None
+        self._stats_lock = threading.Lock()
+        self._queue_size = 0
+        self._peak_queue_size = 0
+        self._n_rejected = 0
+        self._n_caller_runs = 0
+        self._wait = Histogram("{}.wait".format(thread_name_prefix or "executor"))
+
+    @property
+    def queue_size(self) -> int:
+        """Tasks submitted but not started yet."""
+        return self._queue_size
+
+    def stats(self) -> ExecutorStats:
+        return ExecutorStats(
+            self._queue_size,
+            self.max_queue_size,
+            self._peak_queue_size,
+            self._n_rejected,
+            self._n_caller_runs,
+            self._wait.info(),
+        )
+
+    def _acquire_slot(self) -> bool:
+        assert self._slots is not None
+        if self.full_policy == "block":
+            return self._slots.acquire(timeout=self.block_timeout)
+        return self._slots.acquire(blocking=False)
+
+    def _dequeued(self, task: _QueuedTask | None) -> None:
+        if task is not None:
+            self._wait.record(perf_counter_ns() - task.queued_at)
+        with self._stats_lock:
+            self._queue_size -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def _run_in_caller(
+        self, fn: Callable[..., Any], args: tuple[Any, ...], kw: dict[str, Any]
+    ) -> Future[Any]:
+        with self._stats_lock:
+            self._n_caller_runs += 1
+        future: Future[Any] = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            result = fn(*args, **kw)
+        except BaseException as err:
+            future.set_exception(err)
+        else:
+            future.set_result(result)
+        return future
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kw: Any) -> Future[Any]:
+        if self._slots is not None and not self._acquire_slot():
+            if self.full_policy == "caller_runs":
+                return self._run_in_caller(fn, args, kw)
+
+            with self._stats_lock:
+                self._n_rejected += 1
+            raise ExecutorFullError(self.max_queue_size)
+
+        task = _QueuedTask(self, fn, args, kw)
+        with self._stats_lock:
+            self._queue_size += 1
+            if self._queue_size > self._peak_queue_size:
+                self._peak_queue_size = self._queue_size
+        try:
+            future = super().submit(task)
+        except BaseException:
+            task.started = True
+            self._dequeued(None)
+            raise
+
+        future.add_done_callback(task.on_done)
+        return future
+
+
+class _ElasticWorkItem:
+    __slots__ = ("future", "fn", "args", "kw", "queued_at", "queue")
+
+    def __init__(
+        self,
+        future: Future[Any],
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+        kw: dict[str, Any],
+    ) -> None:
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kw = kw
+        self.queued_at = monotonic()
+        self.queue: _TaskQueue | None = None
+
+    def run(self) -> None:
+        if not self.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = self.fn(*self.args, **self.kw)
+        except BaseException as err:
+            self.future.set_exception(err)
+        else:
+            self.future.set_result(result)
+
+
+class _TaskQueue:
+    """One named queue: a priority heap plus its stride-scheduling pass."""
+
+    __slots__ = ("name", "weight", "heap", "pass_", "wait")
+
+    def __init__(self, name: str, weight: float, pass_: float) -> None:
+        self.name = name
+        self.weight = weight
+        self.heap: list[tuple[int, int, _ElasticWorkItem]] = []
+        self.pass_ = pass_
+        self.wait = Histogram("queue.{}.wait".format(name))
+
+
+class _FairScheduler:
+    """Weighted fair queuing across named queues, by stride scheduling.
+
+    Each queue has a virtual ``pass``; the non-empty queue with the lowest
+    pass is served next and its pass grows by ``1 / weight``, so while
+    several queues have work a queue of weight 4 is served four times as
+    often as one of weight 1.  A queue that was empty restarts at the
+    current virtual time, so idling earns no credit for a later burst.
+    Within a queue tasks run by priority, lowest value first, then FIFO.
+    Not thread-safe; the executor calls it under its lock.
+    """
+
+    def __init__(self) -> None:
+        self.queues: dict[str, _TaskQueue] = {}
+        self._vtime = 0.0
+        self._seq = count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def set_weight(self, name: str, weight: float) -> _TaskQueue:
+        assert weight > 0, "weight should greater than 0, but got {}".format(weight)
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.queues[name] = _TaskQueue(name, weight, self._vtime)
+        queue.weight = weight
+        return queue
+
+    def push(self, item: _ElasticWorkItem, name: str, priority: int) -> None:
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.set_weight(name, 1)
+        if not queue.heap:
+            queue.pass_ = max(queue.pass_, self._vtime)
+
+        item.queue = queue
+        heapq.heappush(queue.heap, (priority, next(self._seq), item))
+        self._size += 1
+
+    def _next_queue(self) -> _TaskQueue | None:
+        best = None
+        for queue in self.queues.values():
+            if queue.heap and (best is None or queue.pass_ < best.pass_):
+                best = queue
+        return best
+
+    def pop(self) -> _ElasticWorkItem:
+        queue = self._next_queue()
+        assert queue is not None, "pop from an empty scheduler"
+        self._vtime = queue.pass_
+        queue.pass_ += 1 / queue.weight
+        self._size -= 1
+        return heapq.heappop(queue.heap)[2]
+
+    def drain(self) -> Iterator[_ElasticWorkItem]:
+        for queue in self.queues.values():
+            while queue.heap:
+                self._size -= 1
+                yield heapq.heappop(queue.heap)[2]
+
+
+# pools whose queued work is finished at interpreter exit; idle workers would
+# otherwise hold the exit up for keep_alive seconds
+_elastic_pools: weakref.WeakSet[ElasticThreadPoolExecutor] = weakref.WeakSet()
+
+
+def _drain_elastic_pools() -> None:
+    for executor in list(_elastic_pools):
+        executor.shutdown(wait=True)
+
+
+# runs before non-daemon threads are joined; before Python 3.9 the workers
+# stay daemon threads, as in the stdlib pool of that version
+_register_atexit = getattr(threading, "_register_atexit", None)
+if _register_atexit is not None:
+    _register_atexit(_drain_elastic_pools)
+
+
+class ElasticThreadPoolExecutor(KippPoolMixin, Executor):
+    """Thread pool that grows under load and shrinks when idle.
+
+    Workers start on demand: like the stdlib pool, a task that finds no idle
+    worker starts a new one, up to ``max_workers``, so a burst of blocking
+    calls runs in parallel instead of queueing behind the first worker.  A
+    worker that stays idle for ``keep_alive`` seconds exits while the pool is
+    above ``min_workers``, so the pool shrinks back once the load drops.  Both bounds can
+    be changed at any time with :meth:`resize`; extra workers exit once they
+    finish their current task.
+
+    Tasks can be sent to named queues with :meth:`submit_to`, e.g. one per
+    tenant or per kind of work.  Queues share the workers in proportion to
+    their weight, and inside a queue lower priority values run first, so a
+    backfill in its own low-weight queue cannot starve interactive calls.
+    ``submit`` uses the ``"default"`` queue at priority 0, which keeps the
+    pool FIFO when no other queue is used.  :meth:`queue_stats` reports the
+    wait time of every queue.
+
+    Like the stdlib pool, queued work still runs at interpreter exit: the
+    workers are drained and joined before the interpreter shuts down.
+
+    Args:
+        max_workers: upper bound of the pool, defaults to the stdlib's
+            ``min(32, cpu_count + 4)``
+        min_workers: workers kept alive when idle
+        keep_alive: seconds an idle worker above ``min_workers`` waits
+            before it exits
+        thread_name_prefix: prefix of the worker thread names
+        queues: weight of each named queue, others get weight 1
+
+    Examples::
+
+        executor = ElasticThreadPoolExecutor(64, min_workers=4, keep_alive=30)
+        future = executor.submit(query, sql)
+
+        # later, without restarting
+        executor.resize(max_workers=16)
+
+        executor = ElasticThreadPoolExecutor(
+            16, queues={"interactive": 8, "backfill": 1}
+        )
+        executor.submit_to("interactive", 0, load_page, uid)
+        executor.submit_to("backfill", 5, reindex, batch)
+        executor.queue_stats()["interactive"].wait.p99
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        min_workers: int = 0,
+        keep_alive: float = 60.0,
+        thread_name_prefix: str = "",
+        queues: dict[str, float] | None = None,
+    ) -> None:
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self._check_bounds(min_workers, max_workers)
+        assert keep_alive > 0, "keep_alive should greater than 0, but got {}".format(
+            keep_alive
+        )
+        self._min_workers = min_workers
+        self._max_workers = max_workers
+        self.keep_alive = keep_alive
+        self._thread_name_prefix = thread_name_prefix or "ElasticThreadPool"
+        self._cond = threading.Condition(threading.Lock())
+        self._queue = _FairScheduler()
+        for name, weight in (queues or {}).items():
+            self._queue.set_weight(name, weight)
+        self._threads: set[threading.Thread] = set()
+        self._n_workers = 0
+        self._n_idle = 0
+        self._shutdown = False
+        self._seq = count()
+        self._wait = Histogram("{}.wait".format(self._thread_name_prefix))
+        _elastic_pools.add(self)
+
+    @staticmethod
+    def _check_bounds(min_workers: int, max_workers: int) -> None:
+        assert max_workers > 0, "max_workers should greater than 0, but got {}".format(
+            max_workers
+        )
+        assert (
+            0 <= min_workers <= max_workers
+        ), "min_workers should in [0, {}], but got {}".format(max_workers, min_workers)
+
+    @property
+    def n_workers(self) -> int:
+        return self._n_workers
+
+    def stats(self) -> ElasticStats:
+        with self._cond:
+            return ElasticStats(
+                self._n_workers,
+                self._n_idle,
+                self._min_workers,
+                self._max_workers,
+                len(self._queue),
+                self._wait.info(),
+            )
+
+    def queue_stats(self) -> dict[str, QueueStats]:
+        with self._cond:
+            queues = [
+                (q.name, q.weight, len(q.heap), q.wait)
+                for q in self._queue.queues.values()
+            ]
+        return {
+            name: QueueStats(weight, size, wait.info())
+            for name, weight, size, wait in queues
+        }
+
+    def set_queue_weight(self, name: str, weight: float) -> None:
+        """Create the queue called name, or change its weight while it runs."""
+        with self._cond:
+            self._queue.set_weight(name, weight)
+
+    def resize(
+        self, min_workers: int | None = None, max_workers: int | None = None
+    ) -> None:
+        """Change the pool bounds while it runs."""
+        with self._cond:
+            min_workers = self._min_workers if min_workers is None else min_workers
+            max_workers = self._max_workers if max_workers is None else max_workers
+            self._check_bounds(min_workers, max_workers)
+            self._min_workers = min_workers
+            self._max_workers = max_workers
+            self._adjust()
+            # idle workers re-check the bounds
+            self._cond.notify_all()
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kw: Any) -> Future[Any]:
+        return self.submit_to(DEFAULT_QUEUE, 0, fn, *args, **kw)
+
+    def submit_to(
+        self,
+        queue: str,
+        priority: int,
+        fn: Callable[..., Any],
+        /,
+        *args: Any,
+        **kw: Any,
+    ) -> Future[Any]:
+        """Submit fn to a named queue; lower priority values run first.
+
+        A queue that does not exist yet is created with weight 1.
+        """
+        future: Future[Any] = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+
+            self._queue.push(_ElasticWorkItem(future, fn, args, kw), queue, priority)
+            self._adjust()
+            self._cond.notify()
+
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for item in self._queue.drain():
+                    item.future.cancel()
+            self._cond.notify_all()
+            threads = list(self._threads)
+
+        if wait:
+            for t in threads:
+                if t is not threading.current_thread():
+                    t.join()
+
+    def _adjust(self) -> None:
+        """Start a worker if a queued task has none; call with the lock held."""
+        if (
+            self._shutdown
+            or self._n_idle >= len(self._queue)
+            or self._n_workers >= self._max_workers
+        ):
+            return
+
+        self._n_workers += 1
+        t = threading.Thread(
+            target=self._work,
+            name="{}-{}".format(self._thread_name_prefix, next(self._seq)),
+            daemon=_register_atexit is None,
+        )
+        self._threads.add(t)
+        t.start()
+
+    def _next_item(self) -> _ElasticWorkItem | None:
+        """Wait for a task, or return None when this worker should exit."""
+        with self._cond:
+            idle_until = monotonic() + self.keep_alive
+            while True:
+                if self._n_workers > self._max_workers:
+                    break
+                if self._queue:
+                    item = self._queue.pop()
+                    self._adjust()
+                    return item
+                if self._shutdown:
+                    break
+
+                remaining = idle_until - monotonic()
+                if remaining <= 0:
+                    if self._n_workers > self._min_workers:
+                        break
+                    idle_until = monotonic() + self.keep_alive
+                    remaining = self.keep_alive
+
+                self._n_idle += 1
+                self._cond.wait(remaining)
+                self._n_idle -= 1
+
+            self._n_workers -= 1
+            self._threads.discard(threading.current_thread())
+            return None
+
+    def _work(self) -> None:
+        while True:
+            item = self._next_item()
+            if item is None:
+                return
+
+            waited = int((monotonic() - item.queued_at) * 1e9)
+            self._wait.record(waited)
+            item.queue.wait.record(waited)  # type: ignore[union-attr]
+            item.run()
+            del item
+
+
+# State of the current worker process, filled by ``ProcessPoolExecutor``
+_worker_state: dict[str, Any] = {}
+
+
+def get_worker_state() -> dict[str, Any]:
+    """Return the state shared with this worker process.
+
+    It holds the ``shared`` objects given to :class:`ProcessPoolExecutor`,
+    and a worker ``initializer`` may add to it what it loads.  In the parent
+    process it is just an empty dict.
+    """
+    return _worker_state
+
+
+def _init_worker(
+    shared: dict[str, Any],
+    initializer: Callable[..., Any] | None,
+    initargs: tuple[Any, ...],
+) -> None:
+    _worker_state.update(shared)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _warm_up_task() -> None:
+    # long enough that the pool starts a new worker for every warm-up task
+    # instead of reusing one that already finished
+    sleep(0.05)
+
+
+# stdlib internals used to start workers without running a task through
+# them; they are missing before Python 3.9 and may change in later versions
+_WARM_UP_INTERNALS = (
+    "_shutdown_lock",
+    "_shutdown_thread",
+    "_processes",
+    "_executor_manager_thread",
+    "_spawn_process",
+    "_start_executor_manager_thread",
+)
 
 
 class ProcessPoolExecutor(KippPoolMixin, OriginProcessPoolExecutor):
-    pass
+    """Process pool with shared worker state, recycling and warm-up.
+
+    Large context such as a keyword lexicon should not travel with every
+    task.  Objects passed as ``shared`` are pickled once per worker, when it
+    starts, and tasks read them with :func:`get_worker_state`, so a task
+    only pickles its own payload.  ``initializer`` still runs after that in
+    each worker, e.g. to load state from disk into ``get_worker_state()``.
+
+    ``max_tasks_per_child`` replaces a worker after that many tasks, which
+    bounds slow leaks in long-running pools; like the stdlib it needs
+    Python 3.11 and the ``spawn`` or ``forkserver`` start method.  With
+    ``warm=True`` all workers are started, and initialized, in the
+    constructor instead of by the first submits.
+
+    Args:
+        max_workers: number of worker processes
+        mp_context: multiprocessing context used to start workers
+        initializer: called in each worker after ``shared`` is installed
+        initargs: arguments of initializer
+        shared: objects installed into each worker's state
+        max_tasks_per_child: tasks a worker runs before it is replaced
+        warm: start every worker now
+
+    Examples::
+
+        def count_keywords(text):
+            return len(get_worker_state()["filter"].filter_keyword(text))
+
+        with ProcessPoolExecutor(
+            8, shared={"filter": dfa_filter}, max_tasks_per_child=10000, warm=True
+        ) as executor:
+            for n in executor.imap(count_keywords, docs, chunksize=256):
+                ...
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        mp_context: Any = None,
+        initializer: Callable[..., Any] | None = None,
+        initargs: tuple[Any, ...] = (),
+        *,
+        shared: dict[str, Any] | None = None,
+        max_tasks_per_child: int | None = None,
+        warm: bool = False,
+    ) -> None:
+        kw: dict[str, Any] = {}
+        if max_tasks_per_child is not None:
+            assert sys.version_info >= (
+                3,
+                11,
+            ), "max_tasks_per_child requires Python 3.11"
+            kw["max_tasks_per_child"] = max_tasks_per_child
+        if shared:
+            initializer, initargs = _init_worker, (shared, initializer, initargs)
+        super().__init__(max_workers, mp_context, initializer, initargs, **kw)
+        if warm:
+            self.warm_up()
+
+    def warm_up(self) -> None:
+        """Start every worker process that is not running yet.
+
+        Where the stdlib pool does not expose what is needed to start idle
+        workers, e.g. on Python 3.8, one short no-op task per worker is run
+        and waited for instead; with ``max_tasks_per_child`` those count as
+        tasks of the worker.
+        """
+        if not all(hasattr(self, name) for name in _WARM_UP_INTERNALS):
+            wait([self.submit(_warm_up_task) for _ in range(self._max_workers)])
+            return
+
+        with self._shutdown_lock:  # type: ignore[attr-defined]
+            if self._shutdown_thread:  # type: ignore[attr-defined]
+                raise RuntimeError("cannot warm up after shutdown")
+            if self._executor_manager_thread is None:  # type: ignore[attr-defined]
+                # processes may only be forked before the manager thread starts
+                for _ in range(len(self._processes), self._max_workers):
+                    self._spawn_process()  # type: ignore[attr-defined]
+                self._start_executor_manager_thread()  # type: ignore[attr-defined]
@@ -3,8 +3,921 @@
 
 from __future__ import annotations
 
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque, namedtuple
+from collections.abc import Iterable, Iterator
+from threading import Lock
 from typing import Any
 
+from .concurrents import ProcessPoolExecutor, get_worker_state
+
+# File layout written by ``CompactAutomaton.save``:
+# magic, uint32 little-endian header length, JSON header, then each table
+# at the (4-byte aligned) offset recorded in the header.
+AUTOMATON_FILE_MAGIC: bytes = b"KIPPDFA\x00"
+AUTOMATON_FILE_VERSION: int = 1
+_HEADER_LEN = struct.Struct("<I")
+_ARRAY_SECTIONS: tuple[str, ...] = (
+    "offsets",
+    "chars",
+    "targets",
+    "fail",
+    "output",
+    "keyword_ids",
+    "keyword_offsets",
+)
+
+# One keyword occurrence; ``raw_text[start:end]`` is the matched text.
+KeywordMatch = namedtuple("KeywordMatch", ["start", "end", "keyword"])
+
+
+class KeywordNormalizer:
+    """Per-character folding applied to keywords and to scanned text alike.
+
+    Each character is mapped to its folded form once and cached in
+    ``table``; ignorable characters fold to the empty string, so they are
+    skipped wherever they appear, including between the letters of a
+    keyword.  Folding is per character, which is what lets the automaton
+    apply it while stepping through the text instead of on a normalized
+    copy of the whole document.
+
+    Args:
+        casefold: fold case with ``str.casefold``
+        fold_width: apply NFKC compatibility folding (full-width letters
+            and digits, ligatures, ...)
+        ignore_chars: characters dropped before matching, e.g. ``" .-_*"``
+    """
+
+    def __init__(
+        self, casefold: bool = False, fold_width: bool = False, ignore_chars: str = ""
+    ) -> None:
+        self.casefold: bool = casefold
+        self.fold_width: bool = fold_width
+        self.ignore_chars: str = ignore_chars
+        self._ignore: frozenset[str] = frozenset(ignore_chars)
+        self.table: dict[str, str] = {}
+        self._lengths: dict[str, int] = {}
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (KeywordNormalizer, (self.casefold, self.fold_width, self.ignore_chars))
+
+    def to_config(self) -> dict[str, Any]:
+        return {
+            "casefold": self.casefold,
+            "fold_width": self.fold_width,
+            "ignore_chars": self.ignore_chars,
+        }
+
+    def fold(self, char: str) -> str:
+        """Return the folded form of one character."""
+        folded = self.table.get(char)
+        if folded is None:
+            folded = char
+            if self.fold_width:
+                folded = unicodedata.normalize("NFKC", folded)
+            if self.casefold:
+                folded = folded.casefold()
+            if self._ignore:
+                folded = "".join(c for c in folded if c not in self._ignore)
+
+            self.table[char] = folded
+
+        return folded
+
+    def normalize(self, text: str) -> str:
+        return "".join([self.fold(char) for char in text])
+
+    def length(self, keyword: str) -> int:
+        """Length of the folded keyword, cached."""
+        n = self._lengths.get(keyword)
+        if n is None:
+            n = self._lengths[keyword] = len(self.normalize(keyword))
+
+        return n
+
+
+def _scan_folded(
+    automaton: AhoCorasickAutomaton | CompactAutomaton, text: str, state: Any
+) -> tuple[list[tuple[int, str, int]], Any]:
+    """Scan loop for automata built with a ``KeywordNormalizer``.
+
+    Every character of ``text`` is folded through the normalizer's cache
+    and each folded character takes one transition, so nothing is copied.
+    To report where a match starts in the original text, the scan state
+    carries the original index of the last ``max_keyword_len`` folded
+    characters next to the node.  Those indexes are stored relative to the
+    end of the previous text, so they come out negative when a match began
+    in an earlier chunk.
+
+    Returns:
+        ``(matches, state)``, where matches are ``(end, keyword, start)``
+        with ``end`` inclusive, and state is ``(node, positions)``
+    """
+    normalizer = automaton.normalizer
+    assert normalizer is not None
+    table, fold, length = normalizer.table, normalizer.fold, normalizer.length
+    step, node_keywords = automaton.step, automaton.node_keywords
+    maxlen = max(automaton.max_keyword_len, 1)
+    if state:
+        node, positions = state
+        positions = deque(positions, maxlen)
+    else:
+        node, positions = 0, deque(maxlen=maxlen)
+
+    matches: list[tuple[int, str, int]] = []
+    for i, char in enumerate(text):
+        folded = table.get(char)
+        if folded is None:
+            folded = fold(char)
+
+        for c in folded:
+            node = step(node, c)
+            positions.append(i)
+            for keyword in node_keywords(node):
+                matches.append((i, keyword, positions[-length(keyword)]))
+
+    n = len(text)
+    return matches, (node, deque((p - n for p in positions), maxlen))
+
+
+class AhoCorasickAutomaton:
+    """Keyword automaton with Aho-Corasick failure links.
+
+    Nodes are integer ids (0 is the root).  Every node keeps its goto
+    transitions in a dict, a failure link to the longest proper suffix that
+    is also a trie path, and an output link to the nearest terminal node on
+    that failure chain.  Scanning is a single left-to-right pass without
+    recursion, so the cost is O(len(text) + number of matches) regardless
+    of how long the keywords are.
+
+    With a ``normalizer`` the trie is built from the folded keywords (the
+    original spelling is what gets reported) and text is folded while it
+    is scanned, see ``_scan_folded``.
+
+    Examples:
+    ::
+        automaton = AhoCorasickAutomaton({"he", "she", "hers"})
+        matches, state = automaton.scan("ushers")
+        # matches == [(3, "she"), (3, "he"), (5, "hers")]
+    """
+
+    def __init__(
+        self,
+        keywords: Iterable[str] = (),
+        normalizer: KeywordNormalizer | None = None,
+    ) -> None:
+        self.normalizer: KeywordNormalizer | None = normalizer
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[int] = [0]
+        # keyword ending at each node, None for non-terminal nodes
+        self._keywords: list[str | None] = [None]
+        self.n_keywords: int = 0
+        self.max_keyword_len: int = 0
+
+        for word in keywords:
+            self._insert(word)
+
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return self.n_keywords
+
+    def __contains__(self, word: str) -> bool:
+        return self.lookup(word) is not None
+
+    def lookup(self, word: str) -> str | None:
+        """Return the stored keyword that ``word`` is equivalent to, if any."""
+        if self.normalizer is not None:
+            word = self.normalizer.normalize(word)
+
+        node = 0
+        for char in word:
+            node = self._goto[node].get(char, -1)
+            if node < 0:
+                return None
+
+        return self._keywords[node]
+
+    def keywords(self) -> Iterator[str]:
+        """Iterate over the keywords in the automaton."""
+        return (keyword for keyword in self._keywords if keyword is not None)
+
+    def _insert(self, word: str) -> None:
+        path = word if self.normalizer is None else self.normalizer.normalize(word)
+        if not path:
+            return
+
+        goto = self._goto
+        node = 0
+        for char in path:
+            child = goto[node].get(char)
+            if child is None:
+                child = len(goto)
+                goto[node][char] = child
+                goto.append({})
+                self._keywords.append(None)
+
+            node = child
+
+        if self._keywords[node] is None:
+            self._keywords[node] = word
+            self.n_keywords += 1
+            self.max_keyword_len = max(self.max_keyword_len, len(path))
+
+    def _build_failure_links(self) -> None:
+        """Breadth-first pass computing failure and output links.
+
+        BFS guarantees that a node's failure target (which is always
+        shallower) is finished before the node itself is visited.
+        """
+        goto, keywords = self._goto, self._keywords
+        fail = [0] * len(goto)
+        output = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                f = fail[node]
+                while f and char not in goto[f]:
+                    f = fail[f]
+
+                # children of the root always fail back to the root
+                f = goto[f].get(char, 0) if node else 0
+                fail[child] = f
+                output[child] = f if keywords[f] is not None else output[f]
+                queue.append(child)
+
+        self._fail, self._output = fail, output
+
+    def step(self, node: int, char: str) -> int:
+        """Follow one transition, falling back along failure links."""
+        goto, fail = self._goto, self._fail
+        while True:
+            nxt = goto[node].get(char)
+            if nxt is not None:
+                return nxt
+            if not node:
+                return 0
+            node = fail[node]
+
+    def node_keywords(self, node: int) -> list[str]:
+        """Keywords that end at ``node``, longest first."""
+        keywords, output = self._keywords, self._output
+        found = []
+        node = node if keywords[node] is not None else output[node]
+        while node:
+            found.append(keywords[node])
+            node = output[node]
+
+        return found  # type: ignore[return-value]
+
+    def scan(self, text: str, state: Any = 0) -> tuple[list[tuple[Any, ...]], Any]:
+        """Feed ``text`` through the automaton starting from ``state``.
+
+        Args:
+            text: text to scan
+            state: state returned by the previous call, 0 to start fresh
+
+        Returns:
+            ``(matches, state)`` where matches is a list of
+            ``(end_index, keyword)`` pairs (``end_index`` is the inclusive
+            index of the keyword's last character in ``text``), ordered by
+            end index, and state is the node reached after the last character.
+            With a normalizer the matches are ``(end_index, keyword,
+            start_index)`` and the state is opaque.
+        """
+        if self.normalizer is not None:
+            return _scan_folded(self, text, state)
+
+        goto, fail, output, keywords = (
+            self._goto,
+            self._fail,
+            self._output,
+            self._keywords,
+        )
+        matches: list[tuple[int, str]] = []
+        for i, char in enumerate(text):
+            while True:
+                nxt = goto[state].get(char)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+
+            node = state if keywords[state] is not None else output[state]
+            while node:
+                matches.append((i, keywords[node]))  # type: ignore[arg-type]
+                node = output[node]
+
+        return matches, state
+
+    def compile(self) -> CompactAutomaton:
+        """Freeze this automaton into the flat array representation."""
+        return CompactAutomaton.from_automaton(self)
+
+
+class CompactAutomaton:
+    """Read-only Aho-Corasick automaton stored in flat typed arrays.
+
+    The dict-per-node layout of ``AhoCorasickAutomaton`` costs a few hundred
+    bytes per trie node.  Here nodes are renumbered in BFS order and the
+    transitions are packed CSR-style: the edges of node ``n`` live in
+    ``chars[offsets[n]:offsets[n + 1]]`` (sorted code points) with the
+    matching destinations in ``targets``, and are looked up by binary search.
+    Failure links, output links and keyword ids are one array slot per node,
+    and all keywords share a single string, so a node costs 16 bytes plus
+    8 bytes per edge.  Only the root transitions are kept in a dict, since
+    the scanner comes back to the root after nearly every mismatch.
+
+    The tables can be written to disk with ``save`` and mapped back with
+    ``load``.  A loaded automaton reads its tables straight out of a
+    read-only ``mmap``, so every process that loads the same file shares a
+    single page-cache copy and startup costs no more than a page fault per
+    touched page.
+
+    Examples:
+    ::
+        automaton = CompactAutomaton.from_keywords({"he", "she", "hers"})
+        matches, state = automaton.scan("ushers")
+
+        automaton.save("/var/lib/kipp/lexicon.dfa")
+        automaton = CompactAutomaton.load("/var/lib/kipp/lexicon.dfa")
+    """
+
+    _mmap: mmap.mmap | None = None
+    _path: str | None = None
+
+    def __init__(
+        self,
+        offsets: Any,
+        chars: Any,
+        targets: Any,
+        fail: Any,
+        output: Any,
+        keyword_ids: Any,
+        keyword_offsets: Any,
+        keyword_blob: str,
+        normalizer: KeywordNormalizer | None = None,
+        max_keyword_len: int | None = None,
+    ) -> None:
+        """
+        Args:
+            offsets: per-node start index into ``chars``/``targets``,
+                with one trailing slot holding the total edge count
+            chars: edge labels as code points, sorted within each node
+            targets: destination node of each edge
+            fail: failure link of each node
+            output: nearest terminal node on each node's failure chain
+            keyword_ids: keyword id ending at each node, -1 if none
+            keyword_offsets: start of each keyword in ``keyword_blob``,
+                with one trailing slot holding the blob length
+            keyword_blob: all keywords concatenated
+            normalizer: folding the trie was built with
+            max_keyword_len: length of the longest (folded) keyword,
+                computed from the keywords when omitted
+        """
+        self._offsets = offsets
+        self._chars = chars
+        self._targets = targets
+        self._fail = fail
+        self._output = output
+        self._keyword_ids = keyword_ids
+        self._keyword_offsets = keyword_offsets
+        self._keyword_blob = keyword_blob
+        self.normalizer: KeywordNormalizer | None = normalizer
+        self.n_keywords: int = len(keyword_offsets) - 1
+        if max_keyword_len is None:
+            max_keyword_len = max(
+                (
+                    len(kw) if normalizer is None else normalizer.length(kw)
+                    for kw in self.keywords()
+                ),
+                default=0,
+            )
+        self.max_keyword_len: int = max_keyword_len
+        self._root_goto: dict[int, int] = {
+            chars[j]: targets[j] for j in range(offsets[0], offsets[1])
+        }
+
+    def __len__(self) -> int:
+        return self.n_keywords
+
+    def __contains__(self, word: str) -> bool:
+        return self.lookup(word) is not None
+
+    def lookup(self, word: str) -> str | None:
+        """Return the stored keyword that ``word`` is equivalent to, if any."""
+        if self.normalizer is not None:
+            word = self.normalizer.normalize(word)
+
+        offsets, chars, targets = self._offsets, self._chars, self._targets
+        node = 0
+        for char in word:
+            code = ord(char)
+            lo, hi = offsets[node], offsets[node + 1]
+            j = bisect_left(chars, code, lo, hi)
+            if j == hi or chars[j] != code:
+                return None
+            node = targets[j]
+
+        keyword_id = self._keyword_ids[node]
+        return self.keyword(keyword_id) if keyword_id >= 0 else None
+
+    def keywords(self) -> Iterator[str]:
+        """Iterate over the keywords in the automaton."""
+        return (self.keyword(i) for i in range(self.n_keywords))
+
+    def compile(self) -> CompactAutomaton:
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        if self._mmap is not None:
+            # let the receiving process map the same file instead of
+            # copying the tables through the pickle stream
+            return (CompactAutomaton.load, (self._path,))
+
+        return (
+            CompactAutomaton,
+            (
+                self._offsets,
+                self._chars,
+                self._targets,
+                self._fail,
+                self._output,
+                self._keyword_ids,
+                self._keyword_offsets,
+                self._keyword_blob,
+                self.normalizer,
+                self.max_keyword_len,
+            ),
+        )
+
+    @classmethod
+    def from_keywords(
+        cls, keywords: Iterable[str], normalizer: KeywordNormalizer | None = None
+    ) -> CompactAutomaton:
+        return cls.from_automaton(AhoCorasickAutomaton(keywords, normalizer))
+
+    @classmethod
+    def from_automaton(cls, automaton: AhoCorasickAutomaton) -> CompactAutomaton:
+        """Pack a dict-backed automaton into flat arrays."""
+        goto = automaton._goto
+        # BFS renumbering keeps shallow, frequently visited nodes together
+        order = [0]
+        for node in order:
+            order.extend(goto[node][char] for char in sorted(goto[node]))
+
+        new_id = [0] * len(order)
+        for i, node in enumerate(order):
+            new_id[node] = i
+
+        offsets, chars, targets = array("I"), array("I"), array("I")
+        fail, output, keyword_ids = array("I"), array("I"), array("i")
+        keyword_offsets, keyword_parts = array("I", [0]), []
+        for node in order:
+            offsets.append(len(chars))
+            for char in sorted(goto[node]):
+                chars.append(ord(char))
+                targets.append(new_id[goto[node][char]])
+
+            fail.append(new_id[automaton._fail[node]])
+            output.append(new_id[automaton._output[node]])
+            keyword = automaton._keywords[node]
+            if keyword is None:
+                keyword_ids.append(-1)
+            else:
+                keyword_ids.append(len(keyword_parts))
+                keyword_parts.append(keyword)
+                keyword_offsets.append(keyword_offsets[-1] + len(keyword))
+
+        offsets.append(len(chars))
+        return cls(
+            offsets=offsets,
+            chars=chars,
+            targets=targets,
+            fail=fail,
+            output=output,
+            keyword_ids=keyword_ids,
+            keyword_offsets=keyword_offsets,
+            keyword_blob="".join(keyword_parts),
+            normalizer=automaton.normalizer,
+            max_keyword_len=automaton.max_keyword_len,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the automaton tables, in bytes."""
+        return (
+            sum(
+                len(arr) * arr.itemsize
+                for arr in (
+                    self._offsets,
+                    self._chars,
+                    self._targets,
+                    self._fail,
+                    self._output,
+                    self._keyword_ids,
+                    self._keyword_offsets,
+                )
+            )
+            + len(self._keyword_blob.encode("utf-8"))
+        )
+
+    def save(self, path: str) -> None:
+        """Write the automaton tables to ``path``.
+
+        The file is written next to ``path`` and renamed into place, so a
+        process loading it concurrently never maps a half-written file.
+        """
+        blob = self._keyword_blob.encode("utf-8")
+        sections: dict[str, list[Any]] = {}
+        payload: list[bytes] = []
+        pos = 0
+        for name in _ARRAY_SECTIONS:
+            arr = getattr(self, "_" + name)
+            data = arr.tobytes()
+            # tables of an mmap-loaded automaton are memoryviews, not arrays
+            typecode = arr.typecode if isinstance(arr, array) else arr.format
+            sections[name] = [typecode, pos, len(arr)]
+            payload.append(data)
+            pos += len(data)
+
+        sections["keyword_blob"] = ["utf-8", pos, len(blob)]
+        payload.append(blob)
+        header = json.dumps(
+            {
+                "version": AUTOMATON_FILE_VERSION,
+                "byteorder": sys.byteorder,
+                "sections": sections,
+                "max_keyword_len": self.max_keyword_len,
+                "normalizer": self.normalizer and self.normalizer.to_config(),
+            }
+        ).encode("utf-8")
+        # pad the header so every table starts 4-byte aligned
+        header += b" " * (-(len(AUTOMATON_FILE_MAGIC) + _HEADER_LEN.size + len(header)) % 4)
+
+        dirpath = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=dirpath, prefix=".kippdfa-")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(AUTOMATON_FILE_MAGIC)
+                fp.write(_HEADER_LEN.pack(len(header)))
+                fp.write(header)
+                for data in payload:
+                    fp.write(data)
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> CompactAutomaton:
+        """Load an automaton written by ``save``.
+
+        Args:
+            path: file written by ``save``
+            use_mmap: map the file read-only and scan it in place; when False
+                the tables are copied into private arrays instead
+
+        Raises:
+            ValueError: the file is not a compatible automaton file
+        """
+        with open(path, "rb") as fp:
+            if use_mmap:
+                buf: Any = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = fp.read()
+
+        view = memoryview(buf)
+        magic_len = len(AUTOMATON_FILE_MAGIC)
+        if bytes(view[:magic_len]) != AUTOMATON_FILE_MAGIC:
+            raise ValueError("{} is not a DFAFilter automaton file".format(path))
+
+        (header_len,) = _HEADER_LEN.unpack_from(view, magic_len)
+        body_at = magic_len + _HEADER_LEN.size + header_len
+        header = json.loads(bytes(view[magic_len + _HEADER_LEN.size : body_at]))
+        if header["version"] != AUTOMATON_FILE_VERSION:
+            raise ValueError(
+                "unsupported automaton file version {}".format(header["version"])
+            )
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(
+                "automaton file {} was written on a {}-endian machine".format(
+                    path, header["byteorder"]
+                )
+            )
+
+        tables: dict[str, Any] = {}
+        for name in _ARRAY_SECTIONS:
+            typecode, offset, length = header["sections"][name]
+            itemsize = array(typecode).itemsize
+            start = body_at + offset
+            table = view[start : start + length * itemsize].cast(typecode)
+            tables[name] = table if use_mmap else array(typecode, table)
+
+        _, offset, length = header["sections"]["keyword_blob"]
+        start = body_at + offset
+        keyword_blob = str(view[start : start + length], "utf-8")
+
+        normalizer = header.get("normalizer")
+        automaton = cls(
+            keyword_blob=keyword_blob,
+            normalizer=normalizer and KeywordNormalizer(**normalizer),
+            max_keyword_len=header.get("max_keyword_len"),
+            **tables,
+        )
+        if use_mmap:
+            # keep the mapping alive for as long as the views are in use
+            automaton._mmap = buf
+            automaton._path = os.path.abspath(path)
+
+        return automaton
+
+    def keyword(self, keyword_id: int) -> str:
+        """Return the keyword with the given id."""
+        return self._keyword_blob[
+            self._keyword_offsets[keyword_id] : self._keyword_offsets[keyword_id + 1]
+        ]
+
+    def step(self, node: int, char: str) -> int:
+        """Follow one transition, falling back along failure links."""
+        code = ord(char)
+        offsets, chars, targets, fail = (
+            self._offsets,
+            self._chars,
+            self._targets,
+            self._fail,
+        )
+        while node:
+            lo, hi = offsets[node], offsets[node + 1]
+            if lo != hi:
+                j = bisect_left(chars, code, lo, hi)
+                if j != hi and chars[j] == code:
+                    return targets[j]
+
+            node = fail[node]
+
+        return self._root_goto.get(code, 0)
+
+    def node_keywords(self, node: int) -> list[str]:
+        """Keywords that end at ``node``, longest first."""
+        keyword_ids, output = self._keyword_ids, self._output
+        found = []
+        node = node if keyword_ids[node] >= 0 else output[node]
+        while node:
+            found.append(self.keyword(keyword_ids[node]))
+            node = output[node]
+
+        return found
+
+    def scan(self, text: str, state: Any = 0) -> tuple[list[tuple[Any, ...]], Any]:
+        """Same contract as ``AhoCorasickAutomaton.scan``."""
+        if self.normalizer is not None:
+            return _scan_folded(self, text, state)
+
+        offsets, chars, targets = self._offsets, self._chars, self._targets
+        fail, output, keyword_ids = self._fail, self._output, self._keyword_ids
+        root_goto, keyword = self._root_goto, self.keyword
+        matches: list[tuple[int, str]] = []
+        for i, char in enumerate(text):
+            code = ord(char)
+            while True:
+                if not state:
+                    state = root_goto.get(code, 0)
+                    break
+
+                lo, hi = offsets[state], offsets[state + 1]
+                if lo != hi:
+                    j = bisect_left(chars, code, lo, hi)
+                    if j != hi and chars[j] == code:
+                        state = targets[j]
+                        break
+
+                state = fail[state]
+
+            node = state if keyword_ids[state] >= 0 else output[state]
+            while node:
+                matches.append((i, keyword(keyword_ids[node])))
+                node = output[node]
+
+        return matches, state
+
+
+class LayeredAutomaton:
+    """Immutable snapshot of a base automaton plus pending edits.
+
+    Keywords added since the base was built live in a small ``delta``
+    automaton, and base keywords removed since then are listed in
+    ``removed``.  Both are cheap to rebuild, so ``DFAFilter.add_keywords``
+    and ``DFAFilter.remove_keywords`` never touch the (large) base.  The
+    price is a second pass over the text for the delta, which is why
+    ``DFAFilter`` folds the edits back into a new base once they grow.
+
+    Scan state is a ``(base_state, delta_state)`` pair.
+    """
+
+    def __init__(
+        self,
+        base: AhoCorasickAutomaton | CompactAutomaton,
+        delta: AhoCorasickAutomaton,
+        removed: frozenset[str],
+    ) -> None:
+        self.base = base
+        self.delta = delta
+        self.removed: frozenset[str] = removed
+        self.normalizer: KeywordNormalizer | None = base.normalizer
+        self.n_keywords: int = len(base) - len(removed) + len(delta)
+        self.max_keyword_len: int = max(base.max_keyword_len, delta.max_keyword_len)
+
+    def __len__(self) -> int:
+        return self.n_keywords
+
+    def __contains__(self, word: str) -> bool:
+        return self.lookup(word) is not None
+
+    def lookup(self, word: str) -> str | None:
+        """Return the stored keyword that ``word`` is equivalent to, if any."""
+        keyword = self.base.lookup(word)
+        if keyword is None or keyword in self.removed:
+            keyword = self.delta.lookup(word)
+
+        return keyword
+
+    @property
+    def n_edits(self) -> int:
+        return len(self.delta) + len(self.removed)
+
+    def keywords(self) -> Iterator[str]:
+        """Iterate over the keywords in the snapshot."""
+        removed = self.removed
+        yield from (keyword for keyword in self.base.keywords() if keyword not in removed)
+        yield from self.delta.keywords()
+
+    def compile(self) -> CompactAutomaton:
+        return CompactAutomaton.from_keywords(self.keywords(), self.normalizer)
+
+    def scan(self, text: str, state: Any = 0) -> tuple[list[tuple[Any, ...]], Any]:
+        """Same contract as ``AhoCorasickAutomaton.scan``."""
+        base_state, delta_state = state if state else (0, 0)
+        matches, base_state = self.base.scan(text, base_state)
+        if self.removed:
+            removed = self.removed
+            matches = [m for m in matches if m[1] not in removed]
+
+        if len(self.delta):
+            delta_matches, delta_state = self.delta.scan(text, delta_state)
+            if delta_matches:
+                matches.extend(delta_matches)
+                matches.sort(key=lambda m: m[0])
+
+        return matches, (base_state, delta_state)
+
+
+def _to_keyword_matches(
+    automaton: AhoCorasickAutomaton | CompactAutomaton | LayeredAutomaton,
+    scanned: list[tuple[Any, ...]],
+    offset: int = 0,
+) -> list[KeywordMatch]:
+    """Turn ``scan`` results into ``KeywordMatch`` spans shifted by ``offset``."""
+    if automaton.normalizer is None:
+        return [
+            KeywordMatch(offset + end + 1 - len(keyword), offset + end + 1, keyword)
+            for end, keyword in scanned
+        ]
+
+    return [
+        KeywordMatch(offset + start, offset + end + 1, keyword)
+        for end, keyword, start in scanned
+    ]
+
+
+def _leftmost_longest(matches: list[KeywordMatch]) -> list[KeywordMatch]:
+    """Keep the longest match at the leftmost free position, then skip past it."""
+    selected: list[KeywordMatch] = []
+    last_end = 0
+    for match in sorted(matches, key=lambda m: (m.start, -m.end)):
+        if match.start >= last_end:
+            selected.append(match)
+            last_end = match.end
+
+    return selected
+
+
+class StreamScanner:
+    """Incremental scanner that finds keywords across chunk boundaries.
+
+    The automaton state and the absolute offset are carried from one
+    ``feed`` call to the next, so a keyword split between two chunks is
+    still reported, and memory stays constant no matter how long the
+    stream is.  Offsets in the reported ``KeywordMatch`` are relative to
+    the start of the whole stream.
+
+    In overlapping mode every match is returned by the ``feed`` call that
+    completes it, in order of end offset.  In leftmost-longest mode a match
+    can still be displaced by a longer one until ``max_keyword_len``
+    further (non-ignorable) characters have been fed, so matches are held
+    back until then and the rest are returned by ``close``.
+
+    Examples:
+    ::
+        scanner = dfa_filter.stream_scanner()
+        for chunk in chunks:
+            for match in scanner.feed(chunk):
+                ...
+        for match in scanner.close():
+            ...
+    """
+
+    def __init__(
+        self,
+        automaton: AhoCorasickAutomaton | CompactAutomaton | LayeredAutomaton,
+        overlapping: bool = True,
+    ) -> None:
+        self._automaton = automaton
+        self._overlapping: bool = overlapping
+        self._state: Any = 0
+        self._pos: int = 0
+        self._pending: list[KeywordMatch] = []
+        self._last_end: int = 0
+        # offsets of the latest characters that fold to something,
+        # newest first, only tracked with a normalizer
+        self._recent: list[int] = []
+
+    def feed(self, chunk: str) -> list[KeywordMatch]:
+        """Scan the next chunk and return the matches that are now final."""
+        automaton = self._automaton
+        scanned, self._state = automaton.scan(chunk, self._state)
+        matches = _to_keyword_matches(automaton, scanned, self._pos)
+        self._pos += len(chunk)
+        if self._overlapping:
+            return matches
+
+        self._pending.extend(matches)
+        # no match found later can start at or before ``cutoff``
+        if automaton.normalizer is None:
+            return self._select(self._pos - automaton.max_keyword_len)
+
+        # a later match spans at most max_keyword_len folded characters, and
+        # every character that folds to something yields at least one
+        need = automaton.max_keyword_len - 1
+        fold, recent = automaton.normalizer.fold, []
+        for i in range(len(chunk) - 1, -1, -1):
+            if len(recent) >= need:
+                break
+            if fold(chunk[i]):
+                recent.append(self._pos - len(chunk) + i)
+
+        self._recent = (recent + self._recent)[:need]
+        if need <= 0:
+            return self._select(self._pos - 1)
+        if len(self._recent) < need:
+            return []
+
+        return self._select(self._recent[-1] - 1)
+
+    def close(self) -> list[KeywordMatch]:
+        """Return the matches still held back at the end of the stream."""
+        return self._select(self._pos)
+
+    def _select(self, cutoff: int) -> list[KeywordMatch]:
+        ready = [m for m in self._pending if m.start <= cutoff]
+        if not ready:
+            return []
+
+        self._pending = [m for m in self._pending if m.start > cutoff]
+        selected: list[KeywordMatch] = []
+        for match in sorted(ready, key=lambda m: (m.start, -m.end)):
+            if match.start >= self._last_end:
+                selected.append(match)
+                self._last_end = match.end
+
+        return selected
+
+
+def _read_chunks(source: Any, read_size: int) -> Iterator[Any]:
+    while True:
+        chunk = source.read(read_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _filter_text(text: str) -> set[str]:
+    # installed in each worker by ``DFAFilter.load_keywords_batch``
+    return get_worker_state()["dfa_filter"].filter_keyword(text)
+
 
 class DFAFilter:
     """Deterministic Finite Automaton based keyword filter.
@@ -12,14 +925,100 @@ class DFAFilter:
     Builds a trie (prefix tree) from a set of keywords, then scans input text
     to find all occurrences of those keywords in O(n) time per character.
 
+    The default engine walks the trie from every position and stops at the
+    first leaf, so a keyword that is a prefix of another keyword never
+    matches on its own.  Pass ``aho_corasick=True`` to use an Aho-Corasick
+    automaton instead: it reports every keyword in a single pass over the
+    text, including keywords nested in or overlapping with other keywords.
+    ``compact=True`` additionally packs that automaton into flat arrays,
+    which takes roughly an order of magnitude less memory for large
+    lexicons at the cost of a binary search per transition.
+
+    A built Aho-Corasick filter can be saved to disk and loaded by other
+    processes without rebuilding, see ``save`` and ``load``.  Its lexicon can
+    also be edited in place with ``add_keywords`` and ``remove_keywords``;
+    every edit publishes a new immutable automaton with a single attribute
+    assignment, so scans running in other threads keep using the snapshot
+    they started with and never observe a partially updated automaton.
+
+    To defeat simple evasion (``FoO``, full-width ``ｆｏｏ``, ``f.o.o``) pass
+    ``casefold``, ``fold_width`` and/or ``ignore_chars``.  Keywords and text
+    are folded per character while the automaton steps through the text, so
+    no normalized copy of the document is made, and reported offsets still
+    point into the original text.
+
     Examples:
     ::
         dfa_filter = DFAFilter()
         dfa_filter.build_chains(keywords_set)
         dfa_filter.load_keywords(raw_text)
+
+        # linear-time scanning for large lexicons
+        dfa_filter = DFAFilter(aho_corasick=True)
+        dfa_filter.build_chains(keywords_set)
+        dfa_filter.load_keywords(raw_text)
+
+        # 100k+ keyword lexicons shared by many worker processes
+        dfa_filter = DFAFilter(compact=True)
+
+        # build once, then share the compiled automaton between processes
+        dfa_filter.save("/var/lib/kipp/lexicon.dfa")
+        dfa_filter = DFAFilter.load("/var/lib/kipp/lexicon.dfa")
     """
 
     _chains: dict[str, Any]
+    _automaton: AhoCorasickAutomaton | CompactAutomaton | LayeredAutomaton
+
+    def __init__(
+        self,
+        aho_corasick: bool = False,
+        compact: bool = False,
+        max_pending_edits: int = 1000,
+        casefold: bool = False,
+        fold_width: bool = False,
+        ignore_chars: str = "",
+    ) -> None:
+        """
+        Args:
+            aho_corasick: scan with an Aho-Corasick automaton instead of
+                the recursive trie walk
+            compact: store the Aho-Corasick automaton as flat arrays,
+                implies ``aho_corasick``
+            max_pending_edits: number of keywords added or removed since the
+                last full build before the edits are merged into a new base
+                automaton, see ``add_keywords``
+            casefold: match case-insensitively
+            fold_width: match full-width and other NFKC compatibility
+                characters against their plain forms
+            ignore_chars: characters skipped in both keywords and text
+
+        Normalization options imply ``aho_corasick``.
+        """
+        self.normalizer: KeywordNormalizer | None = None
+        if casefold or fold_width or ignore_chars:
+            self.normalizer = KeywordNormalizer(casefold, fold_width, ignore_chars)
+
+        self.aho_corasick: bool = aho_corasick or compact or bool(self.normalizer)
+        self.compact: bool = compact
+        self.max_pending_edits: int = max_pending_edits
+        # serializes writers; readers never take it
+        self._lock: Lock = Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def _is_built(self) -> bool:
+        if self.aho_corasick:
+            # an automaton whose keywords were all removed is still built
+            return getattr(self, "_automaton", None) is not None
+
+        return bool(getattr(self, "_chains", None))
 
     def load_keywords(self, raw_text: str) -> set[str]:
         """Scan raw_text and return all keywords found within it.
@@ -30,7 +1029,7 @@ class DFAFilter:
         Returns:
             Set of matched keywords found in raw_text
         """
-        assert getattr(self, "_chains", None), "Should invoke build_chains first"
+        assert self._is_built(), "Should invoke build_chains first"
         return self.filter_keyword(raw_text)
 
     def build_chains(self, keywords: set[str]) -> None:
@@ -38,10 +1037,16 @@ class DFAFilter:
 
         Each keyword is decomposed character-by-character into nested dicts.
         A leaf node is represented by an empty dict, signaling end-of-word.
+        In Aho-Corasick mode the failure links are computed here as well.
 
         Args:
             keywords: lexicon of keywords to search for
         """
+        if self.aho_corasick:
+            with self._lock:
+                self._automaton = self._build_automaton(keywords)
+            return
+
         chains: dict[str, Any] = {}
         for word in keywords:
             node = chains
@@ -53,6 +1058,253 @@ class DFAFilter:
 
         self._chains = chains
 
+    def _build_automaton(
+        self, keywords: Iterable[str]
+    ) -> AhoCorasickAutomaton | CompactAutomaton:
+        automaton = AhoCorasickAutomaton(keywords, self.normalizer)
+        return automaton.compile() if self.compact else automaton
+
+    def _edit_keywords(
+        self, added: Iterable[str] = (), removed: Iterable[str] = ()
+    ) -> None:
+        assert self.aho_corasick, "keyword edits require DFAFilter(aho_corasick=True)"
+        with self._lock:
+            current = getattr(self, "_automaton", None)
+            if current is None:
+                current = self._build_automaton(())
+
+            # delta keywords are keyed by their folded form, so that
+            # equivalent spellings are added and removed as one keyword
+            normalize = self.normalizer.normalize if self.normalizer else str
+            if isinstance(current, LayeredAutomaton):
+                base, removed_words = current.base, set(current.removed)
+                delta_words = {normalize(kw): kw for kw in current.delta.keywords()}
+            else:
+                base, delta_words, removed_words = current, {}, set()
+
+            for word in added:
+                if not normalize(word):
+                    continue
+                keyword = base.lookup(word)
+                if keyword is not None:
+                    removed_words.discard(keyword)
+                else:
+                    delta_words.setdefault(normalize(word), word)
+
+            for word in removed:
+                delta_words.pop(normalize(word), None)
+                keyword = base.lookup(word)
+                if keyword is not None:
+                    removed_words.add(keyword)
+
+            snapshot = LayeredAutomaton(
+                base,
+                AhoCorasickAutomaton(delta_words.values(), self.normalizer),
+                frozenset(removed_words),
+            )
+            if snapshot.n_edits > self.max_pending_edits:
+                self._automaton = self._build_automaton(snapshot.keywords())
+            elif snapshot.n_edits:
+                self._automaton = snapshot
+            else:
+                self._automaton = base
+
+    def add_keywords(self, keywords: Iterable[str]) -> None:
+        """Add keywords to the lexicon without rebuilding the automaton.
+
+        New keywords go into a small side automaton that is scanned next to
+        the existing one.  Once more than ``max_pending_edits`` keywords
+        have been added or removed, the whole lexicon is rebuilt in the
+        calling thread; scans in other threads carry on with the previous
+        snapshot meanwhile.
+
+        Args:
+            keywords: keywords to add, existing ones are ignored
+        """
+        self._edit_keywords(added=keywords)
+
+    def remove_keywords(self, keywords: Iterable[str]) -> None:
+        """Remove keywords from the lexicon without rebuilding the automaton.
+
+        Removed keywords are filtered out of the scan results until the
+        next rebuild, see ``add_keywords``.
+
+        Args:
+            keywords: keywords to remove, unknown ones are ignored
+        """
+        self._edit_keywords(removed=keywords)
+
+    def compact_keywords(self) -> None:
+        """Merge pending keyword edits into a freshly built automaton now."""
+        assert self.aho_corasick, "keyword edits require DFAFilter(aho_corasick=True)"
+        with self._lock:
+            current = getattr(self, "_automaton", None)
+            if isinstance(current, LayeredAutomaton):
+                self._automaton = self._build_automaton(current.keywords())
+
+    def find_matches(
+        self, raw_text: str, overlapping: bool = True
+    ) -> list[KeywordMatch]:
+        """Locate every keyword occurrence in raw_text.
+
+        Requires Aho-Corasick mode.  All occurrences come from the same
+        single pass used by ``load_keywords``.
+
+        Args:
+            raw_text: text to scan
+            overlapping: report every occurrence, including keywords nested
+                in or overlapping with others.  When False, only the
+                leftmost-longest, non-overlapping occurrences are kept.
+
+        Returns:
+            ``KeywordMatch(start, end, keyword)`` tuples ordered by position,
+            where ``raw_text[start:end] == keyword``.  With normalization
+            ``keyword`` is the lexicon spelling and ``raw_text[start:end]``
+            is the text that matched it.
+
+        Examples:
+        ::
+            dfa_filter = DFAFilter(aho_corasick=True)
+            dfa_filter.build_chains({"he", "she", "hers"})
+            dfa_filter.find_matches("ushers")
+            # [KeywordMatch(1, 4, 'she'), KeywordMatch(2, 4, 'he'),
+            #  KeywordMatch(2, 6, 'hers')]
+            dfa_filter.find_matches("ushers", overlapping=False)
+            # [KeywordMatch(1, 4, 'she')]
+        """
+        assert self.aho_corasick, "find_matches requires DFAFilter(aho_corasick=True)"
+        assert self._is_built(), "Should invoke build_chains first"
+        automaton = self._automaton
+        scanned, _ = automaton.scan(raw_text)
+        matches = _to_keyword_matches(automaton, scanned)
+        if not overlapping:
+            return _leftmost_longest(matches)
+
+        matches.sort()
+        return matches
+
+    def count_matches(self, raw_text: str, overlapping: bool = True) -> Counter[str]:
+        """Count occurrences of each keyword in raw_text.
+
+        Takes the same arguments as ``find_matches``; use
+        ``Counter(m.keyword for m in matches)`` when the spans are needed too.
+        """
+        return Counter(m.keyword for m in self.find_matches(raw_text, overlapping))
+
+    def stream_scanner(self, overlapping: bool = True) -> StreamScanner:
+        """Create a ``StreamScanner`` over the current automaton.
+
+        Args:
+            overlapping: see ``find_matches``
+        """
+        assert self.aho_corasick, "stream_scanner requires DFAFilter(aho_corasick=True)"
+        assert self._is_built(), "Should invoke build_chains first"
+        return StreamScanner(self._automaton, overlapping=overlapping)
+
+    def find_matches_stream(
+        self,
+        source: Any,
+        overlapping: bool = True,
+        read_size: int = 1024 * 1024,
+    ) -> Iterator[KeywordMatch]:
+        """Yield keyword matches from a text file or an iterable of chunks.
+
+        Only one chunk is held in memory at a time, so multi-GB files can be
+        scanned in constant memory.  Offsets count characters from the start
+        of the stream.
+
+        Args:
+            source: a text-mode file object, or any iterable of ``str`` chunks
+            overlapping: see ``find_matches``
+            read_size: characters per ``read()`` when source is a file
+
+        Examples:
+        ::
+            with open("feed.log", encoding="utf-8") as fp:
+                for match in dfa_filter.find_matches_stream(fp):
+                    print(match.start, match.keyword)
+        """
+        scanner = self.stream_scanner(overlapping=overlapping)
+        chunks = _read_chunks(source, read_size) if hasattr(source, "read") else source
+        for chunk in chunks:
+            if not isinstance(chunk, str):
+                raise TypeError(
+                    "find_matches_stream expects str chunks, but got {}; "
+                    "open files in text mode".format(type(chunk).__name__)
+                )
+            yield from scanner.feed(chunk)
+
+        yield from scanner.close()
+
+    def load_keywords_batch(
+        self,
+        texts: Iterable[str],
+        n_workers: int = 0,
+        chunksize: int = 64,
+    ) -> Iterator[set[str]]:
+        """Scan many documents, yielding one result set per document in order.
+
+        ``texts`` is consumed lazily, so it can be a generator over a corpus
+        that does not fit in memory.  With ``n_workers`` the documents are
+        scanned by a ``ProcessPoolExecutor``: the filter is pickled once
+        into each worker as shared worker state (an mmap-loaded automaton
+        is re-mapped from its file rather than copied), documents are sent
+        in chunks of ``chunksize``, and at most two chunks per worker are in
+        flight at any time.
+
+        Args:
+            texts: documents to scan
+            n_workers: number of worker processes, 0 scans in this process
+            chunksize: documents per task sent to a worker
+
+        Examples:
+        ::
+            with open("listings.txt") as fp:
+                for keywords in dfa_filter.load_keywords_batch(fp, n_workers=8):
+                    ...
+        """
+        assert self._is_built(), "Should invoke build_chains first"
+        assert n_workers >= 0, "n_workers should not be negative"
+        assert chunksize > 0, "chunksize should greater than 0"
+        if not n_workers:
+            for text in texts:
+                yield self.filter_keyword(text)
+
+            return
+
+        with ProcessPoolExecutor(n_workers, shared={"dfa_filter": self}) as executor:
+            yield from executor.imap(
+                _filter_text,
+                texts,
+                chunksize=chunksize,
+                max_in_flight=2 * n_workers * chunksize,
+            )
+
+    def save(self, path: str) -> None:
+        """Write the compiled automaton to ``path``.
+
+        Only available in Aho-Corasick mode; a dict-backed automaton or one
+        with pending keyword edits is compiled to the compact layout before
+        it is written.
+        """
+        assert self.aho_corasick, "save requires DFAFilter(aho_corasick=True)"
+        assert self._is_built(), "Should invoke build_chains first"
+        self._automaton.compile().save(path)
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = True) -> DFAFilter:
+        """Create a ready-to-scan compact filter from a file written by ``save``.
+
+        Args:
+            path: automaton file
+            use_mmap: scan the memory-mapped file in place instead of
+                copying the tables into process memory
+        """
+        dfa_filter = cls(compact=True)
+        dfa_filter._automaton = CompactAutomaton.load(path, use_mmap=use_mmap)
+        dfa_filter.normalizer = dfa_filter._automaton.normalizer
+        return dfa_filter
+
     def is_word_in_chains(
         self, chains: dict[str, Any], raw_text: str, n_len: int, i: int
     ) -> int | None:
@@ -78,6 +1330,10 @@ class DFAFilter:
 
     def filter_keyword(self, raw_text: str) -> set[str]:
         """Scan text against the trie and collect all matched keywords."""
+        if self.aho_corasick:
+            matches, _ = self._automaton.scan(raw_text)
+            return {m[1] for m in matches}
+
         result_keywords: set[str] = set()
         i, n_len = 0, len(raw_text)
         for i in range(n_len):
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Exceptions raised by the pool executors.
+
+Hierarchy: KippException -> ExecutorFullError.
+"""
+
+from __future__ import annotations
+
+from kipp.libs import KippException
+
+
+class ExecutorFullError(KippException):
+    """Raised by ``submit`` when a bounded executor's queue has no room."""
+
+    def __init__(self, max_queue_size: int) -> None:
+        super().__init__("executor queue is full ({} tasks)".format(max_queue_size))
+        self.max_queue_size = max_queue_size
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+------------------
+Timing Histograms
+------------------
+
+Per-function latency histograms cheap enough to leave on in production.
+
+Usage
+::
+
+    from kipp.decorator import timer
+    from kipp.utils.metrics import get_timing_registry
+
+    @timer(histogram=True, sample_rate=0.1, log_stats_sec=60)
+    def handle(req):
+        ...
+
+    handle.timing_info()   # TimingInfo(calls=..., p50=..., p99=..., ...)
+    get_timing_registry().export()   # log every instrumented function
+
+Durations are bucketed like HdrHistogram: exact below 128µs, then 64
+buckets per power of two, so any percentile is within 1.6% of the truth.
+Only the buckets that were hit are stored.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import random
+import threading
+import weakref
+from collections import namedtuple
+from collections.abc import Callable
+from time import monotonic, perf_counter_ns
+from typing import Any, TypeVar
+
+from .logger import get_logger
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# values below 2 ** _SUB_BITS µs get a bucket each, larger ones
+# 2 ** (_SUB_BITS - 1) buckets per power of two
+_SUB_BITS = 7
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+
+TimingInfo = namedtuple(
+    "TimingInfo",
+    ["calls", "errors", "sampled", "mean", "p50", "p95", "p99", "max"],
+)
+TimingInfo.__doc__ = """Snapshot of a :class:`Histogram`; durations are in seconds.
+
+Fields:
+    calls: calls made, sampled or not
+    errors: calls that raised
+    sampled: calls whose duration was recorded
+    mean, p50, p95, p99, max: over the sampled durations, 0 when none
+"""
+
+
+def _bucket_index(us: int) -> int:
+    if us < _SUB_COUNT:
+        return us
+    shift = us.bit_length() - _SUB_BITS
+    return shift * _HALF_COUNT + (us >> shift)
+
+
+def _bucket_value(idx: int) -> int:
+    """Highest value in µs that falls into bucket idx."""
+    if idx < _SUB_COUNT:
+        return idx
+    shift = idx // _HALF_COUNT - 1
+    return ((idx - shift * _HALF_COUNT + 1) << shift) - 1
+
+
+class _Shard:
+    """Counters written by one thread only, so updates need no lock."""
+
+    __slots__ = ("counts", "calls", "errors", "total_us", "max_us")
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.calls = 0
+        self.errors = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def fold(self, other: _Shard) -> None:
+        """Add the counters of other into this shard."""
+        for idx, n in list(other.counts.items()):
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.calls += other.calls
+        self.errors += other.errors
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+
+class _Owner:
+    """Kept in a thread's local storage, which is freed when the thread exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class Histogram:
+    """HDR-style latency histogram sharded per thread.
+
+    Every thread records into its own shard, so recording takes no lock and
+    loses no update; readers merge the shards.  Shards of threads that have
+    exited, including threads not started by :mod:`threading`, are folded
+    into one, so short-lived threads do not pile up.  ``sample_rate`` below
+    1 times only that fraction of calls, while calls and errors are still
+    counted exactly.
+
+    Args:
+        name: label used in exports
+        sample_rate: fraction of calls to time, in (0, 1]
+    """
+
+    def __init__(self, name: str, sample_rate: float = 1.0) -> None:
+        assert 0 < sample_rate <= 1, (
+            "sample_rate should in (0, 1], but got {}".format(sample_rate)
+        )
+        self.name = name
+        self.sample_rate = sample_rate
+        self._local = threading.local()
+        # (weakref to the _Owner of the recording thread, shard) per thread
+        self._shards: list[tuple[weakref.ref[_Owner], _Shard]] = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+        self._next_dump_at = 0.0
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            # Thread.is_alive() can not tell when a foreign thread exits
+            owner = self._local.owner = _Owner()
+            with self._lock:
+                self._prune()
+                self._shards.append((weakref.ref(owner), shard))
+            return shard
+
+    def _prune(self) -> None:
+        """Fold shards of exited threads into the retired shard, under the lock.
+
+        A dead thread writes no more, so its shard can be read safely.
+        """
+        alive = []
+        for owner, shard in self._shards:
+            if owner() is not None:
+                alive.append((owner, shard))
+            else:
+                self._retired.fold(shard)
+        self._shards = alive
+
+    def sampling(self) -> bool:
+        """Decide whether the next call should be timed."""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, ns: int | None, error: bool = False) -> None:
+        """Count one call, and its duration in nanoseconds if it was timed."""
+        shard = self._shard()
+        shard.calls += 1
+        if error:
+            shard.errors += 1
+        if ns is None:
+            return
+
+        us = ns // 1000
+        idx = _bucket_index(us)
+        shard.counts[idx] = shard.counts.get(idx, 0) + 1
+        shard.total_us += us
+        if us > shard.max_us:
+            shard.max_us = us
+
+    def clear(self) -> None:
+        """Zero every shard; increments racing with it may survive."""
+        with self._lock:
+            self._retired = _Shard()
+            for _, shard in self._shards:
+                shard.counts = {}
+                shard.calls = shard.errors = 0
+                shard.total_us = shard.max_us = 0
+
+    def due(self, interval: float) -> bool:
+        """Return True at most once per interval, for periodic dumps."""
+        now = monotonic()
+        if now < self._next_dump_at:
+            return False
+        first = not self._next_dump_at
+        self._next_dump_at = now + interval
+        return not first
+
+    def info(self) -> TimingInfo:
+        merged = _Shard()
+        with self._lock:
+            self._prune()
+            merged.fold(self._retired)
+            shards = [shard for _, shard in self._shards]
+
+        for shard in shards:
+            merged.fold(shard)
+        counts = merged.counts
+        max_us = merged.max_us
+        sampled = sum(counts.values())
+
+        percentiles = [0.0, 0.0, 0.0]
+        if sampled:
+            ranks = [sampled * 0.50, sampled * 0.95, sampled * 0.99]
+            seen = 0
+            i = 0
+            for idx in sorted(counts):
+                seen += counts[idx]
+                while i < len(ranks) and seen >= ranks[i]:
+                    percentiles[i] = min(_bucket_value(idx), max_us) / 1e6
+                    i += 1
+                if i == len(ranks):
+                    break
+
+        return TimingInfo(
+            merged.calls,
+            merged.errors,
+            sampled,
+            merged.total_us / sampled / 1e6 if sampled else 0.0,
+            *percentiles,
+            max_us / 1e6,
+        )
+
+
+def _log_timing(timings: dict[str, TimingInfo]) -> None:
+    for name, info in timings.items():
+        get_logger().info(
+            "timing %s: calls=%d errors=%d p50=%.6fs p95=%.6fs p99=%.6fs max=%.6fs",
+            name,
+            info.calls,
+            info.errors,
+            info.p50,
+            info.p95,
+            info.p99,
+            info.max,
+        )
+
+
+class TimingRegistry:
+    """Named histograms of every instrumented function."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: dict[str, Histogram] = {}
+
+    def histogram(self, name: str, sample_rate: float = 1.0) -> Histogram:
+        """Return the histogram called name, creating it on first use."""
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram(name, sample_rate)
+            return hist
+
+    def snapshot(self) -> dict[str, TimingInfo]:
+        with self._lock:
+            histograms = list(self._histograms.values())
+        return {h.name: h.info() for h in histograms}
+
+    def export(
+        self, exporter: Callable[[dict[str, TimingInfo]], Any] | None = None
+    ) -> dict[str, TimingInfo]:
+        """Pass a snapshot to exporter, logging it by default, and return it."""
+        timings = self.snapshot()
+        (exporter or _log_timing)(timings)
+        return timings
+
+    def clear(self) -> None:
+        with self._lock:
+            histograms = list(self._histograms.values())
+        for h in histograms:
+            h.clear()
+
+
+_registry = TimingRegistry()
+
+
+def get_timing_registry() -> TimingRegistry:
+    """Return the registry shared by ``timer(histogram=True)``."""
+    return _registry
+
+
+def instrument(
+    fn: F,
+    name: str | None = None,
+    sample_rate: float = 1.0,
+    log_stats_sec: int | float = 0,
+) -> F:
+    """Record the calls of fn into a histogram of the shared registry.
+
+    Nothing is logged per call.  The wrapper gets ``timing_info()`` and
+    ``timing_clear()``, and with ``log_stats_sec`` a summary is logged from
+    the call path at most once per interval.  ``async def`` functions are
+    timed until their coroutine finishes.
+
+    Args:
+        fn: function to wrap
+        name: histogram name, defaults to ``module.qualname``
+        sample_rate: fraction of calls to time, in (0, 1]
+        log_stats_sec: seconds between logged summaries, 0 disables
+    """
+    hist = _registry.histogram(
+        name or "{}.{}".format(fn.__module__, fn.__qualname__), sample_rate
+    )
+
+    def dump() -> None:
+        if log_stats_sec and hist.due(log_stats_sec):
+            _log_timing({hist.name: hist.info()})
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kw: Any) -> Any:
+            start_at = perf_counter_ns() if hist.sampling() else None
+            try:
+                r = await fn(*args, **kw)
+            except BaseException:
+                hist.record(
+                    None if start_at is None else perf_counter_ns() - start_at, True
+                )
+                raise
+            hist.record(None if start_at is None else perf_counter_ns() - start_at)
+            dump()
+            return r
+
+        wrapper: Any = async_wrapper
+    else:
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kw: Any) -> Any:
+            start_at = perf_counter_ns() if hist.sampling() else None
+            try:
+                r = fn(*args, **kw)
+            except BaseException:
+                hist.record(
+                    None if start_at is None else perf_counter_ns() - start_at, True
+                )
+                raise
+            hist.record(None if start_at is None else perf_counter_ns() - start_at)
+            dump()
+            return r
+
+    wrapper.histogram = hist
+    wrapper.timing_info = hist.info
+    wrapper.timing_clear = hist.clear
+    return wrapper  # type: ignore[return-value]
@@ -144,7 +144,25 @@ class AioTestCase(BaseTestCase):
         set_aio_n_workers(6)
         self.assertEqual(thread_executor._n_workers, 6)
         thread_executor.submit(self._simple_task)
-        self.assertRaises(KippException, set_aio_n_workers, 5)
+        set_aio_n_workers(5)
+        self.assertEqual(thread_executor.stats().max_workers, 5)
+        self.assertRaises(KippException, set_aio_n_workers, 0)
+
+    def test_blocking_calls_run_in_parallel(self):
+        from kipp.aio.base import run_on_executor, thread_executor
+
+        class Blocking(object):
+            executor = thread_executor
+
+            @run_on_executor()
+            def sleep(self, sec):
+                time.sleep(sec)
+                return sec
+
+        blocking = Blocking()
+        ts = time.time()
+        run_until_complete(wait([blocking.sleep(1), blocking.sleep(1)]))
+        self.assertLess(time.time() - ts, 1.5)
 
     def test_multi_event(self):
         evt = MultiEvent(3)
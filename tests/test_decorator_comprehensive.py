@@ -1,15 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import dataclasses
+import gc
+import multiprocessing
 import os
+import pickle
+import shutil
 import signal
 import tempfile
 import threading
 import time as time_module
 import unittest
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 from kipp.decorator import (
     CacheItem,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    RetryState,
+    async_timeout,
+    check_timeout,
+    current_deadline,
+    get_timer,
+    get_timing_registry,
+    process_timeout,
+    thread_timeout,
+    async_memo,
+    async_timeout_cache,
     TimeoutError,
     calculate_args_hash,
     debug_wrapper,
@@ -20,6 +40,35 @@ from kipp.decorator import (
     timeout_cache,
     timer,
 )
+from kipp.decorator.backends import MmapCacheBackend, RedisCacheBackend
+from kipp.decorator.cache import (
+    BoundedCache,
+    SingleFlight,
+    TTLCache,
+    args_key,
+    hashed_args_key,
+    typed_args_key,
+)
+
+
+def _run_coroutine(coro: Any) -> Any:
+    """Run coro on a private loop, then restore the thread's current loop.
+
+    ``asyncio.run`` leaves the main thread without a current loop, which
+    breaks the ``kipp.aio`` tests that run after these.
+    """
+    try:
+        prev = asyncio.get_event_loop_policy().get_event_loop()
+    except RuntimeError:
+        prev = None
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+        asyncio.set_event_loop(prev)
 
 
 class TestRetrySuccessPath(unittest.TestCase):
@@ -811,5 +860,1400 @@ class TestTimeoutCache(unittest.TestCase):
         self.assertEqual(call_count, 2)
 
 
+class TestTimeoutCacheEngine(unittest.TestCase):
+    def test_each_function_has_its_own_cache(self) -> None:
+        cache = timeout_cache(expires_sec=60, max_size=1)
+
+        @cache
+        def double(x: int) -> int:
+            return x * 2
+
+        @cache
+        def triple(x: int) -> int:
+            return x * 3
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(triple(2), 6)
+        self.assertEqual(double(2), 4)
+
+    def test_size_cap_is_never_exceeded(self) -> None:
+        cache = TTLCache(max_size=3, ttl=60)
+        for i in range(100):
+            cache.set(i, i)
+            self.assertLessEqual(len(cache), 3)
+
+        self.assertEqual([cache.get(i) for i in (97, 98, 99)], [97, 98, 99])
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_expired_entries_are_purged_before_lru(self) -> None:
+        now = [0.0]
+        cache = TTLCache(max_size=2, ttl=10, clock=lambda: now[0])
+        cache.set("fresh", 1, ttl=100)
+        cache.set("short", 2)
+        now[0] = 50.0
+        cache.set("new", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn("fresh", cache)
+        self.assertIn("new", cache)
+
+    def test_overwritten_entry_keeps_new_expiry(self) -> None:
+        now = [0.0]
+        cache = TTLCache(max_size=10, ttl=10, clock=lambda: now[0])
+        cache.set("k", 1)
+        now[0] = 8.0
+        cache.set("k", 2)
+        now[0] = 15.0
+        cache.set("other", 3)
+        self.assertEqual(cache.get("k"), 2)
+
+    def test_delete_and_clear(self) -> None:
+        cache = TTLCache(max_size=10)
+        cache.set("k", 1)
+        self.assertTrue(cache.delete("k"))
+        self.assertFalse(cache.delete("k"))
+        cache.set("k", 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def _run_concurrently(self, fn, n: int = 8) -> list:
+        results: list = []
+        errors: list = []
+
+        def worker() -> None:
+            try:
+                results.append(fn())
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results + errors
+
+    def test_timeout_cache_coalesces_concurrent_misses(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60, single_flight=True)
+        def slow(x: int) -> int:
+            nonlocal call_count
+            call_count += 1
+            time_module.sleep(0.1)
+            return x * 2
+
+        results = self._run_concurrently(lambda: slow(21))
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(call_count, 1)
+
+    def test_memo_coalesces_concurrent_misses(self) -> None:
+        call_count = 0
+
+        @memo(single_flight=True)
+        def slow(x: int) -> int:
+            nonlocal call_count
+            call_count += 1
+            time_module.sleep(0.1)
+            return x + 1
+
+        self.assertEqual(self._run_concurrently(lambda: slow(1)), [2] * 8)
+        self.assertEqual(call_count, 1)
+        self.assertEqual(slow.__name__, "slow")
+
+    def test_errors_are_shared_and_not_cached(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60, single_flight=True)
+        def flaky() -> int:
+            nonlocal call_count
+            call_count += 1
+            time_module.sleep(0.1)
+            if call_count == 1:
+                raise ValueError("boom")
+            return 1
+
+        results = self._run_concurrently(flaky, n=4)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(call_count, 1)
+        self.assertEqual(flaky(), 1)
+        self.assertEqual(call_count, 2)
+
+    def test_different_keys_run_in_parallel(self) -> None:
+        flight = SingleFlight()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait(x: int) -> int:
+            barrier.wait()
+            return x
+
+        results = self._run_concurrently(
+            lambda: flight.do(threading.get_ident(), wait, 1), n=2
+        )
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(len(flight), 0)
+
+
+class _InlineExecutor:
+    """Runs submitted refreshes on the calling thread and records them."""
+
+    def __init__(self) -> None:
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kw):
+        self.submitted += 1
+        fn(*args, **kw)
+
+
+class TestTimeoutCacheRevalidate(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = [1000.0]
+        patcher = patch("kipp.decorator.time", side_effect=lambda: self.now[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.executor = _InlineExecutor()
+        self.version = 0
+
+    def _decorate(self, **kw):
+        @timeout_cache(expires_sec=10, executor=self.executor, **kw)
+        def load() -> int:
+            self.version += 1
+            return self.version
+
+        return load
+
+    def test_serves_stale_value_and_refreshes_in_background(self) -> None:
+        load = self._decorate(stale_sec=5)
+        self.assertEqual(load(), 1)
+        self.now[0] = 1012.0
+        self.assertEqual(load(), 1)
+        self.assertEqual(self.executor.submitted, 1)
+        self.assertEqual(load(), 2)
+
+    def test_recomputes_after_stale_window(self) -> None:
+        load = self._decorate(stale_sec=5)
+        load()
+        self.now[0] = 1016.0
+        self.assertEqual(load(), 2)
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_refresh_ahead_before_expiry(self) -> None:
+        load = self._decorate(refresh_ahead=0.3)
+        load()
+        self.now[0] = 1005.0
+        self.assertEqual(load(), 1)
+        self.assertEqual(self.executor.submitted, 0)
+        self.now[0] = 1008.0
+        self.assertEqual(load(), 1)
+        self.assertEqual(self.executor.submitted, 1)
+        self.assertEqual(load(), 2)
+
+    def test_failed_refresh_keeps_stale_value(self) -> None:
+        calls = 0
+
+        @timeout_cache(expires_sec=10, stale_sec=5, executor=self.executor)
+        def load() -> int:
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                raise ValueError("down")
+            return calls
+
+        load()
+        self.now[0] = 1011.0
+        with patch("kipp.decorator.get_logger") as mock_get_logger:
+            self.assertEqual(load(), 1)
+            self.assertEqual(load(), 1)
+        self.assertEqual(mock_get_logger.return_value.exception.call_count, 2)
+
+    def test_only_one_refresh_in_flight_per_key(self) -> None:
+        from kipp.utils import ThreadPoolExecutor
+
+        started = threading.Event()
+        release = threading.Event()
+        calls = 0
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+
+        @timeout_cache(expires_sec=10, stale_sec=5, executor=executor)
+        def load() -> int:
+            nonlocal calls
+            calls += 1
+            if calls > 1:
+                started.set()
+                release.wait(5)
+            return calls
+
+        load()
+        self.now[0] = 1011.0
+        for _ in range(5):
+            self.assertEqual(load(), 1)
+        self.assertTrue(started.wait(5))
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertEqual(calls, 2)
+
+    def test_invalid_options(self) -> None:
+        with self.assertRaises(AssertionError):
+            timeout_cache(stale_sec=-1)
+        with self.assertRaises(AssertionError):
+            timeout_cache(refresh_ahead=1)
+
+
+class TestCacheKeys(unittest.TestCase):
+    def test_no_args_fast_path(self) -> None:
+        self.assertIs(args_key(), args_key())
+
+    def test_hashable_args_used_directly(self) -> None:
+        self.assertEqual(typed_args_key("a"), "a")
+        self.assertEqual(typed_args_key(7), 7)
+        self.assertEqual(args_key(1, "b"), args_key(1, "b"))
+        self.assertNotEqual(args_key(1, 2), args_key(2, 1))
+
+    def test_kwargs_order_does_not_matter(self) -> None:
+        self.assertEqual(args_key(1, a=1, b=2), args_key(1, b=2, a=1))
+        self.assertNotEqual(args_key(1, a=1), args_key(1, a=2))
+        self.assertNotEqual(args_key("a", 1), args_key(a=1))
+
+    def test_unhashable_args_are_frozen(self) -> None:
+        key = args_key([1, 2], {"b": {3, 4}, "a": None})
+        self.assertEqual(key, args_key([1, 2], {"a": None, "b": {4, 3}}))
+        self.assertEqual(hash(key), hash(args_key([1, 2], {"a": None, "b": {4, 3}})))
+        self.assertNotEqual(args_key([1, 2]), args_key((1, 2)))
+
+    def test_typed_keys(self) -> None:
+        self.assertEqual(args_key(1, 2), args_key(1.0, 2))
+        self.assertNotEqual(typed_args_key(1, 2), typed_args_key(1.0, 2))
+        self.assertNotEqual(typed_args_key(1), typed_args_key(1.0))
+        self.assertNotEqual(typed_args_key(x=1), typed_args_key(x=1.0))
+        self.assertEqual(args_key(1), args_key(True))
+        self.assertEqual(args_key(True), args_key(1.0))
+        self.assertNotEqual(typed_args_key(1), typed_args_key(True))
+        self.assertNotEqual(typed_args_key(True), typed_args_key(1.0))
+
+    def test_args_without_hash_fall_back_to_digest(self) -> None:
+        @dataclasses.dataclass
+        class Query:
+            table: str
+            ids: list
+
+        key = args_key(Query("users", [1, 2]))
+        self.assertEqual(key, args_key(Query("users", [1, 2])))
+        self.assertEqual(hash(key), hash(args_key(Query("users", [1, 2]))))
+        self.assertNotEqual(key, args_key(Query("users", [1, 3])))
+        self.assertEqual(len(hashed_args_key(64)(Query("users", [1]))), 16)
+
+    def test_timeout_cache_accepts_objects_without_hash(self) -> None:
+        @dataclasses.dataclass
+        class Query:
+            table: str
+
+        calls = []
+
+        @timeout_cache(expires_sec=60)
+        def load(query: Query) -> str:
+            calls.append(query)
+            return query.table
+
+        self.assertEqual(load(Query("users")), "users")
+        self.assertEqual(load(Query("users")), "users")
+        self.assertEqual(load(Query("orders")), "orders")
+        self.assertEqual(len(calls), 2)
+
+    def test_timeout_cache_keeps_equal_values_of_other_types_apart(self) -> None:
+        @timeout_cache(expires_sec=60)
+        def identity(x: Any) -> Any:
+            return x
+
+        self.assertIs(type(identity(1)), int)
+        self.assertIs(type(identity(True)), bool)
+        self.assertIs(type(identity(1.0)), float)
+
+    def test_hashed_keys(self) -> None:
+        key64, key128 = hashed_args_key(64), hashed_args_key(128)
+        self.assertEqual(len(key64([1, 2], a={"x": 1})), 16)
+        self.assertEqual(len(key128([1, 2], a={"x": 1})), 32)
+        self.assertEqual(key128({"a": 1, "b": 2}), key128({"b": 2, "a": 1}))
+        self.assertNotEqual(key128([1]), key128((1,)))
+        with self.assertRaises(AssertionError):
+            hashed_args_key(32)
+
+    def test_timeout_cache_accepts_unhashable_args(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60)
+        def total(ids: list, opts: dict) -> int:
+            nonlocal call_count
+            call_count += 1
+            return sum(ids)
+
+        self.assertEqual(total([1, 2, 3], {"x": 1}), 6)
+        self.assertEqual(total([1, 2, 3], {"x": 1}), 6)
+        self.assertEqual(call_count, 1)
+
+    def test_timeout_cache_custom_key(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60, key=lambda user, **_: user["id"])
+        def load(user: dict, verbose: bool = False) -> str:
+            nonlocal call_count
+            call_count += 1
+            return user["name"]
+
+        self.assertEqual(load({"id": 1, "name": "a"}), "a")
+        self.assertEqual(load({"id": 1, "name": "b"}, verbose=True), "a")
+        self.assertEqual(call_count, 1)
+
+
+class TestAsyncCache(unittest.TestCase):
+    def test_caches_awaited_result(self) -> None:
+        call_count = 0
+
+        @async_timeout_cache(expires_sec=60)
+        async def lookup(x: int) -> int:
+            nonlocal call_count
+            call_count += 1
+            await asyncio.sleep(0)
+            return x * 2
+
+        async def main() -> list:
+            return [await lookup(2), await lookup(2), await lookup(3)]
+
+        self.assertEqual(_run_coroutine(main()), [4, 4, 6])
+        self.assertEqual(call_count, 2)
+        self.assertEqual(lookup.__name__, "lookup")
+
+    def test_concurrent_awaiters_share_one_call(self) -> None:
+        call_count = 0
+
+        @async_memo
+        async def lookup(x: int, scale: int = 1) -> int:
+            nonlocal call_count
+            call_count += 1
+            await asyncio.sleep(0.05)
+            return x * scale
+
+        async def main() -> list:
+            return await asyncio.gather(*[lookup(1, scale=3) for _ in range(10)])
+
+        self.assertEqual(_run_coroutine(main()), [3] * 10)
+        self.assertEqual(call_count, 1)
+
+    def test_failures_are_not_cached(self) -> None:
+        call_count = 0
+
+        @async_timeout_cache(expires_sec=60)
+        async def flaky() -> int:
+            nonlocal call_count
+            call_count += 1
+            await asyncio.sleep(0.01)
+            if call_count == 1:
+                raise ValueError("boom")
+            return call_count
+
+        async def main() -> int:
+            results = await asyncio.gather(flaky(), flaky(), return_exceptions=True)
+            self.assertTrue(all(isinstance(r, ValueError) for r in results))
+            return await flaky()
+
+        self.assertEqual(_run_coroutine(main()), 2)
+        self.assertEqual(call_count, 2)
+
+    def test_cancelled_awaiter_does_not_cancel_others(self) -> None:
+        @async_memo
+        async def slow() -> str:
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def main() -> str:
+            first = asyncio.ensure_future(slow())
+            second = asyncio.ensure_future(slow())
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(_run_coroutine(main()), "ok")
+
+    def test_tornado_coroutine2(self) -> None:
+        from kipp.aio import coroutine2, return_in_coroutine, sleep
+
+        call_count = 0
+
+        @async_timeout_cache(expires_sec=60)
+        @coroutine2
+        def lookup(x: int):
+            nonlocal call_count
+            call_count += 1
+            yield sleep(0.01)
+            return_in_coroutine(x + 1)
+
+        @coroutine2
+        def main():
+            a = yield lookup(1)
+            b = yield lookup(1)
+            return_in_coroutine([a, b])
+
+        async def run() -> list:
+            return await main()
+
+        self.assertEqual(_run_coroutine(run()), [2, 2])
+        self.assertEqual(call_count, 1)
+
+
+def _fill_shared_cache(path: str) -> None:
+    backend = MmapCacheBackend(path, n_slots=64, slot_size=256)
+    backend.set("from-child", {"pid": os.getpid()}, 60)
+    backend.close()
+
+
+class TestMmapCacheBackend(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cache")
+        self.backend = MmapCacheBackend(self.path, n_slots=64, slot_size=256)
+        self.addCleanup(self.backend.close)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_set_get_delete(self) -> None:
+        miss = object()
+        self.backend.set("a", [1, 2], 60)
+        self.assertEqual(self.backend.get("a"), [1, 2])
+        self.assertIs(self.backend.get("b", miss), miss)
+        self.assertEqual(len(self.backend), 1)
+        self.assertTrue(self.backend.delete("a"))
+        self.assertFalse(self.backend.delete("a"))
+        self.assertIsNone(self.backend.get("a"))
+
+    def test_expiry_and_oversized_values(self) -> None:
+        self.backend.set("gone", 1, -1)
+        self.assertIsNone(self.backend.get("gone"))
+        self.backend.set("big", "x" * 1000, 60)
+        self.assertIsNone(self.backend.get("big"))
+
+    def test_colliding_keys_do_not_mix(self) -> None:
+        for i in range(200):
+            self.backend.set(str(i), i, 60)
+        for i in range(200):
+            self.assertIn(self.backend.get(str(i)), (i, None))
+        self.assertLessEqual(len(self.backend), 64)
+        self.backend.clear()
+        self.assertEqual(len(self.backend), 0)
+
+    def test_shared_between_processes(self) -> None:
+        proc = multiprocessing.get_context("fork").Process(
+            target=_fill_shared_cache, args=(self.path,)
+        )
+        proc.start()
+        proc.join(10)
+        self.assertEqual(self.backend.get("from-child"), {"pid": proc.pid})
+
+    def test_rejects_mismatched_file(self) -> None:
+        with self.assertRaises(ValueError):
+            MmapCacheBackend(self.path, n_slots=32, slot_size=256)
+
+    def test_timeout_cache_with_backend(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60, backend=self.backend)
+        def square(x: int) -> int:
+            nonlocal call_count
+            call_count += 1
+            return x * x
+
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square.starmap([(3,), (4,), (4,)]), [9, 16, 16])
+        self.assertEqual(call_count, 2)
+        self.assertEqual(len(self.backend), 2)
+
+    def test_backend_rejects_revalidate(self) -> None:
+        with self.assertRaises(AssertionError):
+            timeout_cache(stale_sec=1, backend=self.backend)
+
+
+class TestRedisCacheBackend(unittest.TestCase):
+    def setUp(self) -> None:
+        from kipp.redis.utils import RedisUtils
+
+        self.client = MagicMock()
+        self.pipe = self.client.pipeline.return_value.__enter__.return_value
+        self.backend = RedisCacheBackend(RedisUtils(client=self.client))
+
+    def test_get_deserializes(self) -> None:
+        self.client.get.return_value = pickle.dumps({"a": 1})
+        self.assertEqual(self.backend.get("k"), {"a": 1})
+        self.client.get.assert_called_once_with("kipp:cache:k")
+        self.client.get.return_value = None
+        self.assertEqual(self.backend.get("k", "miss"), "miss")
+
+    def test_get_many_uses_one_mget(self) -> None:
+        self.client.mget.return_value = [pickle.dumps(1), None]
+        self.assertEqual(self.backend.get_many(["a", "b"]), {"a": 1})
+        self.client.mget.assert_called_once_with(["kipp:cache:a", "kipp:cache:b"])
+
+    def test_set_uses_millisecond_ttl(self) -> None:
+        self.backend.set("k", "v", 1.5)
+        self.pipe.set.assert_called_once_with(
+            "kipp:cache:k", pickle.dumps("v", protocol=pickle.HIGHEST_PROTOCOL), px=1500
+        )
+        self.pipe.execute.assert_called_once_with()
+
+    def test_redis_errors_are_misses(self) -> None:
+        import redis
+
+        self.client.get.side_effect = redis.ConnectionError("down")
+        self.assertEqual(self.backend.get("k", "miss"), "miss")
+
+    def test_corrupt_values_are_misses(self) -> None:
+        self.client.get.return_value = b"not a pickle"
+        self.assertEqual(self.backend.get("k", "miss"), "miss")
+        self.client.mget.return_value = [b"not a pickle", pickle.dumps(2)]
+        self.assertEqual(self.backend.get_many(["a", "b"]), {"b": 2})
+
+    def test_starmap_stores_misses_in_one_pipeline(self) -> None:
+        self.client.mget.return_value = [pickle.dumps(1), None, None]
+
+        @timeout_cache(expires_sec=10, backend=self.backend)
+        def load(uid: int) -> int:
+            return uid * 10
+
+        self.assertEqual(load.starmap([(1,), (2,), (3,), (2,)]), [1, 20, 30, 20])
+        self.client.pipeline.assert_called_once_with(transaction=False)
+        self.assertEqual(self.pipe.set.call_count, 2)
+        self.pipe.execute.assert_called_once_with()
+
+    def test_invalidate_survives_redis_errors(self) -> None:
+        import redis
+
+        self.client.delete.side_effect = redis.ConnectionError("down")
+        self.client.scan_iter.side_effect = redis.ConnectionError("down")
+        self.assertFalse(self.backend.delete("k"))
+        self.backend.clear()
+
+        @timeout_cache(expires_sec=10, backend=self.backend)
+        def load(uid: int) -> int:
+            return uid
+
+        load.invalidate(1)
+
+    def test_clear_deletes_prefixed_keys(self) -> None:
+        self.client.scan_iter.return_value = [b"kipp:cache:a", b"kipp:cache:b"]
+        self.backend.clear()
+        self.client.scan_iter.assert_called_once_with(match="kipp:cache:*", count=10)
+        self.client.delete.assert_called_once_with(b"kipp:cache:a", b"kipp:cache:b")
+
+    def test_timeout_cache_namespaces_keys(self) -> None:
+        self.client.get.return_value = None
+
+        @timeout_cache(expires_sec=60, backend=self.backend)
+        def load(x: int) -> int:
+            return x
+
+        self.assertEqual(load(1), 1)
+        key = self.pipe.set.call_args[0][0]
+        self.assertTrue(key.startswith("kipp:cache:" + __name__))
+        self.assertIn("load:", key)
+
+
+class TestCacheInfo(unittest.TestCase):
+    def test_timeout_cache_counters(self) -> None:
+        now = [1000.0]
+        with patch("kipp.decorator.time", side_effect=lambda: now[0]):
+
+            @timeout_cache(expires_sec=10, max_size=2)
+            def compute(x: int) -> int:
+                now[0] += 1
+                return x
+
+            compute(1)
+            compute(1)
+            compute(2)
+            compute(3)  # evicts 1
+            now[0] += 20
+            compute(2)  # expired
+            info = compute.cache_info()
+
+        self.assertEqual((info.hits, info.misses), (1, 4))
+        self.assertEqual(info.evictions, 1)
+        self.assertGreaterEqual(info.expirations, 1)
+        self.assertEqual(info.max_size, 2)
+        self.assertLessEqual(info.size, 2)
+        self.assertGreater(info.nbytes, 0)
+        self.assertAlmostEqual(info.time_saved, 1.0)
+
+    def test_timeout_cache_clear_and_invalidate(self) -> None:
+        call_count = 0
+
+        @timeout_cache(expires_sec=60)
+        def compute(x: int, scale: int = 1) -> int:
+            nonlocal call_count
+            call_count += 1
+            return x * scale
+
+        compute(1, scale=2)
+        compute(2)
+        self.assertTrue(compute.invalidate(1, scale=2))
+        self.assertFalse(compute.invalidate(1, scale=2))
+        compute(1, scale=2)
+        compute(2)
+        self.assertEqual(call_count, 3)
+
+        compute.cache_clear()
+        self.assertEqual(compute.cache_info().size, 0)
+        self.assertEqual(compute.cache_info().hits, 0)
+        compute(2)
+        self.assertEqual(call_count, 4)
+
+    def test_memo_counters(self) -> None:
+        @memo
+        def ident(x: int) -> int:
+            return x
+
+        ident(1)
+        ident(1)
+        ident(2)
+        info = ident.cache_info()
+        self.assertEqual((info.hits, info.misses, info.size), (1, 2, 2))
+        self.assertIsNone(info.evictions)
+        self.assertTrue(ident.invalidate(1))
+        self.assertEqual(ident.cache_info().size, 1)
+        ident.cache_clear()
+        self.assertEqual(ident.cache_info().size, 0)
+
+    @patch("kipp.decorator.get_logger")
+    def test_periodic_stats_dump(self, mock_get_logger: MagicMock) -> None:
+        now = [1000.0]
+        with patch("kipp.decorator.time", side_effect=lambda: now[0]):
+
+            @timeout_cache(expires_sec=60, log_stats_sec=30)
+            def compute(x: int) -> int:
+                return x
+
+            compute(1)
+            now[0] += 10
+            compute(1)
+            mock_get_logger.return_value.info.assert_not_called()
+            now[0] += 25
+            compute(1)
+            compute(1)
+
+        self.assertEqual(mock_get_logger.return_value.info.call_count, 1)
+        args = mock_get_logger.return_value.info.call_args[0]
+        self.assertIn("compute", args[1])
+        self.assertEqual(args[2].hits, 2)
+
+
+class TestBoundedMemo(unittest.TestCase):
+    def test_kwargs_are_part_of_the_key(self) -> None:
+        call_count = 0
+
+        @memo
+        def scale(x: int, factor: int = 1) -> int:
+            nonlocal call_count
+            call_count += 1
+            return x * factor
+
+        self.assertEqual(scale(2, factor=3), 6)
+        self.assertEqual(scale(2, factor=4), 8)
+        self.assertEqual(scale(2, factor=3), 6)
+        self.assertEqual(call_count, 2)
+
+    def test_max_size_lru(self) -> None:
+        @memo(max_size=2)
+        def ident(x: int) -> int:
+            return x
+
+        ident(1)
+        ident(2)
+        ident(1)
+        ident(3)  # evicts 2
+        info = ident.cache_info()
+        self.assertEqual((info.size, info.evictions, info.max_size), (2, 1, 2))
+        ident(1)
+        self.assertEqual(ident.cache_info().hits, 2)
+
+    def test_lfu_keeps_frequent_entries(self) -> None:
+        cache = BoundedCache(max_size=2, policy="lfu")
+        cache.set("hot", 1)
+        cache.set("cold", 2)
+        for _ in range(3):
+            cache.get("hot")
+        cache.get("cold")
+        cache.set("new", 3)  # cold has the lowest frequency
+        self.assertEqual(cache.get("hot"), 1)
+        self.assertIsNone(cache.get("cold"))
+        cache.set("newer", 4)  # new and newer tie, oldest goes
+        self.assertIsNone(cache.get("new"))
+        self.assertEqual(cache.get("newer"), 4)
+
+    def test_max_bytes(self) -> None:
+        cache = BoundedCache(max_bytes=100, sizeof=lambda k, v: len(v))
+        cache.set("a", "x" * 60)
+        cache.set("b", "x" * 30)
+        self.assertEqual(cache.nbytes(), 90)
+        cache.set("c", "x" * 30)  # evicts a
+        self.assertEqual((len(cache), cache.nbytes(), cache.evictions), (2, 60, 1))
+        cache.set("huge", "x" * 200)  # never fits
+        self.assertIsNone(cache.get("huge"))
+        self.assertEqual(len(cache), 2)
+
+    def test_weak_values_do_not_outlive_callers(self) -> None:
+        class Result:
+            pass
+
+        @memo(weak=True)
+        def build(x: int) -> Result:
+            return Result()
+
+        first = build(1)
+        self.assertIs(build(1), first)
+        del first
+        gc.collect()
+        build(1)
+        self.assertEqual(build.cache_info().misses, 2)
+
+    def test_weak_mode_holds_plain_values(self) -> None:
+        cache = BoundedCache(weak=True)
+        cache.set("n", 1)
+        self.assertEqual(cache.get("n"), 1)
+
+    def test_invalid_options(self) -> None:
+        with self.assertRaises(AssertionError):
+            memo(max_size=0)(lambda: None)
+        with self.assertRaises(AssertionError):
+            BoundedCache(policy="fifo")
+
+
+def _spin_forever() -> None:
+    while True:
+        pass
+
+
+def _busy_loop(seconds: float) -> None:
+    end = time_module.monotonic() + seconds
+    while time_module.monotonic() < end:
+        pass
+
+
+class TestThreadTimeout(unittest.TestCase):
+    def _in_worker(self, fn):
+        from kipp.utils import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(fn).result(timeout=10)
+
+    def test_interrupts_busy_function_in_worker_thread(self) -> None:
+        @thread_timeout(0.1, interrupt=True)
+        def spin() -> None:
+            _spin_forever()
+
+        start = time_module.monotonic()
+        with self.assertRaises(TimeoutError):
+            self._in_worker(spin)
+        self.assertLess(time_module.monotonic() - start, 2)
+
+    def test_returns_result_and_leaves_no_timer(self) -> None:
+        @thread_timeout(5)
+        def quick(x: int) -> int:
+            return x + 1
+
+        self.assertEqual(self._in_worker(lambda: quick(1)), 2)
+        self.assertIsNone(current_deadline())
+
+    def test_exception_propagates(self) -> None:
+        @thread_timeout(5)
+        def fail() -> None:
+            raise ValueError("inner")
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertIsNone(current_deadline())
+
+    def test_cooperative_cancellation(self) -> None:
+        polls = 0
+
+        @thread_timeout(0.05)
+        def crunch() -> None:
+            nonlocal polls
+            while True:
+                polls += 1
+                check_timeout()
+                time_module.sleep(0.01)
+
+        with self.assertRaises(TimeoutError):
+            crunch()
+        self.assertGreater(polls, 1)
+
+    def test_nested_deadlines_use_the_earliest(self) -> None:
+        @thread_timeout(10)
+        def inner() -> float:
+            return current_deadline().remaining()
+
+        @thread_timeout(0.5)
+        def outer() -> float:
+            return inner()
+
+        self.assertLessEqual(outer(), 0.5)
+
+    def test_check_timeout_outside_deadline_is_noop(self) -> None:
+        check_timeout()
+
+    def test_default_does_not_interrupt(self) -> None:
+        @thread_timeout(0.05)
+        def ignores_deadline() -> str:
+            time_module.sleep(0.1)
+            _busy_loop(0.05)
+            return "done"
+
+        self.assertEqual(self._in_worker(ignores_deadline), "done")
+
+    def test_legacy_timeout_off_main_thread_raises(self) -> None:
+        @timeout(1)
+        def quick() -> str:
+            return "done"
+
+        with self.assertRaises(ValueError):
+            self._in_worker(quick)
+
+    def test_legacy_timeout_zero_sets_no_alarm(self) -> None:
+        @timeout(0, thread_fallback=True)
+        def quick() -> str:
+            return "done"
+
+        self.assertEqual(quick(), "done")
+        self.assertEqual(self._in_worker(quick), "done")
+
+    def test_legacy_timeout_thread_fallback_is_cooperative(self) -> None:
+        @timeout(1, thread_fallback=True)
+        def crunch() -> None:
+            while True:
+                check_timeout()
+                time_module.sleep(0.01)
+
+        @timeout(1, thread_fallback=True)
+        def ignores_deadline() -> str:
+            _busy_loop(1.2)
+            return "done"
+
+        with self.assertRaises(TimeoutError):
+            self._in_worker(crunch)
+        self.assertEqual(self._in_worker(ignores_deadline), "done")
+
+    def test_thousands_of_deadlines_share_one_thread(self) -> None:
+        timer = get_timer()
+        fired = []
+        done = threading.Event()
+        n = 5000
+
+        def callback(i: int) -> None:
+            fired.append(i)
+            if len(fired) == n:
+                done.set()
+
+        handles = [
+            timer.schedule(0.05 + (i % 50) / 1000, callback, i) for i in range(n)
+        ]
+        cancelled = [timer.schedule(60, callback, -1) for _ in range(n)]
+        for h in cancelled:
+            h.cancel()
+        self.assertTrue(done.wait(10))
+        self.assertEqual(sorted(fired), list(range(n)))
+        self.assertTrue(all(h.cancelled for h in handles))
+        names = [t.name for t in threading.enumerate()]
+        self.assertEqual(names.count("kipp-timer"), 1)
+
+    def test_legacy_timeout_cancels_alarm_on_exception(self) -> None:
+        @timeout(5)
+        def fail() -> None:
+            raise ValueError("inner")
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(signal.alarm(0), 0)
+
+
+def _square_slowly(x: int, delay: float) -> int:
+    time_module.sleep(delay)
+    return x * x
+
+
+@process_timeout(5)
+def _fail_in_child() -> None:
+    raise KeyError("child")
+
+
+@timer(histogram=True)
+@process_timeout(5)
+def _cube_in_child(x: int) -> int:
+    return x**3
+
+
+class TestProcessTimeout(unittest.TestCase):
+    def test_returns_result(self) -> None:
+        fn = process_timeout(5)(_square_slowly)
+        self.assertEqual(fn(3, 0), 9)
+
+    def test_kills_stuck_child(self) -> None:
+        fn = process_timeout(0.2)(_square_slowly)
+        start = time_module.monotonic()
+        with self.assertRaises(TimeoutError):
+            fn(3, 30)
+        self.assertLess(time_module.monotonic() - start, 5)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_exception_is_reraised(self) -> None:
+        with self.assertRaises(KeyError):
+            _fail_in_child()
+
+    def test_fork_context_runs_closures(self) -> None:
+        @process_timeout(5, mp_context=multiprocessing.get_context("fork"))
+        def fail() -> None:
+            raise KeyError("child")
+
+        with self.assertRaises(KeyError):
+            fail()
+
+    def test_decorated_function_is_found_in_child(self) -> None:
+        self.assertEqual(_cube_in_child(3), 27)
+
+
+class TestAsyncTimeout(unittest.TestCase):
+    def test_times_out(self) -> None:
+        @async_timeout(0.05)
+        async def slow() -> None:
+            await asyncio.sleep(10)
+
+        with self.assertRaises(TimeoutError):
+            _run_coroutine(slow())
+
+    def test_returns_result(self) -> None:
+        @async_timeout(1)
+        async def fast(x: int) -> int:
+            return x
+
+        self.assertEqual(_run_coroutine(fast(7)), 7)
+
+
+class TestRetryJitterAndDeadline(unittest.TestCase):
+    @patch("kipp.decorator._time_module.sleep")
+    def test_max_delay_caps_backoff(self, mock_sleep: MagicMock) -> None:
+        @retry(RuntimeError, tries=5, delay=1, backoff=10, max_delay=5)
+        def always_fail() -> None:
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            always_fail()
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [1, 5, 5, 5])
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_full_jitter_stays_below_backoff(self, mock_sleep: MagicMock) -> None:
+        @retry(RuntimeError, tries=6, delay=1, backoff=2, jitter="full")
+        def always_fail() -> None:
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            always_fail()
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        for delay, cap in zip(delays, [1, 2, 4, 8, 16]):
+            self.assertTrue(0 <= delay <= cap)
+        self.assertNotEqual(delays, [1, 2, 4, 8, 16])
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_decorrelated_jitter_bounds(self, mock_sleep: MagicMock) -> None:
+        @retry(
+            RuntimeError, tries=20, delay=0.1, max_delay=3, jitter="decorrelated"
+        )
+        def always_fail() -> None:
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            always_fail()
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 19)
+        self.assertTrue(all(0.1 <= d <= 3 for d in delays))
+
+    @patch("kipp.decorator.retries.monotonic")
+    @patch("kipp.decorator._time_module.sleep")
+    def test_deadline_stops_retrying(
+        self, mock_sleep: MagicMock, mock_monotonic: MagicMock
+    ) -> None:
+        now = [0.0]
+        mock_monotonic.side_effect = lambda: now[0]
+        mock_sleep.side_effect = lambda d: now.__setitem__(0, now[0] + d)
+        calls = 0
+
+        @retry(RuntimeError, tries=10, delay=1, backoff=2, deadline=5)
+        def always_fail() -> None:
+            nonlocal calls
+            calls += 1
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            always_fail()
+        # sleeps 1 and 2 fit in the budget, the next 4 would end at t=7
+        self.assertEqual(calls, 3)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_retry_on_result(self, mock_sleep: MagicMock) -> None:
+        results = iter([None, None, "ready"])
+
+        @retry(RuntimeError, tries=5, delay=0, retry_on_result=lambda r: r is None)
+        def poll() -> str | None:
+            return next(results)
+
+        self.assertEqual(poll(), "ready")
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_retry_on_result_returns_last_result(self, mock_sleep: MagicMock) -> None:
+        @retry(RuntimeError, tries=3, delay=0, retry_on_result=lambda r: r is None)
+        def poll() -> None:
+            return None
+
+        self.assertIsNone(poll())
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_hooks_report_attempts(self, mock_sleep: MagicMock) -> None:
+        retries: list[RetryState] = []
+        giveups: list[RetryState] = []
+
+        @retry(
+            ValueError,
+            tries=3,
+            delay=0.5,
+            on_retry=retries.append,
+            on_giveup=giveups.append,
+        )
+        def always_fail() -> None:
+            raise ValueError("x")
+
+        with self.assertRaises(ValueError):
+            always_fail()
+        self.assertEqual([s.attempt for s in retries], [1, 2])
+        self.assertEqual([s.delay for s in retries], [0.5, 0.5])
+        self.assertIsInstance(retries[0].exception, ValueError)
+        self.assertGreaterEqual(retries[1].elapsed, 0)
+        self.assertEqual(len(giveups), 1)
+        self.assertEqual(giveups[0].attempt, 3)
+        self.assertIsNone(giveups[0].delay)
+        self.assertEqual(retries[0].func.__name__, "always_fail")
+
+    def test_async_retry_yields_to_event_loop(self) -> None:
+        calls = 0
+        ticks = 0
+
+        @retry(ValueError, tries=3, delay=0.02)
+        async def flaky() -> str:
+            nonlocal calls
+            calls += 1
+            if calls < 3:
+                raise ValueError()
+            return "ok"
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        async def main() -> str:
+            task = asyncio.ensure_future(ticker())
+            try:
+                return await flaky()
+            finally:
+                task.cancel()
+
+        self.assertEqual(_run_coroutine(main()), "ok")
+        self.assertEqual(calls, 3)
+        self.assertGreater(ticks, 2)
+
+    def test_invalid_options(self) -> None:
+        with self.assertRaises(AssertionError):
+            retry(ValueError, jitter="random")
+        with self.assertRaises(AssertionError):
+            retry(ValueError, deadline=0)
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def _breaker(self, **kw: Any) -> tuple[CircuitBreaker, _FakeClock]:
+        clock = _FakeClock()
+        kw.setdefault("min_calls", 4)
+        kw.setdefault("recovery_sec", 10)
+        return CircuitBreaker("test", clock=clock, **kw), clock
+
+    @staticmethod
+    def _fail() -> None:
+        raise IOError("down")
+
+    def test_opens_at_failure_rate(self) -> None:
+        breaker, _ = self._breaker(failure_threshold=0.5)
+        breaker.call(lambda: 1)
+        breaker.call(lambda: 1)
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.counts(), (2, 2))
+
+    def test_needs_min_calls(self) -> None:
+        breaker, _ = self._breaker()
+        for _ in range(3):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_open_rejects_without_calling(self) -> None:
+        breaker, clock = self._breaker()
+        for _ in range(4):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+
+        fn = MagicMock()
+        clock.now = 3
+        with self.assertRaises(CircuitOpenError) as ctx:
+            breaker.call(fn)
+        fn.assert_not_called()
+        self.assertAlmostEqual(ctx.exception.retry_after, 7)
+
+    def test_half_open_probe_closes(self) -> None:
+        changes = []
+        breaker, clock = self._breaker(
+            on_state_change=lambda b, old, new: changes.append((old, new))
+        )
+        for _ in range(4):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+
+        clock.now = 10
+        self.assertEqual(breaker.state, "half_open")
+        breaker.acquire()
+        # only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.acquire()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.counts(), (0, 0))
+        self.assertEqual(
+            changes,
+            [("closed", "open"), ("open", "half_open"), ("half_open", "closed")],
+        )
+
+    def test_half_open_probe_failure_reopens(self) -> None:
+        breaker, clock = self._breaker()
+        for _ in range(4):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+
+        clock.now = 10
+        with self.assertRaises(IOError):
+            breaker.call(self._fail)
+        self.assertEqual(breaker.state, "open")
+        clock.now = 15
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 1)
+
+    def test_window_forgets_old_failures(self) -> None:
+        breaker, clock = self._breaker(window_sec=10, n_buckets=10)
+        for _ in range(3):
+            with self.assertRaises(IOError):
+                breaker.call(self._fail)
+        clock.now = 11
+        with self.assertRaises(IOError):
+            breaker.call(self._fail)
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.counts(), (0, 1))
+
+    def test_unlisted_exceptions_do_not_count(self) -> None:
+        breaker, _ = self._breaker(exceptions=IOError)
+
+        def bad() -> None:
+            raise KeyError()
+
+        for _ in range(5):
+            with self.assertRaises(KeyError):
+                breaker.call(bad)
+        self.assertEqual(breaker.counts(), (0, 0))
+        self.assertEqual(breaker.state, "closed")
+
+    def test_shared_between_threads(self) -> None:
+        breaker = CircuitBreaker(min_calls=1000, failure_threshold=1)
+
+        @breaker
+        def work(i: int) -> int:
+            if i % 2:
+                raise IOError()
+            return i
+
+        def run() -> None:
+            for i in range(100):
+                try:
+                    work(i)
+                except IOError:
+                    pass
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(breaker.counts(), (400, 400))
+
+    def test_async_decorator(self) -> None:
+        breaker, _ = self._breaker(min_calls=1)
+
+        @breaker
+        async def fetch() -> None:
+            raise IOError()
+
+        async def main() -> None:
+            with self.assertRaises(IOError):
+                await fetch()
+            with self.assertRaises(CircuitOpenError):
+                await fetch()
+
+        _run_coroutine(main())
+
+
+class TestRetryBreakerAndBudget(unittest.TestCase):
+    def test_budget_refills_over_time(self) -> None:
+        clock = _FakeClock()
+        budget = RetryBudget(rate=1, burst=2, clock=clock)
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+        clock.now = 1.5
+        self.assertTrue(budget.try_acquire())
+        self.assertAlmostEqual(budget.tokens, 0.5)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_empty_budget_gives_up(self, mock_sleep: MagicMock) -> None:
+        budget = RetryBudget(rate=0, burst=3)
+        calls = 0
+
+        @retry(IOError, tries=5, delay=0, budget=budget)
+        def always_fail() -> None:
+            nonlocal calls
+            calls += 1
+            raise IOError()
+
+        with self.assertRaises(IOError):
+            always_fail()
+        self.assertEqual(calls, 4)
+        with self.assertRaises(IOError):
+            always_fail()
+        self.assertEqual(calls, 5)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_ratio_deposits_per_call(self, mock_sleep: MagicMock) -> None:
+        budget = RetryBudget(rate=0, burst=1, ratio=0.5)
+        budget.try_acquire()
+
+        @retry(IOError, tries=2, delay=0, budget=budget)
+        def ok() -> int:
+            return 1
+
+        ok()
+        ok()
+        self.assertAlmostEqual(budget.tokens, 1)
+
+    @patch("kipp.decorator._time_module.sleep")
+    def test_open_circuit_stops_retrying(self, mock_sleep: MagicMock) -> None:
+        breaker = CircuitBreaker(min_calls=2, recovery_sec=60)
+        calls = 0
+
+        @retry(IOError, tries=10, delay=0, breaker=breaker)
+        def always_fail() -> None:
+            nonlocal calls
+            calls += 1
+            raise IOError()
+
+        with self.assertRaises(CircuitOpenError):
+            always_fail()
+        self.assertEqual(calls, 2)
+        with self.assertRaises(CircuitOpenError):
+            always_fail()
+        self.assertEqual(calls, 2)
+
+    def test_async_retry_with_breaker(self) -> None:
+        breaker = CircuitBreaker(min_calls=100)
+        attempts = 0
+
+        @retry(IOError, tries=3, delay=0, breaker=breaker)
+        async def flaky() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise IOError()
+            return "ok"
+
+        self.assertEqual(_run_coroutine(flaky()), "ok")
+        self.assertEqual(breaker.counts(), (1, 2))
+
+
+class TestTimerHistogram(unittest.TestCase):
+    @patch("kipp.decorator.get_logger")
+    def test_records_instead_of_logging(self, mock_get_logger: MagicMock) -> None:
+        @timer(histogram=True)
+        def add(a: int, b: int) -> int:
+            return a + b
+
+        for i in range(10):
+            self.assertEqual(add(i, 1), i + 1)
+        mock_get_logger.assert_not_called()
+        info = add.timing_info()
+        self.assertEqual(info.calls, 10)
+        self.assertTrue(0 <= info.p50 <= info.p99 <= info.max)
+        self.assertEqual(add.__name__, "add")
+
+    def test_async_function(self) -> None:
+        @timer(histogram=True)
+        async def fetch() -> str:
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        self.assertEqual(_run_coroutine(fetch()), "ok")
+        self.assertGreaterEqual(fetch.timing_info().p50, 0.009)
+
+    def test_export_and_periodic_log(self) -> None:
+        exported = []
+
+        @timer(histogram=True, log_stats_sec=60)
+        def work() -> None:
+            pass
+
+        with patch("kipp.utils.metrics.get_logger") as mock_get_logger:
+            work()
+            work()
+            mock_get_logger.return_value.info.assert_not_called()
+            with patch("kipp.utils.metrics.monotonic", return_value=1e9):
+                work()
+            mock_get_logger.return_value.info.assert_called_once()
+
+        timings = get_timing_registry().export(exported.append)
+        self.assertEqual(exported, [timings])
+        self.assertEqual(timings[work.histogram.name].calls, 3)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,9 +3,22 @@
 
 from __future__ import annotations
 
+import io
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import threading
 from unittest import TestCase
 
-from kipp.utils.dfa_filters import DFAFilter
+from kipp.utils.dfa_filters import (
+    AhoCorasickAutomaton,
+    CompactAutomaton,
+    DFAFilter,
+    KeywordMatch,
+    LayeredAutomaton,
+)
 
 
 class DFAFilterBuildChainsTestCase(TestCase):
@@ -324,3 +337,653 @@ class DFAFilterFilterKeywordTestCase(TestCase):
         f.build_chains({"missing"})
         result = f.filter_keyword("nothing here")
         self.assertEqual(result, set())
+
+
+class DFAFilterAhoCorasickTestCase(TestCase):
+    """Tests for DFAFilter in Aho-Corasick mode."""
+
+    def _brute_force(self, keywords, text):
+        return {kw for kw in keywords if kw and kw in text}
+
+    def test_load_keywords_without_build_chains_asserts(self):
+        f = DFAFilter(aho_corasick=True)
+        with self.assertRaises(AssertionError):
+            f.load_keywords("some text")
+
+    def test_empty_keywords_match_nothing(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains(set())
+        self.assertEqual(f.load_keywords("some text"), set())
+
+    def test_returns_set(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"cat", "dog"})
+        result = f.load_keywords("I have a cat and a dog")
+        self.assertIsInstance(result, set)
+        self.assertEqual(result, {"cat", "dog"})
+
+    def test_prefix_keyword_is_not_shadowed(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"ab", "abc"})
+        self.assertEqual(f.load_keywords("abcdef"), {"ab", "abc"})
+        self.assertEqual(f.load_keywords("abx"), {"ab"})
+
+    def test_suffix_and_nested_keywords(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"he", "she", "his", "hers"})
+        self.assertEqual(f.load_keywords("ushers"), {"he", "she", "hers"})
+
+    def test_failure_link_recovers_after_mismatch(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"abcd", "bce"})
+        self.assertEqual(f.load_keywords("abce"), {"bce"})
+
+    def test_unicode_keywords(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"你好", "世界", "hello"})
+        self.assertEqual(f.load_keywords("say hello 你好世界"), {"hello", "你好", "世界"})
+
+    def test_long_keyword_does_not_recurse(self):
+        f = DFAFilter(aho_corasick=True)
+        keyword = "a" * 5000
+        f.build_chains({keyword})
+        self.assertEqual(f.load_keywords("b" + keyword + "b"), {keyword})
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(42)
+        keywords = {
+            "".join(rnd.choice("abc") for _ in range(rnd.randint(1, 5)))
+            for _ in range(50)
+        }
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains(keywords)
+        for _ in range(50):
+            text = "".join(rnd.choice("abcd") for _ in range(rnd.randint(0, 40)))
+            self.assertEqual(f.load_keywords(text), self._brute_force(keywords, text))
+
+    def test_scan_reports_end_indexes_and_state(self):
+        automaton = AhoCorasickAutomaton({"he", "she", "hers"})
+        matches, state = automaton.scan("ushers")
+        self.assertEqual(matches, [(3, "she"), (3, "he"), (5, "hers")])
+        self.assertEqual(len(automaton), 3)
+
+        # resuming from the returned state continues across calls
+        matches, state = automaton.scan("us", 0)
+        matches, _ = automaton.scan("hers", state)
+        self.assertEqual(matches, [(1, "she"), (1, "he"), (3, "hers")])
+
+
+class DFAFilterCompactTestCase(TestCase):
+    """Tests for the array-backed automaton behind DFAFilter(compact=True)."""
+
+    def test_compact_implies_aho_corasick(self):
+        f = DFAFilter(compact=True)
+        self.assertTrue(f.aho_corasick)
+        f.build_chains({"ab", "abc"})
+        self.assertIsInstance(f._automaton, CompactAutomaton)
+        self.assertEqual(f.load_keywords("abcdef"), {"ab", "abc"})
+
+    def test_empty_keywords_match_nothing(self):
+        f = DFAFilter(compact=True)
+        f.build_chains(set())
+        self.assertEqual(f.load_keywords("some text"), set())
+
+    def test_scan_matches_dict_automaton(self):
+        rnd = random.Random(7)
+        keywords = {
+            "".join(rnd.choice("abc你") for _ in range(rnd.randint(1, 6)))
+            for _ in range(80)
+        }
+        automaton = AhoCorasickAutomaton(keywords)
+        compact = automaton.compile()
+        self.assertEqual(len(compact), len(automaton))
+        for _ in range(50):
+            text = "".join(rnd.choice("abcd你") for _ in range(rnd.randint(0, 60)))
+            self.assertEqual(
+                sorted(compact.scan(text)[0]), sorted(automaton.scan(text)[0])
+            )
+
+    def test_resume_state(self):
+        compact = CompactAutomaton.from_keywords({"he", "she", "hers"})
+        _, state = compact.scan("us")
+        matches, _ = compact.scan("hers", state)
+        self.assertEqual(matches, [(1, "she"), (1, "he"), (3, "hers")])
+
+    def test_keyword_lookup(self):
+        compact = CompactAutomaton.from_keywords({"foo", "bar"})
+        self.assertEqual({compact.keyword(i) for i in range(len(compact))}, {"foo", "bar"})
+
+    def test_nbytes_is_small(self):
+        keywords = {"kw_{:05d}".format(i) for i in range(2000)}
+        compact = CompactAutomaton.from_keywords(keywords)
+        # 16 bytes per node + 8 per edge + keyword storage, well under 100 B/char
+        self.assertLess(compact.nbytes, 40 * sum(len(kw) for kw in keywords))
+
+
+class DFAFilterSaveLoadTestCase(TestCase):
+    """Tests for persisting compiled automata to disk."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "lexicon.dfa")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip_mmap(self):
+        f = DFAFilter(compact=True)
+        f.build_chains({"he", "she", "hers", "你好"})
+        f.save(self.path)
+
+        loaded = DFAFilter.load(self.path)
+        self.assertTrue(loaded.compact)
+        self.assertIsNotNone(loaded._automaton._mmap)
+        self.assertEqual(loaded.load_keywords("ushers 你好"), {"he", "she", "hers", "你好"})
+
+    def test_round_trip_without_mmap(self):
+        f = DFAFilter(compact=True)
+        f.build_chains({"foo", "bar"})
+        f.save(self.path)
+
+        loaded = DFAFilter.load(self.path, use_mmap=False)
+        self.assertIsNone(loaded._automaton._mmap)
+        self.assertEqual(loaded.load_keywords("foo bar baz"), {"foo", "bar"})
+
+    def test_dict_automaton_is_compiled_on_save(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"ab", "abc"})
+        f.save(self.path)
+        self.assertEqual(DFAFilter.load(self.path).load_keywords("abc"), {"ab", "abc"})
+
+    def test_resave_loaded_automaton(self):
+        f = DFAFilter(compact=True)
+        f.build_chains({"foo", "bar"})
+        f.save(self.path)
+        other = os.path.join(self.tmpdir, "copy.dfa")
+        DFAFilter.load(self.path).save(other)
+        with open(self.path, "rb") as a, open(other, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_loaded_matches_built(self):
+        rnd = random.Random(3)
+        keywords = {
+            "".join(rnd.choice("abcz") for _ in range(rnd.randint(1, 6)))
+            for _ in range(100)
+        }
+        compact = CompactAutomaton.from_keywords(keywords)
+        compact.save(self.path)
+        loaded = CompactAutomaton.load(self.path)
+        for _ in range(30):
+            text = "".join(rnd.choice("abcdz") for _ in range(rnd.randint(0, 50)))
+            self.assertEqual(loaded.scan(text), compact.scan(text))
+
+    def test_save_requires_aho_corasick(self):
+        f = DFAFilter()
+        f.build_chains({"foo"})
+        with self.assertRaises(AssertionError):
+            f.save(self.path)
+
+    def test_load_rejects_foreign_file(self):
+        with open(self.path, "wb") as fp:
+            fp.write(b"not an automaton")
+
+        with self.assertRaises(ValueError):
+            DFAFilter.load(self.path)
+
+    def test_save_leaves_no_temp_files(self):
+        f = DFAFilter(compact=True)
+        f.build_chains({"foo"})
+        f.save(self.path)
+        self.assertEqual(os.listdir(self.tmpdir), ["lexicon.dfa"])
+
+
+class DFAFilterBatchTestCase(TestCase):
+    """Tests for DFAFilter.load_keywords_batch."""
+
+    def setUp(self):
+        self.texts = ["say hello", "nothing", "abc and hello", ""] * 10
+        self.expect = [{"hello"}, set(), {"ab", "abc", "hello"}, set()] * 10
+
+    def test_in_process_yields_per_document(self):
+        f = DFAFilter(aho_corasick=True)
+        f.build_chains({"ab", "abc", "hello"})
+        result = f.load_keywords_batch(iter(self.texts))
+        self.assertNotIsInstance(result, list)
+        self.assertEqual(list(result), self.expect)
+
+    def test_legacy_engine(self):
+        f = DFAFilter()
+        f.build_chains({"hello"})
+        self.assertEqual(
+            list(f.load_keywords_batch(["hello", "bye"])), [{"hello"}, set()]
+        )
+
+    def test_requires_build_chains(self):
+        f = DFAFilter()
+        with self.assertRaises(AssertionError):
+            list(f.load_keywords_batch(["hello"]))
+
+    def test_process_pool_keeps_order(self):
+        f = DFAFilter(compact=True)
+        f.build_chains({"ab", "abc", "hello"})
+        result = list(
+            f.load_keywords_batch((t for t in self.texts), n_workers=2, chunksize=3)
+        )
+        self.assertEqual(result, self.expect)
+
+    def test_process_pool_with_mmap_automaton(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "lexicon.dfa")
+            f = DFAFilter(compact=True)
+            f.build_chains({"ab", "abc", "hello"})
+            f.save(path)
+            loaded = DFAFilter.load(path)
+            result = list(loaded.load_keywords_batch(self.texts, n_workers=2))
+            self.assertEqual(result, self.expect)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_mmap_automaton_pickles_as_path(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "lexicon.dfa")
+            CompactAutomaton.from_keywords({"foo"}).save(path)
+            loaded = CompactAutomaton.load(path)
+            data = pickle.dumps(loaded)
+            self.assertLess(len(data), 200)
+            clone = pickle.loads(data)
+            self.assertIsNotNone(clone._mmap)
+            self.assertEqual(clone.scan("foo"), loaded.scan("foo"))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_in_memory_automaton_pickles(self):
+        compact = CompactAutomaton.from_keywords({"foo", "bar"})
+        clone = pickle.loads(pickle.dumps(compact))
+        self.assertEqual(clone.scan("foobar"), compact.scan("foobar"))
+
+
+class DFAFilterMatchesTestCase(TestCase):
+    """Tests for DFAFilter.find_matches and count_matches."""
+
+    def _build(self, keywords, **kw):
+        f = DFAFilter(aho_corasick=True, **kw)
+        f.build_chains(keywords)
+        return f
+
+    def test_overlapping_spans(self):
+        f = self._build({"he", "she", "hers"})
+        self.assertEqual(
+            f.find_matches("ushers"),
+            [
+                KeywordMatch(1, 4, "she"),
+                KeywordMatch(2, 4, "he"),
+                KeywordMatch(2, 6, "hers"),
+            ],
+        )
+
+    def test_spans_slice_back_to_keyword(self):
+        text = "abcabc 你好 abc"
+        f = self._build({"ab", "abc", "bc", "你好"})
+        for match in f.find_matches(text):
+            self.assertEqual(text[match.start : match.end], match.keyword)
+
+    def test_leftmost_longest(self):
+        f = self._build({"he", "she", "hers"})
+        self.assertEqual(
+            f.find_matches("ushers", overlapping=False), [KeywordMatch(1, 4, "she")]
+        )
+
+        f = self._build({"ab", "abc", "cd", "d"})
+        self.assertEqual(
+            f.find_matches("abcd", overlapping=False),
+            [KeywordMatch(0, 3, "abc"), KeywordMatch(3, 4, "d")],
+        )
+
+    def test_count_matches(self):
+        f = self._build({"ab", "abc"})
+        self.assertEqual(f.count_matches("abcab abc"), {"ab": 3, "abc": 2})
+        self.assertEqual(
+            f.count_matches("abcab abc", overlapping=False), {"ab": 1, "abc": 2}
+        )
+
+    def test_count_matches_no_hits(self):
+        f = self._build({"xyz"})
+        self.assertEqual(f.count_matches("abc"), {})
+
+    def test_compact_engine(self):
+        f = self._build({"ab", "abc"}, compact=True)
+        self.assertEqual(
+            f.find_matches("abc"), [KeywordMatch(0, 2, "ab"), KeywordMatch(0, 3, "abc")]
+        )
+
+    def test_requires_aho_corasick(self):
+        f = DFAFilter()
+        f.build_chains({"abc"})
+        with self.assertRaises(AssertionError):
+            f.find_matches("abc")
+
+    def test_overlapping_matches_brute_force(self):
+        rnd = random.Random(11)
+        keywords = {
+            "".join(rnd.choice("ab") for _ in range(rnd.randint(1, 4)))
+            for _ in range(10)
+        }
+        f = self._build(keywords)
+        for _ in range(30):
+            text = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 30)))
+            expect = sorted(
+                KeywordMatch(i, i + len(kw), kw)
+                for kw in keywords
+                for i in range(len(text))
+                if text.startswith(kw, i)
+            )
+            self.assertEqual(f.find_matches(text), expect)
+
+
+class DFAFilterStreamTestCase(TestCase):
+    """Tests for streaming scans across chunk boundaries."""
+
+    def _build(self, keywords, **kw):
+        f = DFAFilter(aho_corasick=True, **kw)
+        f.build_chains(keywords)
+        return f
+
+    def _chunks(self, text, size):
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    def test_match_spanning_chunks(self):
+        f = self._build({"hello", "world"})
+        result = list(f.find_matches_stream(["say hel", "lo wo", "rld"]))
+        self.assertEqual(result, [KeywordMatch(4, 9, "hello"), KeywordMatch(10, 15, "world")])
+
+    def test_file_object_source(self):
+        f = self._build({"needle"})
+        text = "hay " * 1000 + "needle" + " hay" * 1000
+        result = list(f.find_matches_stream(io.StringIO(text), read_size=7))
+        self.assertEqual(result, [KeywordMatch(4000, 4006, "needle")])
+
+    def test_binary_source_is_rejected(self):
+        f = self._build({"ab"})
+        with self.assertRaises(TypeError):
+            list(f.find_matches_stream(io.BytesIO(b"xxab")))
+        with self.assertRaises(TypeError):
+            list(f.find_matches_stream([b"xxab"]))
+
+    def test_same_matches_as_whole_text(self):
+        rnd = random.Random(5)
+        keywords = {
+            "".join(rnd.choice("abc") for _ in range(rnd.randint(1, 5)))
+            for _ in range(20)
+        }
+        for compact in (False, True):
+            f = self._build(keywords, compact=compact)
+            for _ in range(20):
+                text = "".join(rnd.choice("abcd") for _ in range(rnd.randint(0, 60)))
+                chunks = self._chunks(text, rnd.randint(1, 7))
+                for overlapping in (True, False):
+                    self.assertEqual(
+                        sorted(f.find_matches_stream(chunks, overlapping=overlapping)),
+                        f.find_matches(text, overlapping=overlapping),
+                    )
+
+    def test_leftmost_longest_waits_for_longer_match(self):
+        f = self._build({"ab", "abcd"})
+        scanner = f.stream_scanner(overlapping=False)
+        self.assertEqual(scanner.feed("ab"), [])
+        self.assertEqual(scanner.feed("cd"), [KeywordMatch(0, 4, "abcd")])
+        self.assertEqual(scanner.close(), [])
+
+    def test_leftmost_longest_flushes_on_close(self):
+        f = self._build({"ab", "abcd"})
+        scanner = f.stream_scanner(overlapping=False)
+        self.assertEqual(scanner.feed("abc"), [])
+        self.assertEqual(scanner.close(), [KeywordMatch(0, 2, "ab")])
+
+    def test_requires_aho_corasick(self):
+        f = DFAFilter()
+        f.build_chains({"abc"})
+        with self.assertRaises(AssertionError):
+            list(f.find_matches_stream(["abc"]))
+
+
+class DFAFilterKeywordEditTestCase(TestCase):
+    """Tests for incremental add_keywords/remove_keywords."""
+
+    def _build(self, keywords, **kw):
+        f = DFAFilter(aho_corasick=True, **kw)
+        f.build_chains(keywords)
+        return f
+
+    def test_add_keywords(self):
+        f = self._build({"foo"})
+        f.add_keywords({"bar", "foo"})
+        self.assertIsInstance(f._automaton, LayeredAutomaton)
+        self.assertEqual(f.load_keywords("foo bar baz"), {"foo", "bar"})
+
+    def test_remove_keywords(self):
+        f = self._build({"foo", "bar"})
+        f.remove_keywords({"foo", "unknown"})
+        self.assertEqual(f.load_keywords("foo bar"), {"bar"})
+        self.assertEqual(f.find_matches("foo bar"), [KeywordMatch(4, 7, "bar")])
+
+    def test_remove_every_keyword(self):
+        for kw in ({}, {"compact": True}):
+            f = self._build({"foo", "bar"}, **kw)
+            f.remove_keywords({"foo", "bar"})
+            self.assertEqual(f.load_keywords("foo bar"), set())
+            self.assertEqual(f.find_matches("foo bar"), [])
+            f.compact_keywords()
+            self.assertEqual(f.load_keywords("foo bar"), set())
+            self.assertEqual(f.find_matches("foo bar"), [])
+
+    def test_remove_then_add_back(self):
+        f = self._build({"foo", "bar"})
+        f.remove_keywords({"foo"})
+        f.add_keywords({"foo"})
+        # the edits cancel out, so the base automaton is used directly again
+        self.assertNotIsInstance(f._automaton, LayeredAutomaton)
+        self.assertEqual(f.load_keywords("foo bar"), {"foo", "bar"})
+
+    def test_remove_added_keyword(self):
+        f = self._build({"foo"})
+        f.add_keywords({"bar"})
+        f.remove_keywords({"bar"})
+        self.assertEqual(f.load_keywords("foo bar"), {"foo"})
+
+    def test_add_without_build_chains(self):
+        f = DFAFilter(compact=True)
+        f.add_keywords({"foo"})
+        self.assertEqual(f.load_keywords("a foo"), {"foo"})
+
+    def test_edits_are_merged_past_threshold(self):
+        f = self._build({"foo"}, compact=True, max_pending_edits=2)
+        f.add_keywords({"a1", "a2"})
+        self.assertIsInstance(f._automaton, LayeredAutomaton)
+        f.add_keywords({"a3"})
+        self.assertIsInstance(f._automaton, CompactAutomaton)
+        self.assertEqual(f.load_keywords("foo a1 a2 a3"), {"foo", "a1", "a2", "a3"})
+
+    def test_compact_keywords(self):
+        f = self._build({"foo", "bar"})
+        f.add_keywords({"baz"})
+        f.remove_keywords({"bar"})
+        f.compact_keywords()
+        self.assertIsInstance(f._automaton, AhoCorasickAutomaton)
+        self.assertEqual(set(f._automaton.keywords()), {"foo", "baz"})
+
+    def test_matches_rebuilt_filter(self):
+        rnd = random.Random(9)
+
+        def words(n):
+            return {
+                "".join(rnd.choice("abc") for _ in range(rnd.randint(1, 4)))
+                for _ in range(n)
+            }
+
+        keywords = words(20)
+        f = self._build(keywords, compact=True)
+        for _ in range(10):
+            added, removed = words(3), set(rnd.sample(sorted(keywords), 2))
+            f.add_keywords(added)
+            f.remove_keywords(removed)
+            keywords = (keywords | added) - removed
+            expect = self._build(keywords)
+            text = "".join(rnd.choice("abcd") for _ in range(40))
+            self.assertEqual(f.find_matches(text), expect.find_matches(text))
+            self.assertEqual(
+                sorted(f.find_matches_stream([text[:13], text[13:]])),
+                expect.find_matches(text),
+            )
+
+    def test_save_with_pending_edits(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "lexicon.dfa")
+            f = self._build({"foo", "bar"})
+            f.add_keywords({"baz"})
+            f.remove_keywords({"bar"})
+            f.save(path)
+            self.assertEqual(DFAFilter.load(path).load_keywords("foo bar baz"), {"foo", "baz"})
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_filter_pickles_without_lock(self):
+        f = self._build({"foo"})
+        f.add_keywords({"bar"})
+        clone = pickle.loads(pickle.dumps(f))
+        self.assertEqual(clone.load_keywords("foo bar"), {"foo", "bar"})
+        clone.add_keywords({"baz"})
+
+    def test_concurrent_readers_see_complete_snapshots(self):
+        f = self._build({"k0"}, max_pending_edits=5)
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                found = f.load_keywords("k0 k1 k2 k3 k4 k5 k6 k7 k8 k9")
+                # keywords are only ever added, in order, and never removed
+                n = len(found)
+                if found != {"k{}".format(i) for i in range(n)}:
+                    errors.append(found)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for i in range(1, 10):
+            f.add_keywords(["k{}".format(i)])
+        stop.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(f.load_keywords("k0 k1 k2 k3 k4 k5 k6 k7 k8 k9")), 10)
+
+    def test_requires_aho_corasick(self):
+        f = DFAFilter()
+        f.build_chains({"foo"})
+        with self.assertRaises(AssertionError):
+            f.add_keywords({"bar"})
+
+
+class DFAFilterNormalizeTestCase(TestCase):
+    """Tests for case/width folding and ignorable characters."""
+
+    def _build(self, keywords, **kw):
+        f = DFAFilter(**kw)
+        f.build_chains(keywords)
+        return f
+
+    def test_normalization_implies_aho_corasick(self):
+        self.assertTrue(DFAFilter(casefold=True).aho_corasick)
+        self.assertIsNone(DFAFilter().normalizer)
+
+    def test_casefold(self):
+        f = self._build({"Hello"}, casefold=True)
+        self.assertEqual(f.load_keywords("say HELLO and hello"), {"Hello"})
+        self.assertEqual(
+            f.find_matches("say HELLO"), [KeywordMatch(4, 9, "Hello")]
+        )
+
+    def test_fold_width(self):
+        f = self._build({"abc1"}, fold_width=True)
+        text = "x ａｂｃ１ y"
+        self.assertEqual(f.find_matches(text), [KeywordMatch(2, 6, "abc1")])
+
+    def test_ignore_chars_maps_back_to_original_span(self):
+        f = self._build({"spam"}, ignore_chars=" .-")
+        text = "buy s.p-a m now"
+        match = f.find_matches(text)[0]
+        self.assertEqual(match.keyword, "spam")
+        self.assertEqual(text[match.start : match.end], "s.p-a m")
+
+    def test_ignore_chars_in_keyword(self):
+        f = self._build({"s-p-a-m"}, ignore_chars="-")
+        self.assertEqual(f.load_keywords("spam"), {"s-p-a-m"})
+
+    def test_expanding_fold(self):
+        # "ﬁ" folds to two characters under NFKC
+        f = self._build({"fine"}, fold_width=True)
+        text = "so ﬁne"
+        self.assertEqual(f.find_matches(text), [KeywordMatch(3, 6, "fine")])
+
+    def test_combined_with_compact(self):
+        f = self._build({"Foo", "bar"}, compact=True, casefold=True, fold_width=True, ignore_chars="*")
+        text = "ＦＯ*Ｏ b*a*r"
+        self.assertEqual(
+            [(text[m.start : m.end], m.keyword) for m in f.find_matches(text)],
+            [("ＦＯ*Ｏ", "Foo"), ("b*a*r", "bar")],
+        )
+
+    def test_matches_normalized_copy(self):
+        rnd = random.Random(13)
+        keywords = {
+            "".join(rnd.choice("abAB") for _ in range(rnd.randint(1, 4)))
+            for _ in range(15)
+        }
+        f = self._build(keywords, casefold=True, ignore_chars=".")
+        plain = self._build({kw.lower() for kw in keywords}, aho_corasick=True)
+        for _ in range(30):
+            text = "".join(rnd.choice("abAB.c") for _ in range(rnd.randint(0, 30)))
+            expect = plain.load_keywords(text.lower().replace(".", ""))
+            self.assertEqual({kw.lower() for kw in f.load_keywords(text)}, expect)
+
+    def test_stream_spans_across_chunks(self):
+        f = self._build({"spam", "sp"}, casefold=True, ignore_chars=".")
+        text = "xx S.P.A.M yy s.p"
+        chunks = [text[i : i + 3] for i in range(0, len(text), 3)]
+        for overlapping in (True, False):
+            self.assertEqual(
+                sorted(f.find_matches_stream(chunks, overlapping=overlapping)),
+                f.find_matches(text, overlapping=overlapping),
+            )
+
+    def test_stream_leftmost_longest_with_ignored_gap(self):
+        f = self._build({"ab", "abcd"}, ignore_chars=".")
+        scanner = f.stream_scanner(overlapping=False)
+        self.assertEqual(scanner.feed("ab"), [])
+        self.assertEqual(scanner.feed("......"), [])
+        self.assertEqual(scanner.feed("cd"), [KeywordMatch(0, 10, "abcd")])
+
+    def test_edits_use_folded_keywords(self):
+        f = self._build({"Foo", "baz"}, casefold=True)
+        f.add_keywords(["BAR", "bar"])
+        self.assertEqual(f.load_keywords("foo bar"), {"Foo", "BAR"})
+        f.remove_keywords({"FOO", "bar"})
+        self.assertEqual(f.load_keywords("foo bar baz"), {"baz"})
+
+    def test_save_load_keeps_normalizer(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "lexicon.dfa")
+            f = self._build({"Spam"}, casefold=True, ignore_chars=".")
+            f.save(path)
+            loaded = DFAFilter.load(path)
+            self.assertEqual(loaded.normalizer.to_config(), f.normalizer.to_config())
+            self.assertEqual(loaded.find_matches("S.P.A.M"), [KeywordMatch(0, 7, "Spam")])
+            clone = pickle.loads(pickle.dumps(loaded))
+            self.assertEqual(clone.load_keywords("sPaM"), {"Spam"})
+        finally:
+            shutil.rmtree(tmpdir)
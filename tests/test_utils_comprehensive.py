@@ -3,10 +3,12 @@
 
 from __future__ import annotations
 
+import _thread
 import datetime
 import logging
 import os
 import subprocess
+import sys
 import tempfile
 import threading
 import time
@@ -15,12 +17,21 @@ from unittest.mock import MagicMock, patch
 
 import pytz
 
-from kipp.utils import IOTA, generate_validate_fname, run_command, sleep
+from kipp.utils import (
+    IOTA,
+    ExecutorFullError,
+    generate_validate_fname,
+    run_command,
+    sleep,
+    timer,
+)
 from kipp.utils.concurrents import (
+    ElasticThreadPoolExecutor,
     Future,
     KippPoolMixin,
     ProcessPoolExecutor,
     ThreadPoolExecutor,
+    get_worker_state,
 )
 from kipp.utils.date import (
     CST,
@@ -31,6 +42,12 @@ from kipp.utils.date import (
     parse_dtstr,
     utcnow,
 )
+from kipp.utils.metrics import (
+    Histogram,
+    _bucket_index,
+    _bucket_value,
+    get_timing_registry,
+)
 from kipp.utils.logger import (
     get_formatter,
     get_logger,
@@ -833,3 +850,530 @@ class KippPoolMixinTestCase(TestCase):
 
     def test_process_executor_inherits_mixin(self):
         self.assertTrue(issubclass(ProcessPoolExecutor, KippPoolMixin))
+
+
+# ---------------------------------------------------------------------------
+# metrics.py - timing histograms
+# ---------------------------------------------------------------------------
+
+
+class HistogramTestCase(TestCase):
+    def test_bucket_error_is_bounded(self):
+        for us in list(range(300)) + [10**3, 12345, 10**6, 987654321]:
+            top = _bucket_value(_bucket_index(us))
+            self.assertGreaterEqual(top, us)
+            self.assertLessEqual(top - us, us / 64)
+
+    def test_percentiles(self):
+        hist = Histogram("test")
+        for ms in range(1, 101):
+            hist.record(ms * 1000000)
+        hist.record(5000000, error=True)
+
+        info = hist.info()
+        self.assertEqual(info.calls, 101)
+        self.assertEqual(info.errors, 1)
+        self.assertEqual(info.sampled, 101)
+        self.assertAlmostEqual(info.p50, 0.050, delta=0.050 / 64)
+        self.assertAlmostEqual(info.p95, 0.095, delta=0.095 / 64)
+        self.assertAlmostEqual(info.p99, 0.099, delta=0.099 / 64)
+        self.assertAlmostEqual(info.max, 0.100)
+
+    def test_threads_record_without_losing_counts(self):
+        hist = Histogram("test")
+
+        def run():
+            for i in range(10000):
+                hist.record(i * 1000)
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(hist.info().calls, 80000)
+        self.assertEqual(hist.info().sampled, 80000)
+
+    def test_exited_threads_are_folded(self):
+        hist = Histogram("test")
+        for i in range(50):
+            t = threading.Thread(target=hist.record, args=(i * 1000000, i % 2 == 0))
+            t.start()
+            t.join()
+
+        info = hist.info()
+        self.assertEqual((info.calls, info.errors, info.sampled), (50, 25, 50))
+        self.assertAlmostEqual(info.max, 0.049)
+        hist.record(1000000)
+        self.assertEqual(hist.info().calls, 51)
+        hist.clear()
+        self.assertEqual(hist.info().calls, 0)
+
+    def test_foreign_threads_are_folded(self):
+        hist = Histogram("test")
+        done = threading.Semaphore(0)
+
+        def run():
+            # threading.current_thread() is a _DummyThread here
+            threading.current_thread()
+            hist.record(1000000, error=True)
+            done.release()
+
+        for _ in range(20):
+            _thread.start_new_thread(run, ())
+            done.acquire()
+        self._wait_for_calls(hist, 20)
+        self.assertEqual(hist.info().errors, 20)
+
+    def _wait_for_calls(self, hist, n):
+        deadline = time.monotonic() + 5
+        while hist.info().calls != n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(hist.info().calls, n)
+
+    def test_clear(self):
+        hist = Histogram("test")
+        hist.record(1000)
+        hist.clear()
+        self.assertEqual(hist.info().calls, 0)
+        self.assertEqual(hist.info().p99, 0)
+
+
+class TimerTestCase(TestCase):
+    @patch("kipp.utils.logger")
+    def test_logs_start_and_end(self, mock_logger):
+        @timer
+        def add(a, b):
+            return a + b
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(mock_logger.info.call_count, 2)
+
+    @patch("kipp.utils.logger")
+    def test_histogram_mode_does_not_log(self, mock_logger):
+        @timer(histogram=True)
+        def fail(x):
+            if x:
+                raise ValueError()
+            return x
+
+        fail(0)
+        with self.assertRaises(ValueError):
+            fail(1)
+        mock_logger.info.assert_not_called()
+        info = fail.timing_info()
+        self.assertEqual((info.calls, info.errors, info.sampled), (2, 1, 2))
+        self.assertIn(fail.histogram.name, get_timing_registry().snapshot())
+
+    def test_sampling_counts_every_call(self):
+        @timer(histogram=True, sample_rate=0.1)
+        def noop():
+            pass
+
+        for _ in range(2000):
+            noop()
+        info = noop.timing_info()
+        self.assertEqual(info.calls, 2000)
+        self.assertTrue(100 < info.sampled < 400)
+
+
+# ---------------------------------------------------------------------------
+# concurrents.py - bounded ThreadPoolExecutor
+# ---------------------------------------------------------------------------
+
+
+class BoundedThreadPoolExecutorTestCase(TestCase):
+    def _blocked_pool(self, **kw):
+        """Pool whose single worker is stuck until the returned event is set."""
+        release = threading.Event()
+        started = threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(5)
+
+        executor = ThreadPoolExecutor(1, **kw)
+        executor.submit(hold)
+        started.wait(5)
+        self.addCleanup(executor.shutdown, wait=True)
+        self.addCleanup(release.set)
+        return executor, release
+
+    def test_reject_when_full(self):
+        executor, _ = self._blocked_pool(max_queue_size=2, full_policy="reject")
+        executor.submit(int)
+        executor.submit(int)
+        with self.assertRaises(ExecutorFullError):
+            executor.submit(int)
+
+        stats = executor.stats()
+        self.assertEqual(stats.queue_size, 2)
+        self.assertEqual(stats.peak_queue_size, 2)
+        self.assertEqual(stats.rejected, 1)
+
+    def test_caller_runs_when_full(self):
+        executor, _ = self._blocked_pool(max_queue_size=1, full_policy="caller_runs")
+        executor.submit(int)
+        future = executor.submit(threading.current_thread)
+        self.assertTrue(future.done())
+        self.assertIs(future.result(), threading.current_thread())
+        self.assertEqual(executor.stats().caller_runs, 1)
+
+        def boom():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            executor.submit(boom).result()
+
+    def test_block_until_a_task_starts(self):
+        executor, release = self._blocked_pool(max_queue_size=1)
+        executor.submit(int)
+        threading.Timer(0.2, release.set).start()
+
+        start_at = time.time()
+        future = executor.submit(lambda: 3)
+        self.assertGreaterEqual(time.time() - start_at, 0.15)
+        self.assertEqual(future.result(timeout=5), 3)
+
+        executor.shutdown(wait=True)
+        stats = executor.stats()
+        self.assertEqual(stats.queue_size, 0)
+        self.assertEqual(stats.wait.calls, 3)
+        self.assertGreaterEqual(stats.wait.max, 0.15)
+
+    def test_block_timeout(self):
+        executor, _ = self._blocked_pool(max_queue_size=1, block_timeout=0.05)
+        executor.submit(int)
+        with self.assertRaises(ExecutorFullError):
+            executor.submit(int)
+
+    def test_cancelled_task_frees_its_slot(self):
+        executor, _ = self._blocked_pool(max_queue_size=1, full_policy="reject")
+        self.assertTrue(executor.submit(int).cancel())
+        self.assertEqual(executor.queue_size, 0)
+        executor.submit(int)
+
+    def test_unbounded_by_default(self):
+        with ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(pow, i, 2) for i in range(100)]
+            self.assertEqual([f.result() for f in futures], [i * i for i in range(100)])
+        self.assertEqual(executor.stats().max_queue_size, 0)
+        self.assertEqual(executor.stats().wait.calls, 100)
+
+
+def _square(x):
+    return x * x
+
+
+class KippPoolMixinImapTestCase(TestCase):
+    def test_ordered(self):
+        with ThreadPoolExecutor(4) as executor:
+            self.assertEqual(
+                list(executor.imap(_square, range(100), chunksize=7)),
+                [i * i for i in range(100)],
+            )
+
+    def test_unordered_yields_in_completion_order(self):
+        def slow_first(x):
+            if x == 0:
+                time.sleep(0.2)
+            return x
+
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.imap(slow_first, range(4), ordered=False))
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(results[-1], 0)
+
+    def test_endless_input_is_read_lazily(self):
+        consumed = []
+
+        def numbers():
+            i = 0
+            while True:
+                consumed.append(i)
+                yield i
+                i += 1
+
+        with ThreadPoolExecutor(2) as executor:
+            results = executor.imap(_square, numbers(), chunksize=3, max_in_flight=6)
+            self.assertEqual([next(results) for _ in range(5)], [0, 1, 4, 9, 16])
+            # the chunk being yielded from, plus two chunks in flight
+            self.assertLessEqual(len(consumed), 12)
+            results.close()
+
+    def test_exception_reaches_caller(self):
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        with ThreadPoolExecutor(2) as executor:
+            results = executor.imap(fail_on_3, range(10))
+            self.assertEqual([next(results) for _ in range(3)], [0, 1, 2])
+            with self.assertRaises(ValueError):
+                next(results)
+
+    def test_process_pool_chunks(self):
+        with ProcessPoolExecutor(2) as executor:
+            results = executor.imap(_square, range(50), chunksize=10, ordered=False)
+            self.assertEqual(sorted(results), [i * i for i in range(50)])
+
+
+# ---------------------------------------------------------------------------
+# concurrents.py - ElasticThreadPoolExecutor
+# ---------------------------------------------------------------------------
+
+
+class ElasticThreadPoolExecutorTestCase(TestCase):
+    def _wait_for(self, predicate, timeout=5):
+        deadline = time.time() + timeout
+        while not predicate():
+            self.assertLess(time.time(), deadline, "condition not met in time")
+            time.sleep(0.01)
+
+    def test_runs_tasks(self):
+        with ElasticThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(pow, i, 2) for i in range(50)]
+            self.assertEqual([f.result() for f in futures], [i * i for i in range(50)])
+
+        with self.assertRaises(RuntimeError):
+            executor.submit(int)
+
+    def test_grows_under_load_up_to_max(self):
+        release = threading.Event()
+        executor = ElasticThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        for _ in range(10):
+            executor.submit(release.wait, 5)
+
+        self.assertEqual(executor.n_workers, 4)
+        self._wait_for(lambda: executor.stats().queue_size == 6)
+        self.assertEqual(executor.n_workers, 4)
+
+    def test_burst_runs_in_parallel(self):
+        executor = ElasticThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        barrier = threading.Barrier(3)
+        futures = [executor.submit(barrier.wait, 5) for _ in range(3)]
+        for f in futures:
+            f.result(timeout=5)
+        self.assertEqual(executor.n_workers, 3)
+
+    def test_reuses_idle_workers(self):
+        executor = ElasticThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        for i in range(5):
+            self.assertEqual(executor.submit(pow, i, 2).result(timeout=5), i * i)
+            self._wait_for(lambda: executor.stats().n_idle == 1)
+        self.assertEqual(executor.n_workers, 1)
+
+    def test_idle_workers_exit_after_keep_alive(self):
+        executor = ElasticThreadPoolExecutor(4, min_workers=1, keep_alive=0.1)
+        self.addCleanup(executor.shutdown)
+        barrier = threading.Barrier(4)
+        futures = [executor.submit(barrier.wait, 5) for _ in range(4)]
+        for f in futures:
+            f.result(timeout=5)
+
+        self._wait_for(lambda: executor.n_workers == 1)
+        self.assertEqual(executor.submit(int, "7").result(timeout=5), 7)
+
+    def test_resize_while_running(self):
+        release = threading.Event()
+        executor = ElasticThreadPoolExecutor(2)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        for _ in range(6):
+            executor.submit(release.wait, 5)
+        self.assertEqual(executor.n_workers, 2)
+
+        # the queued tasks pull in workers up to the new maximum
+        executor.resize(max_workers=5)
+        self._wait_for(lambda: executor.n_workers == 5)
+        self.assertEqual(executor.stats().queue_size, 1)
+
+        executor.resize(max_workers=1)
+        release.set()
+        self._wait_for(lambda: executor.stats().queue_size == 0)
+        self._wait_for(lambda: executor.n_workers == 1)
+
+    def test_shutdown_cancels_queued(self):
+        release = threading.Event()
+        executor = ElasticThreadPoolExecutor(1)
+        executor.submit(release.wait, 5)
+        queued = executor.submit(int)
+        threading.Timer(0.1, release.set).start()
+        executor.shutdown(wait=True, cancel_futures=True)
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(executor.n_workers, 0)
+
+    def test_queued_work_finishes_at_exit(self):
+        script = (
+            "import time\n"
+            "from kipp.utils.concurrents import ElasticThreadPoolExecutor\n"
+            "executor = ElasticThreadPoolExecutor(1)\n"
+            "for i in range(3):\n"
+            "    executor.submit(lambda i=i: (time.sleep(0.1), print(i, flush=True)))\n"
+        )
+        start = time.monotonic()
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(out.returncode, 0, out.stderr)
+        self.assertEqual(out.stdout.split(), ["0", "1", "2"])
+        # idle workers must not hold the exit up for keep_alive
+        self.assertLess(time.monotonic() - start, 20)
+
+
+class ElasticThreadPoolSchedulingTestCase(TestCase):
+    def _run_in_order(self, executor, submit):
+        """Queue tasks behind a blocked single worker and return their run order."""
+        release = threading.Event()
+        order = []
+        executor.submit(release.wait, 5)
+        futures = submit(order.append)
+        release.set()
+        for f in futures:
+            f.result(timeout=5)
+        return order
+
+    def test_default_queue_is_fifo(self):
+        with ElasticThreadPoolExecutor(1) as executor:
+            order = self._run_in_order(
+                executor, lambda run: [executor.submit(run, i) for i in range(5)]
+            )
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_priority_within_queue(self):
+        with ElasticThreadPoolExecutor(1) as executor:
+            order = self._run_in_order(
+                executor,
+                lambda run: [
+                    executor.submit_to("q", p, run, name)
+                    for p, name in [(5, "low"), (0, "high"), (5, "low2"), (1, "mid")]
+                ],
+            )
+        self.assertEqual(order, ["high", "mid", "low", "low2"])
+
+    def test_weighted_fair_share(self):
+        with ElasticThreadPoolExecutor(
+            1, queues={"interactive": 3, "backfill": 1}
+        ) as executor:
+
+            def submit(run):
+                futures = [
+                    executor.submit_to("backfill", 0, run, "b") for _ in range(20)
+                ]
+                futures += [
+                    executor.submit_to("interactive", 0, run, "i") for _ in range(6)
+                ]
+                return futures
+
+            order = self._run_in_order(executor, submit)
+
+        # the backfill queued first, yet interactive gets 3 of every 4 slots
+        self.assertEqual(order[:8].count("i"), 6)
+        self.assertEqual(order[8:], ["b"] * 18)
+
+    def test_idle_queue_earns_no_credit(self):
+        with ElasticThreadPoolExecutor(1) as executor:
+            # "a" runs alone for a while, then "b" shows up
+            self._run_in_order(
+                executor,
+                lambda run: [executor.submit_to("a", 0, run, "a") for _ in range(10)],
+            )
+            order = self._run_in_order(
+                executor,
+                lambda run: [executor.submit_to(q, 0, run, q) for q in "ab" * 4],
+            )
+        # "b" was idle, so it must not run four times in a row to catch up
+        for i in range(0, 8, 2):
+            self.assertEqual(sorted(order[i : i + 2]), ["a", "b"])
+
+    def test_queue_stats(self):
+        with ElasticThreadPoolExecutor(2, queues={"interactive": 4}) as executor:
+            executor.submit_to("interactive", 0, int).result(timeout=5)
+            executor.submit(int).result(timeout=5)
+            executor.set_queue_weight("batch", 0.5)
+
+        stats = executor.queue_stats()
+        self.assertEqual(set(stats), {"interactive", "default", "batch"})
+        self.assertEqual(stats["interactive"].weight, 4)
+        self.assertEqual(stats["interactive"].wait.calls, 1)
+        self.assertEqual(stats["batch"].queue_size, 0)
+        self.assertEqual(stats["batch"].weight, 0.5)
+
+
+# ---------------------------------------------------------------------------
+# concurrents.py - ProcessPoolExecutor worker state, recycling and warm-up
+# ---------------------------------------------------------------------------
+
+
+def _lookup_shared(key):
+    return get_worker_state()[key]
+
+
+def _load_scaled(factor):
+    state = get_worker_state()
+    state["scaled"] = [x * factor for x in state["base"]]
+
+
+def _worker_pid(_=None):
+    return os.getpid()
+
+
+def _touch_pid(dirname):
+    open(os.path.join(dirname, str(os.getpid())), "w").close()
+
+
+class ProcessPoolWorkerStateTestCase(TestCase):
+    def test_shared_state_and_initializer(self):
+        with ProcessPoolExecutor(
+            2,
+            initializer=_load_scaled,
+            initargs=(10,),
+            shared={"base": [1, 2, 3]},
+        ) as executor:
+            self.assertEqual(
+                executor.submit(_lookup_shared, "base").result(), [1, 2, 3]
+            )
+            self.assertEqual(
+                executor.submit(_lookup_shared, "scaled").result(), [10, 20, 30]
+            )
+        self.assertNotIn("base", get_worker_state())
+
+    def _assert_warm(self, executor, dirname, n):
+        deadline = time.monotonic() + 10
+        while len(os.listdir(dirname)) < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pids = {int(name) for name in os.listdir(dirname)}
+        self.assertEqual(len(pids), n)
+        self.assertIn(executor.submit(_worker_pid).result(), pids)
+
+    def test_warm_workers_start_in_constructor(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            with ProcessPoolExecutor(
+                3, initializer=_touch_pid, initargs=(dirname,), warm=True
+            ) as executor:
+                self._assert_warm(executor, dirname, 3)
+
+    def test_warm_up_without_stdlib_internals(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            with ProcessPoolExecutor(
+                3, initializer=_touch_pid, initargs=(dirname,)
+            ) as executor, patch(
+                "kipp.utils.concurrents._WARM_UP_INTERNALS", ("_no_such_attr",)
+            ):
+                executor.warm_up()
+                self._assert_warm(executor, dirname, 3)
+
+    def test_recycles_workers(self):
+        with ProcessPoolExecutor(1, max_tasks_per_child=2, warm=True) as executor:
+            pids = [executor.submit(_worker_pid).result() for _ in range(6)]
+        self.assertEqual(len(set(pids)), 3)
+        self.assertEqual(pids[0], pids[1])